@@ -0,0 +1,1102 @@
+import argparse
+import datetime
+import html
+import http.server
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from lazy_imports import lazy_import
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Modules that are meant to be imported by other programs (CLI tools, workers)
+LIBRARY_MODULES = ['exoplanets_formula', 'ourSolarSystem', 'plottingAndAllTheFun', 'catalog_cache', 'ranking',
+                   'habitability_stream', 'habitability_incremental', 'solar_system_scraper', 'plot_render',
+                   'catalog_overview', 'profiling', 'catalog_schema', 'habitability_uncertainty',
+                   'planet_similarity', 'star_systems',
+                   'habitability_service', 'shared_catalog', 'solar_schema',
+                   'habitability_output', 'universe_merge', 'habitability_sweep', 'orbit_propagation',
+                   'plot_animation', 'catalog_diff']
+
+# Libraries that must not be loaded just by importing one of our modules
+HEAVY_LIBRARIES = ['numpy', 'pandas', 'plotnine', 'matplotlib', 'bs4', 'requests', 'lxml.etree', 'scipy.spatial']
+
+# Maximum time for starting python and importing a module (cold start), in seconds
+IMPORT_BUDGET = 0.2
+
+# Catalog sizes (rows) for the scaling benchmarks
+ROW_COUNTS = [5_000, 100_000, 1_000_000, 10_000_000]
+
+# Catalog sizes (rows) of the synthetic exoplanet.eu catalogs for the pipeline benchmark
+PIPELINE_ROWS = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+# Where the synthetic catalogs and the saved benchmark results are kept
+RESULTS_DIR = 'data/.cache/benchmarks'
+
+# Pages and simulated network latency (seconds) for the scraper benchmark
+SCRAPER_PAGES = 48
+SCRAPER_LATENCY = 0.05
+
+# Worker counts and synthetic catalog size (rows) of the shared catalog benchmark
+SHARED_WORKERS = [1, 2, 4, 8]
+SHARED_ROWS = 1_000_000
+
+# Result sizes (rows) and the formats / compressions of the result writer benchmark
+WRITER_ROWS = [100_000, 1_000_000]
+WRITER_FORMATS = [('csv', None), ('parquet', 'snappy'), ('parquet', 'zstd'), ('feather', 'lz4'), ('feather', 'zstd'),
+                  ('feather', 'none')]
+
+# Catalog sizes (rows) of the merge benchmark
+MERGE_ROWS = [100_000, 1_000_000, 10_000_000]
+
+# Numbers of settings of the Formula constants for the sweep benchmark (the loop only runs up to LOOP_SETTINGS)
+SWEEP_SETTINGS = [100, 1_000, 10_000]
+LOOP_SETTINGS = 1_000
+
+# Planets and timesteps of the orbit propagation benchmark, and the cells solved by the scalar reference
+KEPLER_PLANETS = 10_000
+KEPLER_STEPS = 10_000
+KEPLER_REFERENCE_CELLS = 100_000
+
+# Frames of the orbit animation for the frame renderer benchmark
+ANIMATION_FRAMES = 96
+
+# Catalog sizes of the catalog diff and the share of dropped rows, changed values and new rows of the new version
+DIFF_ROWS = [100_000, 1_000_000]
+DIFF_CHANGES = 0.01
+
+
+def bench_import_time(modules=LIBRARY_MODULES, repeat=5):
+    """Measures the cold start time of every module in a fresh python process.
+
+    The fastest of several runs is used, as it is the least disturbed by other programs.
+    Also checks that no heavy library was actually loaded during the import.
+
+    Args:
+        modules: Names of the modules to import.
+        repeat: Number of runs per module.
+
+    Returns:
+        List of dicts with module, seconds, loaded heavy libraries and whether the budget was kept
+    """
+
+    # prints the heavy libraries that were really executed (lazy modules are only placeholders)
+    check = ("import sys; import {module}; "
+             "print(','.join(name for name in {heavy!r} "
+             "if name in sys.modules and type(sys.modules[name]).__name__ != '_LazyModule'))")
+
+    results = []
+    for module in modules:
+        command = [sys.executable, '-c', check.format(module=module, heavy=HEAVY_LIBRARIES)]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            timings.append(time.perf_counter() - start)
+
+        loaded = [name for name in output.strip().split(',') if name]
+        seconds = min(timings)
+        results.append({'module': module,
+                        'seconds': seconds,
+                        'heavy_loaded': loaded,
+                        'ok': seconds < IMPORT_BUDGET and not loaded})
+
+    return results
+
+
+def synthetic_habits(rows, seed=0):
+    """Creates a random habitility dataframe with the columns of make_habit_df().
+
+    Like the real data it has many ties: every planet outside the mass range has a Formula of 0.
+
+    Args:
+        rows: Number of planets.
+        seed: Seed of the random generator.
+
+    Returns:
+        Habitility dataframe
+    """
+
+    rng = np.random.default_rng(seed)
+    mass = rng.lognormal(0, 2, rows)
+    hz = rng.exponential(300, rows)
+    orbit = rng.beta(1, 5, rows)
+    mass_range = ((0.1 < mass) & (mass < 5.0)).astype(np.int64)
+
+    habits = pd.DataFrame({"Name": pd.Series(np.arange(rows)).astype(str),
+                           "Mass": mass, "HZ": hz, "Orbit": orbit, "Mass_range": mass_range})
+    habits["Formula"] = 6.77047/hz * (1-orbit) * mass_range
+    habits["Formula_easy"] = 6.77047/hz * (1-orbit)
+
+    return habits
+
+
+def bench_ranking(row_counts=ROW_COUNTS, repeat=3):
+    """Compares the triple sort_values of the old main() with HabitabilityRanking.
+
+    Both variants produce the top 30, the fully sorted frame and the top 20.
+
+    Args:
+        row_counts: Catalog sizes to test.
+        repeat: Number of runs per size, the fastest one counts.
+
+    Returns:
+        List of dicts with rows and seconds of both variants
+    """
+
+    from ranking import HabitabilityRanking
+
+    def triple_sort(habits):
+        habits.sort_values(by="Formula", ascending=False).head(30)
+        habits.sort_values(by="Formula", ascending=False)
+        habits.sort_values(by="Formula", ascending=False).head(20)
+
+    def ranking_index(habits):
+        ranking = HabitabilityRanking(habits)
+        ranking.top(30)
+        ranking.ranked()
+        ranking.top(20)
+
+    results = []
+    for rows in row_counts:
+        habits = synthetic_habits(rows)
+        result = {'rows': rows}
+        for name, function in [('sort_values', triple_sort), ('ranking', ranking_index)]:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                function(habits)
+                timings.append(time.perf_counter() - start)
+            result[name] = min(timings)
+        results.append(result)
+
+    return results
+
+
+def planets_table_html(path='data/solarPlanets.csv'):
+    """Rebuilds a windows2universe-style planets table page from the scraped csv file.
+
+    Scraping this page gives the same dataframe as the csv file, so it can stand in for the
+    real website in offline benchmarks.
+
+    Args:
+        path: Path of solarPlanets.csv.
+
+    Returns:
+        html of the page as bytes
+    """
+
+    table = pd.read_csv(path, index_col=0, dtype=str, keep_default_na=False).transpose()
+
+    rows = ['<tr><th></th>' + ''.join('<th><b>%s</b></th>' % html.escape(planet) for planet in table.columns) + '</tr>']
+    for attribute, values in table.iterrows():
+        rows.append('<tr><th>%s</th>' % html.escape(attribute) +
+                    ''.join('<th>%s</th>' % html.escape(value) for value in values) + '</tr>')
+
+    page = ('<html><head><meta charset="utf-8"><title>Planets Table</title></head><body>\n'
+            '<table border="1">\n' + '\n'.join(rows) + '\n</table>\n</body></html>\n')
+    return page.encode('utf-8')
+
+
+class MockSite:
+    """Local stand-in for windows2universe: serves the same page on every path after a fixed delay.
+
+    Supports ETag/If-None-Match, so a second refresh gets 304 answers. Use it as context manager,
+    the URL of a page is site.url(name).
+    """
+
+    def __init__(self, content, latency=SCRAPER_LATENCY):
+        """Creates the mock server (it is started by the with statement).
+
+        Args:
+            content: html of the page as bytes.
+            latency: Delay of every answer in seconds, to simulate the network.
+        """
+
+        self.content = content
+        self.latency = latency
+        self.requests = 0
+
+    def __enter__(self):
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests += 1
+                time.sleep(site.latency)
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(site.content)))
+                self.send_header('ETag', '"v1"')
+                self.end_headers()
+                self.wfile.write(site.content)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(http.server.ThreadingHTTPServer):
+            request_queue_size = 128   # the default of 5 makes concurrent clients wait for a retry of connect()
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, name):
+        return 'http://127.0.0.1:%d/%s' % (self.server.server_port, name)
+
+
+def bench_scraper(pages=SCRAPER_PAGES, latency=SCRAPER_LATENCY, concurrency_levels=(1, 4, 8, 16)):
+    """Measures the throughput of the async scraper against a local mock server.
+
+    Every level starts with an empty response cache (all pages are downloaded and parsed),
+    then refreshes once more (all pages answer 304, nothing is parsed).
+
+    Args:
+        pages: Number of different pages to scrape.
+        latency: Simulated network delay per request in seconds.
+        concurrency_levels: Values of the concurrency limit to test.
+
+    Returns:
+        List of dicts with concurrency, pages per second of the cold and the warm refresh
+    """
+
+    from ourSolarSystem import get_session
+    from solar_system_scraper import scrape_tables
+
+    results = []
+    with MockSite(planets_table_html(), latency) as site:
+        urls = [site.url('page_%03d.html' % number) for number in range(pages)]
+        for concurrency in concurrency_levels:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                result = {'concurrency': concurrency}
+                for refresh in ('cold', 'warm'):
+                    start = time.perf_counter()
+                    scrape_tables(urls, concurrency=concurrency, rate_per_host=1000.0, cache_dir=cache_dir,
+                                  session=get_session())
+                    result[refresh] = pages / (time.perf_counter() - start)
+                results.append(result)
+
+    return results
+
+
+def bench_overview(row_counts=ROW_COUNTS, modes=("bins", "lttb")):
+    """Measures the render time of the full-catalog overview plot for growing catalogs.
+
+    Args:
+        row_counts: Catalog sizes to test.
+        modes: Overview modes to test (see catalog_overview.plot_overview()).
+
+    Returns:
+        List of dicts with rows and seconds per mode (reducing the data, building and saving a png)
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    from catalog_overview import plot_overview
+
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for rows in row_counts:
+            habits = synthetic_habits(rows)
+            result = {'rows': rows}
+            for mode in modes:
+                start = time.perf_counter()
+                plot_overview(habits, mode=mode).save(os.path.join(out_dir, mode + '.png'), verbose=False)
+                result[mode] = time.perf_counter() - start
+            results.append(result)
+
+    return results
+
+
+def bench_service(queries=2000):
+    """Measures the latency of the query service for common queries, over one kept-alive connection.
+
+    Args:
+        queries: Number of queries, the common ones are repeated (so most come from the response cache).
+
+    Returns:
+        Dict with p50 and p99 latency in seconds of the repeated queries and of always new queries
+    """
+
+    import http.client
+    from habitability_service import HabitabilityService, make_server
+
+    service = HabitabilityService()
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    common = ['/top?n=20', '/top?n=30&by=HZ', '/planet?name=Earth', '/filter?column=Mass&min=0.1&max=5',
+              '/solar?planet=2', '/solar?group=0']
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+
+    def latencies(paths):
+        timings = []
+        for path in paths:
+            start = time.perf_counter()
+            connection.request('GET', path)
+            connection.getresponse().read()
+            timings.append(time.perf_counter() - start)
+        return np.percentile(timings, [50, 99])
+
+    try:
+        cached = latencies([common[number % len(common)] for number in range(queries)])
+        uncached = latencies(['/top?n=%d' % (number + 1) for number in range(min(queries, 500))])
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+
+    return {'p50': cached[0], 'p99': cached[1], 'new_p50': uncached[0], 'new_p99': uncached[1]}
+
+
+def _proportional_memory(pid):
+    """Proportional set size (shared pages count once in total over all processes) of a process in bytes, Linux only."""
+
+    with open('/proc/%d/smaps_rollup' % pid) as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) * 1024
+    raise OSError('No Pss in smaps_rollup of %d' % pid)
+
+
+def _catalog_worker(mode, catalog_path, shared_dir, ready, done):
+    """Worker of bench_shared(): holds the cleaned catalog (private copy, shared views or nothing) until done."""
+
+    import exoplanets_formula
+    from catalog_cache import load_catalog
+    from shared_catalog import SharedCatalog
+
+    pd.DataFrame()   # the libraries are part of every worker, also of the baseline
+    if mode == 'private':
+        exoplanets = exoplanets_formula.clean_exo_dataset(load_catalog(exoplanets_formula.EXO_COLUMNS, path=catalog_path))
+        exoplanets = exoplanets.select_dtypes('number')
+    elif mode == 'shared':
+        catalog = SharedCatalog(shared_dir)
+        exoplanets = catalog.frame('exoplanets', catalog.numeric_columns('exoplanets'))
+    else:
+        exoplanets = pd.DataFrame()
+    # every worker reads all of its numbers once
+    exoplanets.sum()
+
+    ready.put(os.getpid())
+    done.wait()
+
+
+def bench_shared(workers=SHARED_WORKERS, rows=SHARED_ROWS):
+    """Measures the memory of workers that each load the catalog compared with workers on the shared catalog.
+
+    The workers are started fresh (spawn) and hold the numeric columns of the cleaned synthetic catalog, their memory is
+    the proportional set size, minus that of the same number of workers without catalog.
+
+    Args:
+        workers: Numbers of workers side by side.
+        rows: Planets in the synthetic catalog.
+
+    Returns:
+        List of dicts with workers and the memory of the catalog in bytes over all workers, private and shared
+    """
+
+    import multiprocessing
+    from shared_catalog import publish
+
+    catalog_path = synthetic_catalog_path(rows)
+    shared_dir = os.path.join(RESULTS_DIR, 'shared_%d' % rows)
+    publish(catalog_path, shared_dir=shared_dir)
+    context = multiprocessing.get_context('spawn')
+
+    def memory(mode, count):
+        ready, done = context.Queue(), context.Event()
+        processes = [context.Process(target=_catalog_worker, args=(mode, catalog_path, shared_dir, ready, done))
+                     for _ in range(count)]
+        for process in processes:
+            process.start()
+        try:
+            pids = [ready.get(timeout=300) for _ in processes]
+            return sum(_proportional_memory(pid) for pid in pids)
+        finally:
+            done.set()
+            for process in processes:
+                process.join()
+
+    results = []
+    for count in workers:
+        baseline = memory('none', count)
+        results.append({'workers': count, 'private': memory('private', count) - baseline,
+                        'shared': memory('shared', count) - baseline})
+    return results
+
+
+def bench_writers(row_counts=WRITER_ROWS, formats=WRITER_FORMATS, repeat=3, lookups=100):
+    """Compares the result writers with the plain to_csv() of the ranking.
+
+    The results are bootstrapped from the real ranking (with unique names), every format is
+    written with a lookup index by name, read back completely and queried by name.
+
+    Args:
+        row_counts: Result sizes to test.
+        formats: (format, compression) pairs.
+        repeat: Number of timed runs.
+        lookups: Number of names looked up with the index.
+
+    Returns:
+        List of dicts with rows, writer, write / read / lookup seconds and bytes of the file
+    """
+
+    from exoplanets_formula import make_habit_df
+    from habitability_output import ResultIndex, read_results, write_results
+    from ranking import HabitabilityRanking
+
+    habits = make_habit_df()
+    rng = np.random.default_rng(0)
+
+    def timed(function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in row_counts:
+            sample = habits.iloc[rng.integers(0, len(habits), rows)].reset_index(drop=True)
+            sample["Name"] = sample["Name"].astype(str) + ' #' + pd.Series(np.arange(rows)).astype(str)
+            ranked = HabitabilityRanking(sample).ranked()
+            names = ranked["Name"].to_numpy(dtype=object)[rng.integers(0, rows, lookups)]
+
+            path = os.path.join(work_dir, 'baseline.csv')
+            seconds = timed(lambda: ranked.to_csv(path))
+            results.append({'rows': rows, 'writer': 'to_csv', 'write': seconds,
+                            'read': timed(lambda: pd.read_csv(path, index_col=0)), 'lookup': None,
+                            'bytes': os.path.getsize(path)})
+
+            for fmt, compression in formats:
+                path = os.path.join(work_dir, 'results.' + fmt)
+                seconds = timed(lambda: write_results(ranked, path, compression=compression, index_by="Name"))
+                index = ResultIndex(path)
+                results.append({'rows': rows, 'writer': fmt if compression is None else '%s/%s' % (fmt, compression),
+                                'write': seconds, 'read': timed(lambda: read_results(path)),
+                                'lookup': timed(lambda: [index.lookup(name) for name in names]) / lookups,
+                                'bytes': os.path.getsize(path)})
+    return results
+
+
+def bench_merge(row_counts=MERGE_ROWS, repeat=3):
+    """Times the merge of the solar system table and the exoplanet catalog.
+
+    The catalog rows are bootstrapped from the real catalog with unique planet names, so about
+    the same share of planets survives the cleaning and every star has many planets.
+
+    Args:
+        row_counts: Catalog sizes to test.
+        repeat: Number of timed runs.
+
+    Returns:
+        List of dicts with rows, merged rows and seconds
+    """
+
+    from catalog_cache import load_catalog
+    from solar_schema import load_solar_table
+    from universe_merge import SOURCE_COLUMNS, merge_universe
+
+    real = load_catalog(SOURCE_COLUMNS).reset_index()
+    df_planets = load_solar_table()
+    rng = np.random.default_rng(0)
+
+    results = []
+    for rows in row_counts:
+        catalog = real.iloc[rng.integers(0, len(real), rows)].reset_index(drop=True)
+        catalog['# name'] = 'SYN-' + pd.Series(np.arange(rows)).astype(str)
+        catalog = catalog.set_index('# name')
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            universe, _ = merge_universe(catalog, df_planets)
+            timings.append(time.perf_counter() - start)
+        results.append({'rows': rows, 'merged': len(universe), 'seconds': min(timings)})
+    return results
+
+
+def bench_sweep(setting_counts=SWEEP_SETTINGS, loop_settings=LOOP_SETTINGS):
+    """Compares the broadcasted parameter sweep with scoring and ranking every setting on its own.
+
+    Args:
+        setting_counts: Numbers of random settings around the default constants.
+        loop_settings: Largest number of settings for the loop.
+
+    Returns:
+        List of dicts with settings, planets, loop and sweep seconds (loop None if skipped)
+    """
+
+    from exoplanets_formula import calculate_habitable_zone, formula_values, habit_inputs, mass_in_range
+    from habitability_sweep import DEFAULT_PARAMETERS, sweep_habitability
+    from ranking import HabitabilityRanking
+
+    planets = habit_inputs()
+    rng = np.random.default_rng(0)
+
+    def loop(grid):
+        for setting in grid.itertuples(index=False):
+            hzs = calculate_habitable_zone(planets, setting.luminosity_exponent)
+            massr = mass_in_range(planets["mass"].to_numpy(), setting.mass_min, setting.mass_max)
+            formula = formula_values(hzs, planets["eccentricity"].to_numpy(), massr, setting.norm, setting.inf_value,
+                                     setting.cap, setting.divisor)[0]
+            HabitabilityRanking(pd.DataFrame({"Formula": formula})).order()
+
+    results = []
+    for settings in setting_counts:
+        grid = pd.DataFrame({name: default * rng.uniform(0.5, 1.5, settings)
+                             for name, default in DEFAULT_PARAMETERS.items()})
+        start = time.perf_counter()
+        sweep_habitability(planets, grid)
+        sweep = time.perf_counter() - start
+
+        seconds = None
+        if settings <= loop_settings:
+            start = time.perf_counter()
+            loop(grid)
+            seconds = time.perf_counter() - start
+        results.append({'settings': settings, 'planets': len(planets), 'loop': seconds, 'sweep': sweep})
+    return results
+
+
+def kepler_scalar(mean_anomaly, eccentricity, tolerance=1e-12, max_iterations=50):
+    """Scalar reference of orbit_propagation.solve_kepler(): Newton's method for one element."""
+
+    anomaly = mean_anomaly if eccentricity < 0.8 else math.pi
+    for _ in range(max_iterations):
+        step = (anomaly - eccentricity * math.sin(anomaly) - mean_anomaly) / (1 - eccentricity * math.cos(anomaly))
+        anomaly -= step
+        if abs(step) <= tolerance:
+            break
+    return anomaly
+
+
+def bench_kepler(planets=KEPLER_PLANETS, steps=KEPLER_STEPS, reference_cells=KEPLER_REFERENCE_CELLS):
+    """Times the orbit propagation of planets x timesteps against a scalar loop.
+
+    The orbits are random (eccentricities up to 0.95, so some need many iterations). The scalar
+    reference solves a random sample of the cells, its time is scaled to all cells, and its
+    results give the largest difference to the vectorized solution.
+
+    Args:
+        planets: Number of planets.
+        steps: Number of timesteps.
+        reference_cells: Cells solved by the scalar reference.
+
+    Returns:
+        Dict with cells, seconds of the scalar reference (scaled), of Newton and Halley (Kepler only),
+        of the full propagation (positions and distances) and the largest difference in radians
+    """
+
+    from orbit_propagation import mean_anomalies, propagate, solve_kepler
+
+    rng = np.random.default_rng(0)
+    orbits = pd.DataFrame({"semi_major_axis": rng.lognormal(0, 1, planets), "eccentricity": rng.beta(1, 4, planets) * 0.95,
+                           "orbital_period": rng.lognormal(3, 1.5, planets), "tperi": rng.uniform(0, 1000, planets),
+                           "omega": rng.uniform(0, 360, planets)})
+    times = np.linspace(0, 3650, steps)
+    e = orbits["eccentricity"].to_numpy()
+
+    def timed_chunks(method):
+        start = time.perf_counter()
+        for first in range(0, planets, max(1, 1_000_000 // steps)):
+            chunk = orbits.iloc[first:first + max(1, 1_000_000 // steps)]
+            solve_kepler(mean_anomalies(chunk, times), chunk["eccentricity"].to_numpy()[:, None], method=method)
+        return time.perf_counter() - start
+
+    newton, halley = timed_chunks("newton"), timed_chunks("halley")
+    start = time.perf_counter()
+    for _ in propagate(orbits, times):
+        pass
+    full = time.perf_counter() - start
+
+    rows, columns = rng.integers(0, planets, reference_cells), rng.integers(0, steps, reference_cells)
+    # the time of a cell is moved into its time of periastron, so every sampled cell is one row at time 0
+    sample = orbits.iloc[rows].assign(tperi=orbits["tperi"].to_numpy()[rows] - times[columns])
+    mean_anomaly = mean_anomalies(sample, [0.0])[:, 0]
+    start = time.perf_counter()
+    reference = [kepler_scalar(m, eccentricity) for m, eccentricity in zip(mean_anomaly - math.pi, e[rows])]
+    scalar = (time.perf_counter() - start) * planets * steps / reference_cells
+    difference = np.abs(solve_kepler(mean_anomaly - math.pi, e[rows]) - np.array(reference)).max()
+
+    return {'cells': planets * steps, 'scalar': scalar, 'newton': newton, 'halley': halley, 'propagate': full,
+            'difference': difference}
+
+
+def bench_animation(frames=ANIMATION_FRAMES, process_counts=None):
+    """Frames per second of the parallel frame renderer for different numbers of worker processes.
+
+    The orbit animation is written as a frame folder, so the encoder does not count.
+
+    Args:
+        frames: Frames of the orbit animation.
+        process_counts: Numbers of worker processes, 1, 2, 4, ... up to the number of CPUs if None.
+
+    Returns:
+        List of dicts with processes, seconds and frames per second
+    """
+
+    from plot_animation import OrbitScene, render_frames, save_arrays, write_animation
+
+    if process_counts is None:
+        process_counts = [2 ** power for power in range((os.cpu_count() or 1).bit_length())]
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        folder = save_arrays(OrbitScene.precompute(frames), os.path.join(work_dir, 'arrays'))
+        for processes in process_counts:
+            start = time.perf_counter()
+            write_animation(render_frames("orbits", folder, processes=processes), os.path.join(work_dir, 'orbits.png'))
+            seconds = time.perf_counter() - start
+            results.append({'processes': processes, 'seconds': seconds, 'fps': frames / seconds})
+    return results
+
+
+def next_catalog_version(path, out_path, changes=DIFF_CHANGES, seed=1, chunksize=500_000):
+    """Writes a new version of a catalog: some rows dropped, some values changed and some rows added.
+
+    Args:
+        path: Path of the catalog csv file.
+        out_path: Path of the new version.
+        changes: Share of dropped rows, of changed numbers and of added rows.
+        seed: Seed of the random generator.
+        chunksize: Number of rows read and written at once.
+
+    Returns:
+        out_path
+    """
+
+    rng = np.random.default_rng(seed)
+    for number, chunk in enumerate(pd.read_csv(path, chunksize=chunksize)):
+        chunk = chunk[rng.random(len(chunk)) >= changes]
+        numeric = [column for column in chunk.columns[1:] if pd.api.types.is_float_dtype(chunk[column])]
+        values = chunk[numeric].to_numpy()
+        chunk[numeric] = np.where(rng.random(values.shape) < changes, values * 1.01, values)
+        added = chunk.sample(frac=changes, random_state=number)
+        added['# name'] = added['# name'] + ' next'
+        pd.concat([chunk, added]).to_csv(out_path, mode='w' if number == 0 else 'a', header=number == 0, index=False)
+    return out_path
+
+
+def bench_diff(row_counts=DIFF_ROWS, repeat=3):
+    """Compares the catalog diff with a pandas merge of both versions followed by a column by column compare.
+
+    Only the rows and columns are compared, the Formula rank movements are not part of the timings.
+
+    Args:
+        row_counts: Sizes of the old catalog.
+        repeat: Number of timed runs.
+
+    Returns:
+        List of dicts with rows, method, modified rows, seconds and peak memory in bytes
+    """
+
+    from catalog_diff import diff_catalogs
+
+    def merge_diff(old_path, new_path):
+        old, new = pd.read_csv(old_path), pd.read_csv(new_path)
+        merged = old.merge(new, on='# name', how='outer', suffixes=('_old', '_new'), indicator=True)
+        both = merged[merged['_merge'] == 'both']
+        changed = pd.DataFrame({column: ~((both[column + '_old'] == both[column + '_new']) |
+                                          (both[column + '_old'].isna() & both[column + '_new'].isna()))
+                                for column in old.columns[1:]})
+        return int(changed.any(axis=1).sum())
+
+    methods = {'merge': merge_diff,
+               'memory': lambda old_path, new_path: len(diff_catalogs(old_path, new_path, scores=False)['modified']),
+               'stream': lambda old_path, new_path: len(diff_catalogs(old_path, new_path, stream=True,
+                                                                      scores=False)['modified'])}
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in row_counts:
+            old_path = synthetic_catalog_path(rows)
+            new_path = next_catalog_version(old_path, os.path.join(work_dir, 'catalog_%d_next.csv' % rows))
+            for method, function in methods.items():
+                modified, seconds, peak = measure(lambda: function(old_path, new_path), repeat)
+                results.append({'rows': rows, 'method': method, 'modified': modified, 'seconds': seconds,
+                                'peak_bytes': peak})
+    return results
+
+
+def synthetic_catalog(rows, path, seed=0, source='data/exoplanet.eu_catalog.csv', chunksize=500_000):
+    """Writes a synthetic catalog with the columns of the exoplanet.eu catalog that the pipeline reads.
+
+    Rows are drawn at random from the real catalog (so the share of missing values and the relations
+    between the columns stay realistic) and get a unique name. The numbers are scattered by a few
+    percent, so the synthetic catalog is not just the real one repeated. The file is written in
+    chunks, even 10^7 rows never need more than one chunk in memory.
+
+    Args:
+        rows: Number of planets.
+        path: Path of the csv file to write.
+        seed: Seed of the random generator.
+        source: Path of the real exoplanet.eu catalog.
+        chunksize: Number of rows generated and written at once.
+
+    Returns:
+        path
+    """
+
+    from exoplanets_formula import EXO_COLUMNS
+
+    header = pd.read_csv(source, nrows=0).columns
+    errors = [column for column in header if column.rsplit('_error_', 1)[0] in EXO_COLUMNS and '_error_' in column]
+    real = pd.read_csv(source, usecols=['# name'] + EXO_COLUMNS + errors)[['# name'] + EXO_COLUMNS + errors]
+    numeric = [column for column in real.columns[1:] if pd.api.types.is_float_dtype(real[column])]
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    for start in range(0, rows, chunksize):
+        size = min(chunksize, rows - start)
+        chunk = real.iloc[rng.integers(0, len(real), size)].reset_index(drop=True)
+        chunk['# name'] = 'SYN-' + pd.Series(np.arange(start, start + size)).astype(str)
+        chunk[numeric] = chunk[numeric].to_numpy() * rng.lognormal(0, 0.03, (size, len(numeric)))
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def synthetic_catalog_path(rows, seed=0, results_dir=RESULTS_DIR):
+    """Path of the synthetic catalog with the given size, it is generated on first use and kept.
+
+    Args:
+        rows: Number of planets.
+        seed: Seed of the random generator.
+        results_dir: Folder of the synthetic catalogs.
+
+    Returns:
+        Path of the csv file
+    """
+
+    path = os.path.join(results_dir, 'catalog_%d_%d.csv' % (rows, seed))
+    if not os.path.exists(path):
+        synthetic_catalog(rows, path, seed)
+    return path
+
+
+def measure(function, repeat=3):
+    """Measures the run time and the peak of newly allocated memory of a function.
+
+    The time is the fastest of several runs. The memory is measured in an extra run with
+    tracemalloc (which slows python down, so it is not timed), NumPy and pandas buffers are
+    included.
+
+    Args:
+        function: Function without arguments.
+        repeat: Number of timed runs.
+
+    Returns:
+        Return value of the function, seconds and peak memory in bytes
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, min(timings), peak
+
+
+def bench_pipeline(row_counts=PIPELINE_ROWS, html_path=None, repeat=3):
+    """Times every stage of the habitability pipeline separately on synthetic catalogs.
+
+    Stages: building the column cache from the csv (load_cold), loading from the cache (load),
+    clean_exo_dataset (clean), score_habitability (score), top 30 + full ranking + top 20 (rank),
+    writing habitability.csv (write), rendering the top 20 plot to png (plot) and parsing the
+    planets table page (parse, offline, independent of the catalog size).
+
+    Args:
+        row_counts: Catalog sizes to test.
+        html_path: Saved copy of the windows2universe planets table, rebuilt from solarPlanets.csv if None.
+        repeat: Number of timed runs per stage.
+
+    Returns:
+        List of dicts with rows, stage, seconds and peak_bytes
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    from catalog_cache import load_catalog
+    from exoplanets_formula import (EXO_COLUMNS, clean_exo_dataset, habits_earth, load_solar_planets,
+                                    make_habitability_plot, score_habitability)
+    from ourSolarSystem import parse_planets_table
+    from ranking import HabitabilityRanking
+
+    if html_path is None:
+        content = planets_table_html()
+    else:
+        with open(html_path, 'rb') as f:
+            content = f.read()
+
+    solar_system = habits_earth(load_solar_planets())
+
+    def rank(habits):
+        ranking = HabitabilityRanking(habits)
+        ranking.top(30)
+        ranking.ranked()
+        return ranking.top(20)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in row_counts:
+            path = synthetic_catalog_path(rows)
+
+            def load_cold():
+                cache_dir = tempfile.mkdtemp(dir=work_dir)
+                return load_catalog(EXO_COLUMNS, path=path, cache_dir=cache_dir)
+
+            cache_dir = os.path.join(work_dir, 'cache_%d' % rows)
+            stages = [('load_cold', load_cold),
+                      ('load', lambda: load_catalog(EXO_COLUMNS, path=path, cache_dir=cache_dir)),
+                      ('clean', lambda: clean_exo_dataset(catalog)),
+                      ('score', lambda: score_habitability(pd.concat(
+                          [exoplanets[["# name", "mass", "star_distance", "star_mass", "eccentricity"]], solar_system],
+                          axis=0, ignore_index=True))),
+                      ('rank', lambda: rank(habits)),
+                      ('write', lambda: HabitabilityRanking(habits).ranked().to_csv(
+                          os.path.join(work_dir, 'habitability.csv'))),
+                      ('plot', lambda: make_habitability_plot(top).save(
+                          os.path.join(work_dir, 'top.png'), verbose=False)),
+                      ('parse', lambda: parse_planets_table(content))]
+
+            catalog = exoplanets = habits = top = None
+            for stage, function in stages:
+                result, seconds, peak = measure(function, repeat)
+                results.append({'rows': rows, 'stage': stage, 'seconds': seconds, 'peak_bytes': peak})
+
+                # every stage works on the result of the one before
+                if stage == 'load':
+                    catalog = result
+                elif stage == 'clean':
+                    exoplanets = result
+                elif stage == 'score':
+                    habits = result
+                elif stage == 'rank':
+                    top = result
+
+    return results
+
+
+def git_commit():
+    """Short hash of the checked out commit, with "-dirty" if there are uncommitted changes ("unknown" without git)."""
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def save_results(results, results_dir=RESULTS_DIR):
+    """Saves benchmark results as json, named after the commit they were measured on.
+
+    Args:
+        results: Dict benchmark name -> list of result dicts.
+        results_dir: Folder of the saved results.
+
+    Returns:
+        Path of the json file
+    """
+
+    commit = git_commit()
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, 'results_%s.json' % commit)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'commit': commit,
+                   'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'python': platform.python_version(),
+                   'machine': platform.platform(),
+                   'results': results}, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+    return path
+
+
+def compare_pipeline(old_path, results):
+    """Prints the pipeline results next to the ones saved in an earlier run.
+
+    Args:
+        old_path: json file written by save_results(), or the commit it was measured on.
+        results: Current results of bench_pipeline().
+
+    Returns:
+        None
+    """
+
+    if not os.path.exists(old_path):
+        old_path = os.path.join(RESULTS_DIR, 'results_%s.json' % old_path)
+    with open(old_path) as f:
+        old = json.load(f)
+
+    old_results = {(result['rows'], result['stage']): result for result in old['results'].get('pipeline', [])}
+    print('Compared with %s (%s):' % (old['commit'], old['date']))
+    for result in results:
+        before = old_results.get((result['rows'], result['stage']))
+        if before is not None:
+            print('  %10d rows  %-10s time x%5.2f  memory x%5.2f' %
+                  (result['rows'], result['stage'], result['seconds'] / before['seconds'],
+                   result['peak_bytes'] / max(before['peak_bytes'], 1)))
+
+
+def main():
+    """Runs the benchmarks and prints the results.
+
+    Returns:
+        Exit code, 1 if a module broke its import budget
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmarks of the Windows to the Universe modules.")
+    parser.add_argument("benchmarks", nargs="*", default=["import", "ranking", "scraper"],
+                        help="benchmarks to run: import, ranking, scraper, overview, service, shared, writers, merge, sweep, kepler, animation, diff, pipeline")
+    parser.add_argument("--max-rows", type=int, default=max(ROW_COUNTS), help="largest synthetic catalog")
+    parser.add_argument("--html", default=None, help="saved planets table page for the parse stage")
+    parser.add_argument("--save", action="store_true", help="save the results under %s" % RESULTS_DIR)
+    parser.add_argument("--compare", default=None, help="saved results (file or commit) to compare the pipeline with")
+    args = parser.parse_args()
+    row_counts = [rows for rows in ROW_COUNTS if rows <= args.max_rows]
+
+    failed = False
+    results = {}
+
+    if "import" in args.benchmarks:
+        print('Import time (budget %.0f ms):' % (IMPORT_BUDGET * 1000))
+        results['import'] = bench_import_time()
+        for result in results['import']:
+            print('  %-26s %7.1f ms  %s' % (result['module'], result['seconds'] * 1000,
+                                           'ok' if result['ok'] else 'TOO SLOW, loads: %s' % result['heavy_loaded']))
+            failed = failed or not result['ok']
+
+    if "ranking" in args.benchmarks:
+        print('Ranking (top 30 + full ranking + top 20):')
+        results['ranking'] = bench_ranking(row_counts)
+        for result in results['ranking']:
+            print('  %10d rows  sort_values %8.1f ms  ranking %8.1f ms' %
+                  (result['rows'], result['sort_values'] * 1000, result['ranking'] * 1000))
+
+    if "scraper" in args.benchmarks:
+        print('Scraper (%d pages, %.0f ms latency, pages per second):' % (SCRAPER_PAGES, SCRAPER_LATENCY * 1000))
+        results['scraper'] = bench_scraper()
+        for result in results['scraper']:
+            print('  concurrency %3d  cold %8.1f  warm (304) %8.1f' %
+                  (result['concurrency'], result['cold'], result['warm']))
+
+    if "overview" in args.benchmarks:
+        print('Full-catalog overview plot (HZ vs Formula, png):')
+        results['overview'] = bench_overview(row_counts)
+        for result in results['overview']:
+            print('  %10d rows  bins %8.1f ms  lttb %8.1f ms' %
+                  (result['rows'], result['bins'] * 1000, result['lttb'] * 1000))
+
+    if "service" in args.benchmarks:
+        results['service'] = bench_service()
+        print('Query service latency: common queries p50 %.2f ms p99 %.2f ms, new queries p50 %.2f ms p99 %.2f ms' %
+              tuple(results['service'][key] * 1000 for key in ('p50', 'p99', 'new_p50', 'new_p99')))
+
+    if "shared" in args.benchmarks:
+        results['shared'] = bench_shared()
+        print('Memory of the catalog (%d rows) over all workers:' % SHARED_ROWS)
+        for result in results['shared']:
+            print('    %d workers: private copies %.1f MB, shared catalog %.1f MB' %
+                  (result['workers'], result['private'] / 1e6, result['shared'] / 1e6))
+
+    if "writers" in args.benchmarks:
+        results['writers'] = bench_writers([rows for rows in WRITER_ROWS if rows <= args.max_rows])
+        print('Result writers (lookup: one planet through the index):')
+        for result in results['writers']:
+            lookup = '%.2f ms' % (result['lookup'] * 1000) if result['lookup'] is not None else '-'
+            print('    %8d rows  %-16s write %7.3f s  read %7.3f s  lookup %9s  %8.1f MB' %
+                  (result['rows'], result['writer'], result['write'], result['read'], lookup, result['bytes'] / 1e6))
+
+    if "merge" in args.benchmarks:
+        results['merge'] = bench_merge([rows for rows in MERGE_ROWS if rows <= args.max_rows])
+        print('Merge of the solar system and the exoplanet catalog:')
+        for result in results['merge']:
+            print('    %10d rows  %8d merged  %8.3f s  %10.0f rows/s' %
+                  (result['rows'], result['merged'], result['seconds'], result['rows'] / result['seconds']))
+
+    if "sweep" in args.benchmarks:
+        results['sweep'] = bench_sweep()
+        print('Parameter sweep of the Formula constants (score and rank all planets per setting):')
+        for result in results['sweep']:
+            loop = '%8.3f s' % result['loop'] if result['loop'] is not None else '%10s' % '-'
+            print('    %6d settings x %d planets  loop %s  sweep %8.3f s' %
+                  (result['settings'], result['planets'], loop, result['sweep']))
+
+    if "kepler" in args.benchmarks:
+        results['kepler'] = result = bench_kepler()
+        print('Kepler equation, %d planets x %d timesteps:' % (KEPLER_PLANETS, KEPLER_STEPS))
+        print('    scalar loop %8.1f s (scaled from %d cells)' % (result['scalar'], KEPLER_REFERENCE_CELLS))
+        print('    newton      %8.1f s' % result['newton'])
+        print('    halley      %8.1f s, with positions and distances %.1f s' % (result['halley'], result['propagate']))
+        print('    largest difference to the scalar loop %.1e rad' % result['difference'])
+
+    if "animation" in args.benchmarks:
+        results['animation'] = bench_animation()
+        print('Orbit animation, %d frames (frames per second):' % ANIMATION_FRAMES)
+        for result in results['animation']:
+            print('    %3d processes  %7.1f s  %7.1f frames/s  speedup %.2f' %
+                  (result['processes'], result['seconds'], result['fps'],
+                   result['fps'] / results['animation'][0]['fps']))
+
+    if "diff" in args.benchmarks:
+        results['diff'] = bench_diff([rows for rows in DIFF_ROWS if rows <= args.max_rows])
+        print('Diff of two catalog versions (%.0f%% of the rows dropped, values changed and rows added):' %
+              (DIFF_CHANGES * 100))
+        for result in results['diff']:
+            print('    %10d rows  %-6s %8d modified  %8.3f s  peak %8.1f MB' %
+                  (result['rows'], result['method'], result['modified'], result['seconds'],
+                   result['peak_bytes'] / 1e6))
+
+    if "pipeline" in args.benchmarks:
+        print('Pipeline stages (synthetic exoplanet.eu catalogs):')
+        results['pipeline'] = bench_pipeline([rows for rows in PIPELINE_ROWS if rows <= args.max_rows], args.html)
+        for result in results['pipeline']:
+            print('  %10d rows  %-10s %10.1f ms  peak %8.1f MB' %
+                  (result['rows'], result['stage'], result['seconds'] * 1000, result['peak_bytes'] / 1e6))
+        if args.compare:
+            compare_pipeline(args.compare, results['pipeline'])
+
+    if args.save:
+        print('Results saved to %s' % save_results(results))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+from lazy_imports import lazy_import
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Default location of the exoplanet.eu catalog
+CATALOG_PATH = 'data/exoplanet.eu_catalog.csv'
+
+# Version of the cache layout, a change forces a rebuild of all caches
+CACHE_VERSION = 1
+
+
+def default_cache_dir(path):
+    """Returns the folder where the columnar cache of a csv file is stored.
+
+    Args:
+        path: Path of the csv file.
+
+    Returns:
+        Path of the cache folder, e.g. data/.cache/exoplanet.eu_catalog for data/exoplanet.eu_catalog.csv
+    """
+
+    folder, file_name = os.path.split(path)
+    return os.path.join(folder, '.cache', os.path.splitext(file_name)[0])
+
+
+def file_hash(path):
+    """Calculates the sha256 hash of a file without reading it into memory at once.
+
+    Args:
+        path: Path of the file.
+
+    Returns:
+        Hex digest of the file content
+    """
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _read_manifest(cache_dir):
+    """Reads the manifest of a cache folder, None if there is no (readable) manifest."""
+
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(cache_dir, manifest):
+    """Writes the manifest of a cache folder, replacing the old one in a single step."""
+
+    tmp_path = os.path.join(cache_dir, 'manifest.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(cache_dir, 'manifest.json'))
+
+
+def cache_is_fresh(path, cache_dir=None):
+    """Checks if the cache of a csv file still belongs to the current version of the file.
+
+    Size and modification time are compared first. Only if the modification time changed
+    the file content is hashed, so a touched but unchanged file does not trigger a rebuild.
+
+    Args:
+        path: Path of the csv file.
+        cache_dir: Cache folder, the default folder next to the csv file if None.
+
+    Returns:
+        True if the cache can be used, False if it has to be rebuilt
+    """
+
+    cache_dir = cache_dir or default_cache_dir(path)
+    manifest = _read_manifest(cache_dir)
+    if manifest is None or manifest.get('version') != CACHE_VERSION:
+        return False
+
+    stat = os.stat(path)
+    source = manifest['source']
+    if stat.st_size != source['size']:
+        return False
+    if stat.st_mtime_ns == source['mtime_ns']:
+        return True
+
+    # modification time changed, the content decides
+    if file_hash(path) != source['sha256']:
+        return False
+    source['mtime_ns'] = stat.st_mtime_ns
+    _write_manifest(cache_dir, manifest)
+    return True
+
+
+def build_cache(path=CATALOG_PATH, cache_dir=None):
+    """Converts a csv file into a columnar cache with one .npy file per column.
+
+    Numeric columns are stored as .npy files that can be memory-mapped when loading,
+    text columns as json lists plus a mask of the missing values.
+
+    Args:
+        path: Path of the csv file.
+        cache_dir: Cache folder, the default folder next to the csv file if None.
+
+    Returns:
+        Manifest of the new cache
+    """
+
+    cache_dir = cache_dir or default_cache_dir(path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    stat = os.stat(path)
+    source_hash = file_hash(path)
+    d = pd.read_csv(path, index_col=0)
+
+    # the old manifest is removed first, so a half written cache is never used
+    try:
+        os.remove(os.path.join(cache_dir, 'manifest.json'))
+    except FileNotFoundError:
+        pass
+
+    # the column files are written in place (no temporary files): this is safe only because the manifest
+    # is removed above and written last, so no load reads a column file while it is being written
+    columns = {}
+    frame = d.reset_index()
+    for number, column in enumerate(frame.columns):
+        series = frame[column]
+        entry = {'dtype': str(series.dtype)}
+
+        if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            entry['kind'] = 'number'
+            entry['file'] = '%03d.npy' % number
+            np.save(os.path.join(cache_dir, entry['file']), series.to_numpy())
+        else:
+            # text columns: json is parsed a lot faster than csv, missing values are kept in a separate mask
+            entry['kind'] = 'text'
+            entry['file'] = '%03d.json' % number
+            missing = series.isna().to_numpy()
+            with open(os.path.join(cache_dir, entry['file']), 'w') as f:
+                json.dump(series.astype(str).where(~missing, '').tolist(), f)
+            if missing.any():
+                entry['mask'] = '%03d.mask.npy' % number
+                np.save(os.path.join(cache_dir, entry['mask']), missing)
+
+        columns[column] = entry
+
+    manifest = {'version': CACHE_VERSION,
+                'source': {'path': os.path.abspath(path), 'size': stat.st_size,
+                           'mtime_ns': stat.st_mtime_ns, 'sha256': source_hash},
+                'index': frame.columns[0],
+                'rows': len(frame),
+                'columns': columns}
+    _write_manifest(cache_dir, manifest)
+
+    return manifest
+
+
+def _load_column(cache_dir, entry, dtype=None):
+    """Loads a single column of the cache as pandas Series, converted to dtype if given.
+
+    Text columns are turned into categoricals or datetimes straight from the json list and
+    numeric columns are converted straight from the memory-mapped array, so the default
+    dtype is never built first.
+    """
+
+    if entry['kind'] == 'number':
+        values = np.load(os.path.join(cache_dir, entry['file']), mmap_mode='r')
+        if dtype is None or dtype == entry['dtype']:
+            return pd.Series(values, dtype=entry['dtype'], copy=False)
+        if pd.api.types.is_extension_array_dtype(pd.api.types.pandas_dtype(dtype)):
+            # nullable integers: missing values (NaN) become <NA>
+            return pd.Series(pd.array(values, dtype=dtype))
+        return pd.Series(values.astype(dtype))
+
+    with open(os.path.join(cache_dir, entry['file'])) as f:
+        values = np.array(json.load(f), dtype=object)
+    if 'mask' in entry:
+        values[np.load(os.path.join(cache_dir, entry['mask']))] = np.nan
+    if dtype is None:
+        return pd.Series(values, dtype=entry['dtype'])
+    if dtype == 'category':
+        return pd.Series(pd.Categorical(values))
+    if str(dtype).startswith('datetime64'):
+        return pd.Series(pd.to_datetime(values, format='ISO8601').astype(dtype))
+    return pd.Series(values, dtype=dtype)
+
+
+def load_catalog(columns=None, path=CATALOG_PATH, cache_dir=None, dtypes=None):
+    """Loads (a part of) a catalog csv file through its columnar cache.
+
+    The cache is created on the first call and rebuilt whenever the csv file changes.
+    Only the requested columns are read from disk.
+
+    Args:
+        columns: Names of the columns to load, all columns if None.
+        path: Path of the csv file.
+        cache_dir: Cache folder, the default folder next to the csv file if None.
+        dtypes: Dtypes of some of the columns, {column: dtype} (e.g. from catalog_schema.schema_dtypes()),
+            the other columns keep the dtypes pd.read_csv() would give them.
+
+    Returns:
+        Dataframe indexed by the first csv column, like pd.read_csv(path, index_col=0)[columns]
+    """
+
+    cache_dir = cache_dir or default_cache_dir(path)
+    if cache_is_fresh(path, cache_dir):
+        manifest = _read_manifest(cache_dir)
+    else:
+        manifest = build_cache(path, cache_dir)
+
+    index_name = manifest['index']
+    if columns is None:
+        columns = [column for column in manifest['columns'] if column != index_name]
+
+    missing = [column for column in columns if column not in manifest['columns']]
+    if missing:
+        raise KeyError('Columns not in %s: %s' % (path, missing))
+
+    dtypes = dtypes or {}
+    catalog = pd.DataFrame({column: _load_column(cache_dir, manifest['columns'][column], dtypes.get(column))
+                            for column in columns}, columns=list(columns))
+    catalog.index = pd.Index(_load_column(cache_dir, manifest['columns'][index_name]), name=index_name)
+
+    return catalog
@@ -0,0 +1,454 @@
+import os
+import tempfile
+from lazy_imports import lazy_import
+from catalog_cache import load_catalog
+from exoplanets_formula import EXO_COLUMNS, load_solar_planets, make_habit_df
+from habitability_incremental import row_keys
+from habitability_stream import CHUNK_SIZE, iter_scored_chunks
+from ranking import HabitabilityRanking
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Column with the planet name, the key of the rows
+NAME_COLUMN = '# name'
+
+# Groups of catalog columns that are hashed together, the _error_min / _error_max columns go with their
+# column and columns that are not listed go into the group "other"
+COLUMN_GROUPS = {
+    "status": ["planet_status", "discovered", "updated", "publication", "detection_type", "mass_detection_type",
+               "radius_detection_type", "alternate_names"],
+    "planet": ["mass", "mass_sini", "radius", "temp_calculated", "temp_measured", "hot_point_lon",
+               "geometric_albedo", "log_g", "molecules"],
+    "orbit": ["orbital_period", "semi_major_axis", "eccentricity", "inclination", "angular_distance", "omega", "tperi",
+              "tconj", "tzero_tr", "tzero_tr_sec", "lambda_angle", "impact_parameter", "tzero_vr", "k"],
+    "star": ["star_name", "ra", "dec", "mag_v", "mag_i", "mag_j", "mag_h", "mag_k", "star_distance",
+             "star_metallicity", "star_mass", "star_radius", "star_sp_type", "star_age", "star_teff",
+             "star_detected_disc", "star_magnetic_field", "star_alternate_names"],
+}
+
+# Number of bucket files the hashes are partitioned into in streaming mode (each bucket is joined in memory)
+BUCKETS = 64
+
+# Size of the top group for the rank movements
+TOP_N = 20
+
+# Hash of a missing value, the same for numeric and text columns
+MISSING_HASH = 0
+
+# Multiplier that mixes the value hashes of a group and the occurrence number of a duplicate name into one hash
+_MIX = 0x100000001B3
+_OCCURRENCE = 0x9E3779B97F4A7C15
+
+
+def column_groups(columns):
+    """Assigns the columns of a catalog to the COLUMN_GROUPS.
+
+    Args:
+        columns: Column names of the catalog, without the name column.
+
+    Returns:
+        Dict group -> columns in catalog order, only groups with columns
+    """
+
+    group_of = {column: group for group, members in COLUMN_GROUPS.items() for column in members}
+    groups = {group: [] for group in list(COLUMN_GROUPS) + ["other"]}
+    for column in columns:
+        groups[group_of.get(column.split('_error_')[0], "other")].append(column)
+    return {group: members for group, members in groups.items() if members}
+
+
+def _float_hashes(values):
+    """Hash of every value of a float array, MISSING_HASH for NaN."""
+
+    missing = np.isnan(values)
+    hashes = pd.util.hash_array(np.where(missing, 0.0, values), categorize=False)
+    hashes[missing] = MISSING_HASH
+    return hashes
+
+
+def column_hashes(series):
+    """Values of a column in the form they are compared in and the hash of every value.
+
+    Numbers are compared as float64, also when they come in a text column (pd.read_csv() can pick
+    another dtype for the same column in another chunk or file), so the same value always gives the
+    same hash. Text columns are factorized, only their distinct values are parsed and hashed.
+
+    Args:
+        series: Column of the catalog.
+
+    Returns:
+        Values (float array, or object array of floats and strings for text columns) and their hashes
+    """
+
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        return values, _float_hashes(values)
+
+    codes, uniques = pd.factorize(series)
+    uniques = np.asarray(uniques, dtype=object)
+    numbers = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype=float)
+    text = np.isnan(numbers)
+    unique_hashes = _float_hashes(numbers)
+    unique_hashes[text] = pd.util.hash_array(uniques[text].astype(str).astype(object), categorize=False)
+
+    # missing values have the code -1, they pick the missing value appended at the end
+    hashes = np.append(unique_hashes, np.uint64(MISSING_HASH))[codes]
+    if not text.any():
+        return np.append(numbers, np.nan)[codes], hashes
+    return np.append(np.where(text, uniques, numbers).astype(object), None)[codes], hashes
+
+
+def _record_dtype(groups):
+    """Dtype of the hash records of a catalog with the given column groups."""
+
+    return np.dtype([('name', np.uint64), ('row', np.int64), ('groups', np.uint64, len(groups))])
+
+
+def hash_rows(chunk, groups, first_row=0):
+    """Hash records of a chunk of catalog rows: name hash, row number and one hash per column group.
+
+    Args:
+        chunk: Dataframe with the name column and the columns of the groups.
+        groups: Dict group -> columns, from column_groups().
+        first_row: Row number of the first row of the chunk in the catalog.
+
+    Returns:
+        Structured array with the fields name (uint64), row (int64) and groups (uint64 per group)
+    """
+
+    records = np.empty(len(chunk), dtype=_record_dtype(groups))
+    records['name'] = pd.util.hash_array(chunk[NAME_COLUMN].to_numpy(dtype=object).astype(str).astype(object),
+                                         categorize=False)
+    records['row'] = np.arange(first_row, first_row + len(chunk))
+    for number, columns in enumerate(groups.values()):
+        combined = np.zeros(len(chunk), dtype=np.uint64)
+        for column in columns:
+            combined = combined * np.uint64(_MIX) ^ column_hashes(chunk[column])[1]
+        records['groups'][:, number] = combined
+    return records
+
+
+def _row_keys(records):
+    """Keys of hash records: the name hash, mixed with the occurrence number for repeated names (like row_keys())."""
+
+    order = np.lexsort((records['row'], records['name']))
+    names = records['name'][order]
+    first = np.concatenate([[True], names[1:] != names[:-1]]) if len(names) else np.zeros(0, dtype=bool)
+    starts = np.maximum.accumulate(np.where(first, np.arange(len(names)), 0))
+    occurrence = np.empty(len(names), dtype=np.uint64)
+    occurrence[order] = np.arange(len(names)) - starts
+    return records['name'] ^ (occurrence * np.uint64(_OCCURRENCE))
+
+
+def diff_records(old, new):
+    """Joins the hash records of two catalogs by key and compares the group hashes.
+
+    Args:
+        old: Hash records of the old catalog (or of one bucket of it).
+        new: Hash records of the new catalog (or of the same bucket).
+
+    Returns:
+        Row numbers of the added rows (new catalog) and of the removed rows (old catalog), row numbers
+        of the modified rows in both catalogs and the mask of their changed groups (rows x groups)
+    """
+
+    position = pd.Index(_row_keys(old)).get_indexer(_row_keys(new))
+    matched = position >= 0
+    removed = np.ones(len(old), dtype=bool)
+    removed[position[matched]] = False
+
+    old_matched, new_matched = old[position[matched]], new[matched]
+    changed = old_matched['groups'] != new_matched['groups']
+    modified = changed.any(axis=1)
+
+    return (new['row'][~matched], old['row'][removed], old_matched['row'][modified], new_matched['row'][modified],
+            changed[modified])
+
+
+def _read_chunks(path, columns, chunksize):
+    """Reads the name column and some columns of a catalog csv file in chunks."""
+
+    wanted = set(columns) | {NAME_COLUMN}
+    return pd.read_csv(path, usecols=lambda column: column in wanted, chunksize=chunksize)
+
+
+def _partition(path, groups, folder, side, buckets, chunksize):
+    """Streams a catalog and appends its hash records to one file per bucket (by name hash)."""
+
+    columns = [column for members in groups.values() for column in members]
+    files = [open(os.path.join(folder, '%s_%03d.bin' % (side, bucket)), 'wb') for bucket in range(buckets)]
+    try:
+        first_row = 0
+        for chunk in _read_chunks(path, columns, chunksize):
+            records = hash_rows(chunk, groups, first_row)
+            first_row += len(chunk)
+            bucket_of = records['name'] % np.uint64(buckets)
+            order = np.argsort(bucket_of, kind='stable')
+            bounds = np.searchsorted(bucket_of[order], np.arange(buckets + 1))
+            for bucket in range(buckets):
+                files[bucket].write(records[order[bounds[bucket]:bounds[bucket + 1]]].tobytes())
+    finally:
+        for f in files:
+            f.close()
+    return first_row
+
+
+def _fetch_rows(path, rows, columns, chunksize):
+    """Streams a catalog and returns the name and some columns of some of its rows, in the order of rows."""
+
+    rows = np.asarray(rows, dtype=np.int64)
+    wanted = np.sort(rows)
+    parts = []
+    first_row = 0
+    for chunk in _read_chunks(path, columns, chunksize):
+        low, high = np.searchsorted(wanted, [first_row, first_row + len(chunk)])
+        if high > low:
+            parts.append(chunk.iloc[wanted[low:high] - first_row])
+        first_row += len(chunk)
+    found = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=[NAME_COLUMN] + list(columns))
+    # back into the order of rows
+    return found.iloc[np.searchsorted(wanted, rows)].reset_index(drop=True)
+
+
+def _column_changes(old_rows, new_rows, changed, groups):
+    """Per column changes of the modified rows, only in the columns of their changed groups."""
+
+    changes = []
+    for number, columns in enumerate(groups.values()):
+        rows = np.flatnonzero(changed[:, number])
+        for column in columns:
+            old_values, old_hashes = column_hashes(old_rows[column].iloc[rows])
+            new_values, new_hashes = column_hashes(new_rows[column].iloc[rows])
+            different = old_hashes != new_hashes
+            if different.any():
+                changes.append(pd.DataFrame({"Name": new_rows[NAME_COLUMN].to_numpy(dtype=object)[rows[different]],
+                                             "column": column, "group": list(groups)[number],
+                                             "old": old_values[different].astype(object),
+                                             "new": new_values[different].astype(object)}))
+    if not changes:
+        return pd.DataFrame(columns=["Name", "column", "group", "old", "new"])
+    return pd.concat(changes, ignore_index=True)
+
+
+def _scored(path, stream, chunksize, df_planets):
+    """Habitility dataframe of a catalog (only Name and Formula), like make_habit_df()."""
+
+    if not stream:
+        return make_habit_df(load_catalog(EXO_COLUMNS, path=path), df_planets)[["Name", "Formula"]]
+    return pd.concat([habits[["Name", "Formula"]] for habits in iter_scored_chunks(path, chunksize, df_planets)],
+                     ignore_index=True)
+
+
+def rank_movements(old_habits, new_habits):
+    """Ranks by Formula of the planets in both habitility dataframes and how far they moved.
+
+    Args:
+        old_habits: Habitility dataframe of the old catalog.
+        new_habits: Habitility dataframe of the new catalog.
+
+    Returns:
+        Dataframe with Name, old_rank, new_rank (1 is the best, missing if not in that catalog), movement
+        (positive: moved up), old_formula and new_formula, for the planets whose rank or Formula changed,
+        largest movements first
+    """
+
+    def ranks(habits):
+        order = HabitabilityRanking(habits).order("Formula")
+        rank = np.empty(len(habits), dtype=np.int64)
+        rank[order] = np.arange(1, len(habits) + 1)
+        return pd.DataFrame({"rank": rank, "formula": habits["Formula"].to_numpy(dtype=float)},
+                            index=pd.Index(row_keys(habits["Name"]), name="Name"))
+
+    movements = ranks(old_habits).join(ranks(new_habits), how="outer", lsuffix="_old", rsuffix="_new")
+    movements = pd.DataFrame({"Name": movements.index.str.replace(r'#\d+$', '', regex=True),
+                              "old_rank": movements["rank_old"].astype("Int64"),
+                              "new_rank": movements["rank_new"].astype("Int64"),
+                              "old_formula": movements["formula_old"], "new_formula": movements["formula_new"]})
+    movements.insert(3, "movement", movements["old_rank"] - movements["new_rank"])
+
+    same_formula = (movements["old_formula"] == movements["new_formula"]) | \
+                   (movements["old_formula"].isna() & movements["new_formula"].isna())
+    moved = (movements["movement"] != 0).fillna(True) | ~same_formula
+    movements = movements[moved.to_numpy(dtype=bool)]
+    # largest movements first, planets that entered or left the catalog after them
+    order = np.lexsort((movements["new_rank"].to_numpy(dtype=float, na_value=np.inf),
+                        -movements["movement"].abs().to_numpy(dtype=float, na_value=-np.inf)))
+    return movements.iloc[order].reset_index(drop=True)
+
+
+def diff_catalogs(old_path, new_path, stream=False, chunksize=CHUNK_SIZE, buckets=BUCKETS, scores=True,
+                  df_planets=None):
+    """Finds the added, removed and modified rows of two versions of the exoplanet.eu catalog.
+
+    Rows are matched by planet name (repeated names by their occurrence, like row_keys()). Every
+    row is reduced to one hash per column group, so the join and the comparison only touch a few
+    integers per row, the column values are only read again for the modified rows.
+
+    In memory both catalogs come from the columnar cache (see catalog_cache.py). In streaming
+    mode the catalogs are read in chunks and their hash records are partitioned into bucket files
+    by name, then every bucket is joined on its own, so the memory is bounded by the chunk size
+    and the size of one bucket.
+
+    Args:
+        old_path: Path of the old catalog csv file.
+        new_path: Path of the new catalog csv file.
+        stream: True to stream the catalogs instead of loading them.
+        chunksize: Rows read at once in streaming mode.
+        buckets: Number of bucket files in streaming mode.
+        scores: False to skip the rank movements.
+        df_planets: solar system planets dataset for the rankings, loaded with load_solar_planets() if None.
+
+    Returns:
+        Dict with:
+            rows: number of rows of the old and the new catalog
+            added, removed: Dataframes with Name and row (row number in its catalog)
+            modified: Dataframe with Name, old_row, new_row and one boolean column per changed group
+            changes: per column changes of the modified rows (Name, column, group, old, new)
+            column_counts: number of changed rows per column
+            columns_added, columns_removed: columns that are only in the new / old catalog
+            ranks: rank movements by Formula (see rank_movements()), None if scores is False
+    """
+
+    old_columns = [column for column in pd.read_csv(old_path, nrows=0).columns if column != NAME_COLUMN]
+    new_columns = [column for column in pd.read_csv(new_path, nrows=0).columns if column != NAME_COLUMN]
+    groups = column_groups([column for column in new_columns if column in set(old_columns)])
+    columns = [column for members in groups.values() for column in members]
+
+    if stream:
+        with tempfile.TemporaryDirectory(prefix='catalog_diff_') as folder:
+            old_rows = _partition(old_path, groups, folder, 'old', buckets, chunksize)
+            new_rows = _partition(new_path, groups, folder, 'new', buckets, chunksize)
+            dtype = _record_dtype(groups)
+            parts = [diff_records(np.fromfile(os.path.join(folder, 'old_%03d.bin' % bucket), dtype=dtype),
+                                  np.fromfile(os.path.join(folder, 'new_%03d.bin' % bucket), dtype=dtype))
+                     for bucket in range(buckets)]
+        added, removed, old_modified, new_modified, changed = (
+            np.concatenate([part[number] for part in parts]) for number in range(5))
+        # buckets come in hash order, the reports are in catalog order
+        order = np.argsort(new_modified, kind='stable')
+        added, removed = np.sort(added), np.sort(removed)
+        old_modified, new_modified, changed = old_modified[order], new_modified[order], changed[order]
+        old_fetched = _fetch_rows(old_path, np.concatenate([removed, old_modified]), columns, chunksize)
+        new_fetched = _fetch_rows(new_path, np.concatenate([added, new_modified]), columns, chunksize)
+    else:
+        old_catalog = load_catalog(columns, path=old_path).reset_index()
+        new_catalog = load_catalog(columns, path=new_path).reset_index()
+        old_rows, new_rows = len(old_catalog), len(new_catalog)
+        added, removed, old_modified, new_modified, changed = diff_records(hash_rows(old_catalog, groups),
+                                                                           hash_rows(new_catalog, groups))
+        order = np.argsort(new_modified, kind='stable')
+        old_modified, new_modified, changed = old_modified[order], new_modified[order], changed[order]
+        old_fetched = old_catalog.iloc[np.concatenate([removed, old_modified])].reset_index(drop=True)
+        new_fetched = new_catalog.iloc[np.concatenate([added, new_modified])].reset_index(drop=True)
+        del old_catalog, new_catalog
+
+    old_changed = old_fetched.iloc[len(removed):].reset_index(drop=True)
+    new_changed = new_fetched.iloc[len(added):].reset_index(drop=True)
+
+    modified = pd.DataFrame({"Name": new_changed[NAME_COLUMN].to_numpy(dtype=object), "old_row": old_modified,
+                             "new_row": new_modified})
+    for number, group in enumerate(groups):
+        modified[group] = changed[:, number]
+    changes = _column_changes(old_changed, new_changed, changed, groups)
+
+    ranks = None
+    if scores:
+        if df_planets is None:
+            df_planets = load_solar_planets()
+        ranks = rank_movements(_scored(old_path, stream, chunksize, df_planets),
+                               _scored(new_path, stream, chunksize, df_planets))
+
+    return {"rows": (old_rows, new_rows),
+            "added": pd.DataFrame({"Name": new_fetched[NAME_COLUMN].iloc[:len(added)].to_numpy(dtype=object),
+                                   "row": added}),
+            "removed": pd.DataFrame({"Name": old_fetched[NAME_COLUMN].iloc[:len(removed)].to_numpy(dtype=object),
+                                     "row": removed}),
+            "modified": modified, "changes": changes,
+            "column_counts": changes["column"].value_counts(sort=True),
+            "columns_added": [column for column in new_columns if column not in set(old_columns)],
+            "columns_removed": [column for column in old_columns if column not in set(new_columns)],
+            "ranks": ranks}
+
+
+def diff_report(diff, top_n=TOP_N, examples=10):
+    """Text summary of a catalog diff.
+
+    Args:
+        diff: Dict from diff_catalogs().
+        top_n: Size of the top group for entries and exits.
+        examples: Number of planets listed per section.
+
+    Returns:
+        Report as string
+    """
+
+    def names(frame):
+        listed = ', '.join(str(name) for name in frame["Name"].head(examples))
+        return listed + (', ...' if len(frame) > examples else '')
+
+    lines = ['%d rows -> %d rows: %d added, %d removed, %d modified' %
+             (diff["rows"][0], diff["rows"][1], len(diff["added"]), len(diff["removed"]), len(diff["modified"]))]
+    if len(diff["added"]):
+        lines.append('  added: ' + names(diff["added"]))
+    if len(diff["removed"]):
+        lines.append('  removed: ' + names(diff["removed"]))
+    if diff["columns_added"] or diff["columns_removed"]:
+        lines.append('  new columns: %s, dropped columns: %s' %
+                     (', '.join(diff["columns_added"]) or '-', ', '.join(diff["columns_removed"]) or '-'))
+
+    groups = [column for column in diff["modified"].columns if column not in ("Name", "old_row", "new_row")]
+    if len(diff["modified"]):
+        lines += ['', 'Modified rows per column group:']
+        for group in groups:
+            lines.append('  %-8s %8d' % (group, diff["modified"][group].sum()))
+        lines += ['', 'Most changed columns:']
+        for column, count in diff["column_counts"].head(examples).items():
+            lines.append('  %-28s %8d' % (column, count))
+
+    status = diff["changes"][diff["changes"]["column"] == "planet_status"]
+    if len(status):
+        lines += ['', 'Status changes:']
+        for (old, new), count in status.groupby(["old", "new"], dropna=False).size().items():
+            lines.append('  %s -> %s: %d' % (old, new, count))
+
+    ranks = diff["ranks"]
+    if ranks is not None:
+        old_top = ranks["old_rank"] <= top_n
+        new_top = ranks["new_rank"] <= top_n
+        entered = ranks[new_top.fillna(False).to_numpy(dtype=bool) & ~old_top.fillna(False).to_numpy(dtype=bool)]
+        left = ranks[old_top.fillna(False).to_numpy(dtype=bool) & ~new_top.fillna(False).to_numpy(dtype=bool)]
+        lines += ['', 'Formula ranking: %d planets changed rank or value' % len(ranks),
+                  '  entered the top %d: %s' % (top_n, names(entered.sort_values("new_rank")) or '-'),
+                  '  left the top %d: %s' % (top_n, names(left.sort_values("old_rank")) or '-'),
+                  '  largest movements:']
+        for planet in ranks.dropna(subset=["movement"]).head(examples).itertuples(index=False):
+            lines.append('    %-28s %6d -> %-6d (%+d)' % (planet.Name, planet.old_rank, planet.new_rank, planet.movement))
+
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Shows what changed between two versions of the exoplanet catalog.")
+    parser.add_argument("old", help="old catalog csv file")
+    parser.add_argument("new", help="new catalog csv file")
+    parser.add_argument("--stream", action="store_true", help="read the catalogs in chunks (for very large files)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="rows read at once in streaming mode")
+    parser.add_argument("--top", type=int, default=TOP_N, help="size of the top group of the ranking")
+    parser.add_argument("--no-scores", action="store_true", help="skip the Formula rank movements")
+    parser.add_argument("--out", default=None, help="csv file for the per column changes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    diff = diff_catalogs(args.old, args.new, args.stream, args.chunksize, scores=not args.no_scores)
+    print(diff_report(diff, args.top))
+    print('\nCompared in %.2f s' % (time.perf_counter() - start))
+
+    if args.out:
+        diff["changes"].to_csv(args.out, index=False)
@@ -0,0 +1,252 @@
+from lazy_imports import lazy_import
+from ranking import HabitabilityRanking
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Number of bins per axis of the binned view, the plot never has more tiles than BINS*BINS
+BINS = 80
+
+# Number of points kept by the downsampled view
+LTTB_POINTS = 2000
+
+# Number of best planets drawn as single labeled points on top of the overview
+TOP_K = 10
+
+# Axes that are drawn on a log scale (values <= 0 are left out of these axes)
+LOG_COLUMNS = {"HZ", "Mass", "Formula", "Formula_easy"}
+
+
+def _axis_values(values, log):
+    """Values as float array, in log10 space for log axes (non-positive values become NaN)."""
+
+    values = np.asarray(values, dtype=float)
+    if log:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(values > 0, np.log10(values), np.nan)
+    return values
+
+
+def _from_axis(values, log):
+    """Inverse of _axis_values()."""
+
+    return np.power(10.0, values) if log else values
+
+
+def bin_2d(x, y, bins=BINS, log_x=False, log_y=False):
+    """Counts the points in a regular grid of bins, so plotnine only draws the non-empty bins.
+
+    Works in a single pass with np.bincount, the cost is linear in the number of points and the
+    result never has more than bins*bins rows.
+
+    Args:
+        x: Values on the x axis.
+        y: Values on the y axis.
+        bins: Number of bins per axis.
+        log_x: True to make the bins equally wide on a log scale.
+        log_y: True to make the bins equally high on a log scale.
+
+    Returns:
+        Dataframe with the corners of every non-empty bin (xmin, xmax, ymin, ymax) and its count
+    """
+
+    x = _axis_values(x, log_x)
+    y = _axis_values(y, log_y)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x = x[valid]
+    y = y[valid]
+
+    if len(x) == 0:
+        return pd.DataFrame({"xmin": [], "xmax": [], "ymin": [], "ymax": [], "count": []})
+
+    edges = []
+    cells = []
+    for values in (x, y):
+        low, high = values.min(), values.max()
+        if high == low:
+            high = low + 1.0
+        edges.append(np.linspace(low, high, bins + 1))
+        # the maximum belongs to the last bin
+        cells.append(np.minimum(((values - low) / (high - low) * bins).astype(np.int64), bins - 1))
+
+    counts = np.bincount(cells[0] * bins + cells[1], minlength=bins * bins)
+    filled = np.flatnonzero(counts)
+    column, row = np.divmod(filled, bins)
+
+    return pd.DataFrame({"xmin": _from_axis(edges[0][column], log_x),
+                         "xmax": _from_axis(edges[0][column + 1], log_x),
+                         "ymin": _from_axis(edges[1][row], log_y),
+                         "ymax": _from_axis(edges[1][row + 1], log_y),
+                         "count": counts[filled]})
+
+
+def lttb(x, y, points=LTTB_POINTS):
+    """Downsamples a series with Largest-Triangle-Three-Buckets, keeping its visual shape.
+
+    The points are sorted by x and split into equally sized buckets, from every bucket the point
+    that spans the largest triangle with the point kept before and the mean of the next bucket
+    is kept. There is one step per kept point, each one vectorized over its bucket.
+
+    Args:
+        x: Values on the x axis.
+        y: Values on the y axis.
+        points: Number of points to keep.
+
+    Returns:
+        Positions of the kept points in x and y, sorted by x
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    valid = valid[np.argsort(x[valid], kind="stable")]
+
+    if points >= len(valid) or points < 3:
+        return valid
+
+    sx = x[valid]
+    sy = y[valid]
+
+    # first and last point are always kept, the others are split into points-2 buckets
+    bounds = np.linspace(1, len(valid) - 1, points - 1).astype(np.int64)
+    sizes = np.diff(bounds)
+    mean_x = np.add.reduceat(sx[1:-1], bounds[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(sy[1:-1], bounds[:-1] - 1) / sizes
+
+    kept = np.empty(points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = len(valid) - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = bounds[bucket], bounds[bucket + 1]
+        if bucket + 1 < points - 2:
+            next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+        else:
+            next_x, next_y = sx[-1], sy[-1]
+
+        # twice the triangle area between the previous kept point, each candidate and the next mean
+        area = np.abs((sx[previous] - next_x) * (sy[start:stop] - sy[previous]) -
+                      (sx[previous] - sx[start:stop]) * (next_y - sy[previous]))
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+
+    return valid[kept]
+
+
+def overview_data(habits, x="HZ", y="Formula", mode="bins", bins=BINS, points=LTTB_POINTS, top_k=TOP_K,
+                  ranking=None):
+    """Reduces a habitility dataframe of any size to what the overview plot draws.
+
+    Args:
+        habits (pd.DataFrame): habitility dataframe, e.g. from make_habit_df().
+        x: Column on the x axis.
+        y: Column on the y axis.
+        mode: "bins" for 2D bins with counts, "lttb" for a downsample of the points.
+        bins: Number of bins per axis (mode "bins").
+        points: Number of points to keep (mode "lttb").
+        top_k: Number of best planets by Formula that are drawn as labeled points.
+        ranking: HabitabilityRanking of habits, created if None.
+
+    Returns:
+        Dataframe of the bins or the kept points, and dataframe of the top_k planets
+    """
+
+    log_x, log_y = x in LOG_COLUMNS, y in LOG_COLUMNS
+
+    if mode == "bins":
+        data = bin_2d(habits[x], habits[y], bins, log_x, log_y)
+    elif mode == "lttb":
+        x_values = _axis_values(habits[x], log_x)
+        y_values = _axis_values(habits[y], log_y)
+        data = habits[[x, y]].iloc[lttb(x_values, y_values, points)]
+    else:
+        raise ValueError("mode must be 'bins' or 'lttb', not %r" % mode)
+
+    ranking = ranking or HabitabilityRanking(habits)
+    top = ranking.top(top_k)[["Name", x, y]]
+
+    return data, top
+
+
+def plot_overview(habits, x="HZ", y="Formula", mode="bins", bins=BINS, points=LTTB_POINTS, top_k=TOP_K,
+                  ranking=None):
+    """Plots one column of the whole habitility dataframe against another one.
+
+    Only the bins (or the downsampled points) reach plotnine, so the render time does not grow
+    with the number of planets. The top_k planets by Formula are drawn on top with their names.
+
+    Args:
+        habits (pd.DataFrame): habitility dataframe, e.g. from make_habit_df().
+        x: Column on the x axis.
+        y: Column on the y axis.
+        mode: "bins" for 2D bins with counts, "lttb" for a downsample of the points.
+        bins: Number of bins per axis (mode "bins").
+        points: Number of points to keep (mode "lttb").
+        top_k: Number of best planets by Formula that are drawn as labeled points.
+        ranking: HabitabilityRanking of habits, created if None.
+
+    Returns:
+        plotnine ggplot object
+    """
+
+    # plotnine is slow to import, so only here where it is actually needed
+    from plotnine import (ggplot, aes, geom_point, geom_rect, geom_text, scale_x_log10, scale_y_log10,
+                          scale_fill_gradient, theme_minimal, theme, element_rect, element_text, labs)
+
+    data, top = overview_data(habits, x, y, mode, bins, points, top_k, ranking)
+
+    plot = ggplot()
+    if mode == "bins":
+        plot = plot + geom_rect(data, aes(xmin="xmin", xmax="xmax", ymin="ymin", ymax="ymax", fill="count"))
+        plot = plot + scale_fill_gradient(low="navy", high="yellow", trans="log10")
+    else:
+        plot = plot + geom_point(data, aes(x=x, y=y), color="grey", size=0.5, alpha=0.6)
+
+    plot = (plot
+            + geom_point(top, aes(x=x, y=y), color="red", size=3)
+            + geom_text(top, aes(x=x, y=y, label="Name"), color="white", size=8, va="bottom", ha="left"))
+    if x in LOG_COLUMNS:
+        plot = plot + scale_x_log10()
+    if y in LOG_COLUMNS:
+        plot = plot + scale_y_log10()
+
+    return (plot
+            + theme_minimal()
+            + theme(figure_size=(15, 8),
+                    panel_background=element_rect(fill='black'),
+                    plot_background=element_rect(fill='black'),
+                    axis_text_x=element_text(color='white'),
+                    axis_text_y=element_text(color='white'),
+                    axis_title_x=element_text(color='white'),
+                    axis_title_y=element_text(color='white'),
+                    legend_title=element_text(color='white'),
+                    legend_text=element_text(color='white'),
+                    plot_title=element_text(color='white', size=20),
+                    plot_caption=element_text(color='white'))
+            + labs(x=x, y=y, title="%s vs %s of all %d planets and exoplanets" % (y, x, len(habits)),
+                   caption="Red: the %d most habitable planets by Formula" % len(top)))
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Plots two columns of the whole habitability dataset.")
+    parser.add_argument("--x", default="HZ", help="column on the x axis")
+    parser.add_argument("--y", default="Formula", help="column on the y axis")
+    parser.add_argument("--mode", default="bins", choices=["bins", "lttb"], help="how the points are reduced")
+    parser.add_argument("--top", type=int, default=TOP_K, help="number of labeled planets")
+    parser.add_argument("--out", default=None, help="image file to write instead of showing the plot")
+    args = parser.parse_args()
+
+    from exoplanets_formula import make_habit_df
+
+    overview = plot_overview(make_habit_df(), args.x, args.y, args.mode, top_k=args.top)
+    if args.out:
+        import matplotlib
+        matplotlib.use('Agg')
+        overview.save(args.out, verbose=False)
+    else:
+        print(overview)
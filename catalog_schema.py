@@ -0,0 +1,88 @@
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, load_catalog
+
+# heavy libraries are only imported when they are used for the first time
+pd = lazy_import('pandas')
+
+
+# Compact dtypes of the exoplanet.eu columns we use, the other columns keep the pd.read_csv() dtypes
+CATALOG_SCHEMA = {
+    "planet_status": "category",     # one value ("Confirmed") in the whole catalog
+    "detection_type": "category",    # a handful of methods
+    "star_name": "category",         # planets of the same star share one entry
+    "discovered": "Int16",           # year, missing for some planets
+    "updated": "datetime64[s]",      # date of the last change (YYYY-MM-DD)
+}
+
+# Columns that can be stored as float32: the catalog gives them with fewer than 7 significant
+# digits and they are not used by the Formula. Epochs (tzero_tr), periods and semi-major axes
+# need more digits, the Formula inputs stay float64 so the ranking does not change.
+FLOAT32_COLUMNS = ["radius", "angular_distance", "temp_calculated", "star_age", "star_radius", "star_teff"]
+
+
+def schema_dtypes(columns=None, float32=False):
+    """Dtypes of the compact schema for some catalog columns.
+
+    Args:
+        columns: Columns of the catalog, all columns of the schema if None.
+        float32: True to store the FLOAT32_COLUMNS as float32.
+
+    Returns:
+        Dict column -> dtype, for load_catalog(dtypes=...)
+    """
+
+    dtypes = dict(CATALOG_SCHEMA)
+    if float32:
+        dtypes.update({column: "float32" for column in FLOAT32_COLUMNS})
+    if columns is not None:
+        dtypes = {column: dtype for column, dtype in dtypes.items() if column in columns}
+    return dtypes
+
+
+def load_typed_catalog(columns=None, path=CATALOG_PATH, cache_dir=None, float32=False):
+    """Loads catalog columns through the columnar cache directly in the compact schema.
+
+    Args:
+        columns: Names of the columns to load, all columns if None.
+        path: Path of the csv file.
+        cache_dir: Cache folder, the default folder next to the csv file if None.
+        float32: True to store the FLOAT32_COLUMNS as float32.
+
+    Returns:
+        Dataframe like load_catalog(), with the dtypes of schema_dtypes()
+    """
+
+    return load_catalog(columns, path, cache_dir, dtypes=schema_dtypes(columns, float32))
+
+
+def memory_report(frames):
+    """Compares the memory of several versions of the same dataframe, column by column.
+
+    Args:
+        frames: Dict name -> dataframe, the first one is the reference.
+
+    Returns:
+        Dataframe with the bytes of every column (and the index and total) per version,
+        and the share of the reference that each version needs
+    """
+
+    usage = pd.DataFrame({name: frame.memory_usage(deep=True) for name, frame in frames.items()})
+    usage.loc["total"] = usage.sum()
+
+    reference = usage.columns[0]
+    for name in usage.columns[1:]:
+        usage[name + " / " + reference] = (usage[name] / usage[reference]).round(3)
+
+    return usage
+
+
+if __name__ == "__main__":
+
+    from exoplanets_formula import EXO_COLUMNS
+
+    # memory of the columns used by exoplanets_formula in the default and the compact schema
+    report = memory_report({"default": load_catalog(EXO_COLUMNS),
+                            "typed": load_typed_catalog(EXO_COLUMNS),
+                            "typed+float32": load_typed_catalog(EXO_COLUMNS, float32=True)})
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(report)
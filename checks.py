@@ -0,0 +1,1046 @@
+import argparse
+import os
+import sys
+import tempfile
+import traceback
+from lazy_imports import lazy_import
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+def _baseline_habits():
+    """Habitility dataframe of the original exoplanets_formula.py, a frozen copy of its per-planet loop.
+
+    It does not use any code of this repository, so it stays the reference when the scoring changes.
+    """
+
+    import math
+
+    # clean_exo_dataset()
+    catalog = pd.read_csv('data/exoplanet.eu_catalog.csv', index_col=0)
+    exoplanets = catalog[["planet_status", "mass", "radius", "orbital_period", "semi_major_axis", "eccentricity",
+                          "angular_distance", "discovered", "updated", "tzero_tr", "temp_calculated", "detection_type",
+                          "star_name", "star_age", "star_radius", "star_distance", "star_teff", "star_mass"]]
+    exoplanets = exoplanets.reset_index()
+    exoplanets.index = exoplanets.index + 1
+    exoplanets = exoplanets.dropna(subset=["mass", "radius", "eccentricity", "tzero_tr", "temp_calculated",
+                                           "star_radius", "star_teff", "star_distance", "star_mass"])
+    exoplanets = exoplanets[["# name", "mass", "star_distance", "star_mass", "eccentricity"]].reset_index(drop=True)
+
+    # habits_earth()
+    solar_system = pd.read_csv('data/solarPlanets.csv').reset_index()
+    solar_system = solar_system.rename(columns={"Unnamed: 0": "# name", "mass (Earth=1)": "mass",
+                                                "mean distance from Sun (AU)": "star_distance",
+                                                "orbital eccentricity": "eccentricity"})
+    solar_system = solar_system[["# name", "mass", "star_distance", "eccentricity"]].copy()
+    solar_system["star_mass"] = 1
+
+    # make_habit_df() with habitility_parameters() and calculate_habitable_zone()
+    all_exoplanets = pd.concat([exoplanets, solar_system], axis=0, ignore_index=True)
+    rows = []
+    for planet in all_exoplanets.index:
+        values = all_exoplanets.loc[planet]
+        l_star = pow(values["star_mass"], 3)
+        hz = abs(float(values["star_distance"]) - math.sqrt(l_star / pow(1, 3)))
+        mass = float(values["mass"])
+        rows.append((values["# name"], mass, hz, float(values["eccentricity"]), 1 if 0.1 < mass < 5.0 else 0))
+    habits = pd.DataFrame(rows, columns=["Name", "Mass", "HZ", "Orbit", "Mass_range"])
+
+    # the Formula and its adjustments for the solar system planets
+    with np.errstate(divide='ignore', invalid='ignore'):
+        habits["Formula"] = 6.77047/habits["HZ"] * (1-habits["Orbit"]) * habits["Mass_range"]
+        habits["Formula_easy"] = 6.77047/habits["HZ"] * (1-habits["Orbit"])
+    habits = habits.replace([np.inf], 50)
+    habits["Formula"] = np.where(habits["Formula"] > 1, habits["Formula"]/10, habits["Formula"])
+
+    return habits
+
+
+def check_scoring():
+    """Scoring: the vectorized make_habit_df() gives the values of the original per-planet loop."""
+
+    from exoplanets_formula import make_habit_df
+
+    habits = make_habit_df()
+    expected = _baseline_habits()
+    assert list(habits["Name"]) == list(expected["Name"])
+    for column in ("Mass", "HZ", "Orbit", "Mass_range", "Formula", "Formula_easy"):
+        assert np.allclose(habits[column], expected[column], rtol=1e-12, atol=0, equal_nan=True), column
+
+    earth = habits[habits["Name"] == "Earth"].iloc[0]
+    assert earth["Formula"] == 5 and earth["Formula_easy"] == 50
+
+
+def check_catalog_cache():
+    """Catalog cache: the same frame as pd.read_csv(), rebuilt when the csv file changes."""
+
+    import shutil
+    from catalog_cache import CATALOG_PATH, cache_is_fresh, load_catalog
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, 'catalog.csv')
+        shutil.copyfile(CATALOG_PATH, path)
+        expected = pd.read_csv(path, index_col=0)
+
+        assert not cache_is_fresh(path)
+        pd.testing.assert_frame_equal(load_catalog(path=path), expected, check_dtype=False)
+        assert cache_is_fresh(path)
+        pd.testing.assert_frame_equal(load_catalog(["mass", "star_name"], path=path), expected[["mass", "star_name"]],
+                                      check_dtype=False)
+
+        # a touched but unchanged file keeps its cache, a changed one is read again
+        os.utime(path, ns=(0, 0))
+        assert cache_is_fresh(path)
+        expected.iloc[:10].to_csv(path)
+        assert not cache_is_fresh(path)
+        assert len(load_catalog(["mass"], path=path)) == 10
+
+
+def check_imports():
+    """Library modules: importing them prints nothing, writes nothing and loads no heavy library."""
+
+    import subprocess
+    from benchmarks import LIBRARY_MODULES, bench_import_time
+
+    def data_files():
+        return {os.path.join(folder, name): os.stat(os.path.join(folder, name)).st_mtime_ns
+                for folder, folders, names in os.walk('data') if '.cache' not in folder.split(os.sep)
+                for name in names}
+
+    before = data_files()
+    for module in LIBRARY_MODULES:
+        run = subprocess.run([sys.executable, '-c', 'import ' + module], capture_output=True, text=True)
+        assert run.returncode == 0 and run.stdout == '' and run.stderr == '', (module, run.stdout, run.stderr)
+    assert data_files() == before
+
+    for result in bench_import_time(repeat=1):
+        assert not result['heavy_loaded'], result
+
+    # the first use of a lazy library from several threads at once: every thread sees the whole module
+    threads = ("import concurrent.futures; from lazy_imports import lazy_import; pd = lazy_import('pandas')\n"
+               "with concurrent.futures.ThreadPoolExecutor(8) as executor:\n"
+               "    print(set(executor.map(lambda _: pd.DataFrame({'a': [1]}).shape, range(8))))")
+    run = subprocess.run([sys.executable, '-c', threads], capture_output=True, text=True)
+    assert run.returncode == 0 and run.stdout == '{(1, 1)}\n', (run.returncode, run.stdout, run.stderr)
+
+
+def check_stream():
+    """Streaming mode: the chunks and the streamed ranking give the results of make_habit_df()."""
+
+    from catalog_cache import CATALOG_PATH
+    from exoplanets_formula import make_habit_df
+    from habitability_output import read_results
+    from habitability_stream import iter_scored_chunks, stream_habitability
+
+    habits = make_habit_df()
+    ranked = habits.sort_values(by="Formula", ascending=False, kind="stable")
+
+    pd.testing.assert_frame_equal(pd.concat(iter_scored_chunks(CATALOG_PATH, 700)), habits, check_dtype=False)
+    with tempfile.TemporaryDirectory() as work_dir:
+        out_path = os.path.join(work_dir, 'habitability.csv')
+        top = stream_habitability(CATALOG_PATH, out_path, chunksize=700, top_k=30)
+        assert list(top["Name"]) == list(ranked["Name"][:30])
+        written = read_results(out_path)
+        assert list(written["Name"]) == list(ranked["Name"])
+        assert np.allclose(written["Formula"], ranked["Formula"], equal_nan=True)
+
+
+def check_ranking():
+    """Ranking: the same order as a stable sort_values, whether the full order is cached or not."""
+
+    from exoplanets_formula import make_habit_df
+    from ranking import HabitabilityRanking
+
+    habits = make_habit_df()
+    for by, ascending in (("Formula", False), ("HZ", True)):
+        expected = habits.sort_values(by=by, ascending=ascending, kind="stable", na_position="last")
+        for cached in (False, True):
+            ranking = HabitabilityRanking(habits)
+            if cached:
+                ranking.order(by)
+            for n in (-5, 0, 1, 20, len(habits), len(habits) + 5):
+                assert ranking.top(n, by).index.equals(expected.index[:max(n, 0)]), (by, cached, n)
+        assert HabitabilityRanking(habits).ranked(by).index.equals(expected.index), by
+
+
+def check_incremental():
+    """Incremental re-scoring: after changes of the catalog the same values and ranking as scoring everything."""
+
+    import shutil
+    from catalog_cache import CATALOG_PATH, load_catalog
+    from exoplanets_formula import EXO_COLUMNS, clean_exo_dataset, make_habit_df
+    from habitability_incremental import update_habitability
+    from ranking import HabitabilityRanking
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, 'catalog.csv')
+        state_path = os.path.join(work_dir, 'state.pkl')
+        shutil.copyfile(CATALOG_PATH, path)
+
+        catalog = pd.read_csv(path)
+        rng = np.random.default_rng(0)
+        for step in range(3):
+            habits, ranking, stats = update_habitability(path, state_path, out_path=None)
+            expected = make_habit_df(load_catalog(EXO_COLUMNS, path=path))
+            pd.testing.assert_frame_equal(habits, expected, check_dtype=False)
+            assert np.array_equal(ranking.order("Formula"), HabitabilityRanking(expected).order("Formula")), step
+            if step > 0:
+                assert stats["changed"] > 0 and stats["removed"] > 0 and stats["added"] > 0, stats
+
+            # next version of the rows that are scored: some masses change, some rows go and some new
+            # ones (also a repeated name) come
+            scored = clean_exo_dataset(catalog.set_index("# name")).index.to_numpy() - 1
+            changed = rng.choice(scored, 20, replace=False)
+            catalog.loc[changed, "mass"] = catalog.loc[changed, "mass"] * 1.5
+            added = catalog.iloc[rng.choice(scored, 5, replace=False)].copy()
+            catalog = catalog.drop(index=rng.choice(scored, 10, replace=False))
+            added.loc[added.index[1:], "# name"] = added["# name"].iloc[1:] + " new %d" % step
+            catalog = pd.concat([catalog, added], ignore_index=True)
+            catalog.to_csv(path, index=False)
+
+
+def check_scraper():
+    """Scraper: the table of the page, a second fetch answered 304 from the response cache."""
+
+    import glob
+    import json
+    from unittest import mock
+    from benchmarks import MockSite, planets_table_html
+    from ourSolarSystem import cache_path, fetch_page, get_session, scrape_planets_table
+
+    expected = pd.read_csv('data/solarPlanets.csv', index_col=0, dtype=str, keep_default_na=False)
+    with MockSite(planets_table_html(), latency=0.0) as site, tempfile.TemporaryDirectory() as cache_dir:
+        url = site.url('planets_table.html')
+        session = get_session()
+
+        first = fetch_page(url, cache_dir, session)
+        second = fetch_page(url, cache_dir, session)
+        assert first["modified"] and not second["modified"]
+        assert first["content"] == second["content"]
+
+        for _ in range(2):
+            table = scrape_planets_table(url, cache_dir, session)
+            pd.testing.assert_frame_equal(table, expected, check_names=False, check_index_type=False,
+                                          check_column_type=False)
+        assert site.requests == 4, site.requests
+
+        # a new version of the page, stored while the cached validators are those of the old one
+        path = cache_path(url, cache_dir)
+        site.content = site.content.replace(b">Earth<", b">Terra<")
+        renamed = expected.rename(index={"Earth": "Terra"})
+
+        def write_old_validators():
+            with open(path + ".json") as f:
+                meta = json.load(f)
+            meta["etag"] = '"v0"'
+            with open(path + ".json", "w") as f:
+                json.dump(meta, f)
+
+        # interrupted before the validators are replaced: no validators next to the new content
+        write_old_validators()
+        real_replace = os.replace
+
+        def failing_replace(src, dst):
+            if dst.endswith(".json"):
+                raise OSError("interrupted")
+            real_replace(src, dst)
+
+        with mock.patch("os.replace", failing_replace):
+            try:
+                fetch_page(url, cache_dir, session)
+            except OSError:
+                pass
+        assert not os.path.exists(path + ".json")
+        assert fetch_page(url, cache_dir, session)["modified"]
+
+        # the new version was stored but not parsed yet: the 304 must not return the table of the old one
+        table = scrape_planets_table(url, cache_dir, session)
+        pd.testing.assert_frame_equal(table, renamed, check_names=False, check_index_type=False,
+                                      check_column_type=False)
+        assert len(glob.glob(path + ".*.table.pkl")) == 1
+
+def check_async_scraper():
+    """Async scraper: every page once and in the given order, requests to a host spaced by the rate limit."""
+
+    import asyncio
+    import time
+    from benchmarks import MockSite, planets_table_html
+    from ourSolarSystem import get_session
+    from solar_system_scraper import HostRateLimiter, combine_tables, scrape_tables
+
+    expected = pd.read_csv('data/solarPlanets.csv', index_col=0, dtype=str, keep_default_na=False)
+    with MockSite(planets_table_html(), latency=0.01) as site, tempfile.TemporaryDirectory() as cache_dir:
+        urls = [site.url('page_%d.html' % number) for number in range(6)]
+        tables = scrape_tables(urls[::-1] + urls[:2], concurrency=3, rate_per_host=1000.0, cache_dir=cache_dir,
+                               session=get_session())
+        assert list(tables) == urls[::-1]
+        assert site.requests == len(urls), site.requests
+        combined = combine_tables(tables)
+        assert len(combined) == len(urls) * len(expected)
+        pd.testing.assert_frame_equal(combined.iloc[:len(expected)], expected, check_names=False,
+                                      check_index_type=False, check_column_type=False)
+
+    async def request_times(limiter, hosts):
+        loop = asyncio.get_running_loop()
+
+        async def request(host):
+            await limiter.wait(host)
+            return host, loop.time()
+
+        return await asyncio.gather(*(request(host) for host in hosts))
+
+    start = time.perf_counter()
+    times = asyncio.run(request_times(HostRateLimiter(rate=20.0), ['a', 'b'] * 4))
+    for host in ('a', 'b'):
+        host_times = [when for name, when in times if name == host]
+        assert min(np.diff(host_times)) >= 0.05 - 0.005, host_times
+    assert time.perf_counter() - start < 0.5
+
+
+def check_plot_cache():
+    """Plot rendering: the interactive plots come from the render cache, a changed input renders again."""
+
+    import matplotlib
+    import plot_render
+    from exoplanets_formula import make_habit_df, render_habitability_plot
+    from plottingAndAllTheFun import load_planets
+    from ranking import HabitabilityRanking
+
+    matplotlib.use('Agg')
+    top = HabitabilityRanking(make_habit_df()).top(20)
+    df_planets = load_planets()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        def render():
+            return [render_habitability_plot(top, cache_dir=cache_dir),
+                    plot_render.render_attribute_plot(df_planets, "1", cache_dir=cache_dir)]
+
+        first = render()
+        written = [os.stat(path).st_mtime_ns for path in first]
+        # the second time nothing is rendered, the same files are returned
+        assert render() == first
+        assert [os.stat(path).st_mtime_ns for path in first] == written
+        assert len(os.listdir(cache_dir)) == 2
+
+        changed = top.assign(Formula=top["Formula"] * 2)
+        assert render_habitability_plot(changed, cache_dir=cache_dir) not in first
+        assert len(os.listdir(cache_dir)) == 3
+
+
+def check_overview():
+    """Overview plot: the bins count like np.histogram2d, lttb picks the points of a plain LTTB loop."""
+
+    from catalog_overview import LTTB_POINTS, bin_2d, lttb, overview_data
+    from exoplanets_formula import make_habit_df
+
+    rng = np.random.default_rng(0)
+    x = rng.lognormal(size=20_000)
+    y = rng.normal(size=20_000)
+    y[::100] = np.nan
+
+    for log_x in (False, True):
+        bins = bin_2d(x, y, bins=30, log_x=log_x)
+        axis_x = np.log10(x) if log_x else x
+        valid = np.isfinite(y)
+        counts, _, _ = np.histogram2d(axis_x[valid], y[valid], bins=30)
+        assert bins["count"].sum() == valid.sum()
+        assert sorted(bins["count"]) == sorted(counts[counts > 0].astype(int))
+        assert (bins["xmin"] < bins["xmax"]).all() and (bins["ymin"] < bins["ymax"]).all()
+
+    # plain LTTB, one point after the other
+    def reference(x, y, points):
+        order = np.argsort(x, kind="stable")
+        sx, sy = x[order], y[order]
+        bounds = np.linspace(1, len(sx) - 1, points - 1).astype(np.int64)
+        kept = [0]
+        for bucket in range(points - 2):
+            start, stop = bounds[bucket], bounds[bucket + 1]
+            if bucket + 1 < points - 2:
+                next_x = sx[stop:bounds[bucket + 2]].mean()
+                next_y = sy[stop:bounds[bucket + 2]].mean()
+            else:
+                next_x, next_y = sx[-1], sy[-1]
+            areas = [abs((sx[kept[-1]] - next_x) * (sy[i] - sy[kept[-1]]) -
+                         (sx[kept[-1]] - sx[i]) * (next_y - sy[kept[-1]])) for i in range(start, stop)]
+            kept.append(start + int(np.argmax(areas)))
+        return order[kept + [len(sx) - 1]]
+
+    valid = np.flatnonzero(np.isfinite(y))
+    kept = lttb(x, y, points=200)
+    assert len(kept) == 200 and np.all(np.diff(x[kept]) >= 0)
+    assert np.array_equal(kept, valid[reference(x[valid], y[valid], 200)])
+    assert len(lttb(x, y, points=len(x))) == len(valid)
+
+    habits = make_habit_df()
+    for mode in ("bins", "lttb"):
+        data, top = overview_data(habits, mode=mode, top_k=5)
+        assert list(top["Name"]) == list(habits.sort_values("Formula", ascending=False, kind="stable")["Name"][:5])
+    assert 0 < len(data) <= LTTB_POINTS
+    try:
+        overview_data(habits, mode="points")
+        raise AssertionError("unknown mode accepted")
+    except ValueError:
+        pass
+
+
+def check_synthetic_catalog():
+    """Pipeline benchmark: synthetic catalogs are reproducible, written in chunks and go through the pipeline."""
+
+    import filecmp
+    from benchmarks import measure, synthetic_catalog
+    from catalog_cache import load_catalog
+    from exoplanets_formula import EXO_COLUMNS, make_habit_df
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = [synthetic_catalog(2_500, os.path.join(work_dir, 'catalog_%d.csv' % number), chunksize=1_000)
+                 for number in range(2)]
+        assert filecmp.cmp(paths[0], paths[1], shallow=False)
+
+        catalog = pd.read_csv(paths[0])
+        assert len(catalog) == 2_500 and catalog["# name"].is_unique
+        assert list(catalog.columns[:len(EXO_COLUMNS) + 1]) == ["# name"] + EXO_COLUMNS
+
+        habits, seconds, peak = measure(lambda: make_habit_df(load_catalog(EXO_COLUMNS, path=paths[0],
+                                                                           cache_dir=work_dir)), repeat=1)
+        assert habits["Name"].str.startswith("SYN-").sum() > 0 and seconds > 0 and peak > 0
+
+
+def check_profiling():
+    """Profiling: nested stage records, the json report and the cProfile dump of the slowest stage."""
+
+    import json
+    import pstats
+    import subprocess
+    import time
+    import profiling
+    from profiling import PROFILE_ENV, Profiler
+
+    assert profiling.stage("off") is profiling.stage("also off")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        report_path = os.path.join(work_dir, 'report.json')
+        cprofile_path = os.path.join(work_dir, 'slowest.prof')
+
+        profiler = Profiler(report_path, cprofile_path)
+        with profiler.stage("fast", rows=3):
+            pass
+        with profiler.stage("slow") as record:
+            with profiler.stage("inner"):
+                data = list(range(100_000))
+            time.sleep(0.05)
+            record["rows"] = len(data)
+        profiler.write()
+
+        with open(report_path) as f:
+            report = json.load(f)
+        assert [(stage["stage"], stage["depth"], stage["rows"]) for stage in report["stages"]] == \
+            [("fast", 0, 3), ("slow", 0, 100_000), ("inner", 1, None)]
+        assert report["hottest_stage"] == "slow" and report["cprofile"] == cprofile_path
+        assert report["stages"][1]["seconds"] >= 0.05 and report["stages"][2]["peak_alloc_bytes"] > 0
+        assert all(stage["process_max_rss_bytes"] > 0 for stage in report["stages"])
+
+        # nested stages do not erase the peak of the enclosing stage, and their peaks count for it
+        profiler = Profiler()
+        with profiler.stage("outer") as outer:
+            block = bytearray(20_000_000)
+            del block
+            with profiler.stage("inner") as inner:
+                block = bytearray(30_000_000)
+                del block
+            with profiler.stage("small"):
+                pass
+        assert 30_000_000 <= inner["peak_alloc_bytes"] < 31_000_000
+        assert 30_000_000 <= outer["peak_alloc_bytes"] < 31_000_000
+        with profiler.stage("outer") as outer:
+            block = bytearray(20_000_000)
+            del block
+            with profiler.stage("inner"):
+                pass
+        assert outer["peak_alloc_bytes"] >= 20_000_000
+        pstats.Stats(cprofile_path)
+
+        # a whole run, switched on by the environment variable
+        environment = dict(os.environ, MPLBACKEND='agg', **{PROFILE_ENV: report_path})
+        run = subprocess.run([sys.executable, 'exoplanets_formula.py', '--out', os.path.join(work_dir, 'ranking.csv')],
+                             capture_output=True, text=True, env=environment)
+        assert run.returncode == 0, run.stderr
+        with open(report_path) as f:
+            stages = [stage["stage"] for stage in json.load(f)["stages"]]
+        assert stages[0] == "load" and {"clean", "score", "rank", "write", "plot"} <= set(stages), stages
+
+
+def check_schema():
+    """Typed catalog: the dtypes of the schema, the same values as pd.read_csv() in less memory."""
+
+    from catalog_cache import CATALOG_PATH, load_catalog
+    from catalog_schema import CATALOG_SCHEMA, FLOAT32_COLUMNS, load_typed_catalog, schema_dtypes
+
+    columns = ["# name", "mass", "star_name", "discovered", "updated", "radius", "star_teff"]
+    assert schema_dtypes(columns) == {"star_name": "category", "discovered": "Int16", "updated": "datetime64[s]"}
+    assert set(schema_dtypes(float32=True)) == set(CATALOG_SCHEMA) | set(FLOAT32_COLUMNS)
+
+    expected = pd.read_csv(CATALOG_PATH, usecols=columns)[columns]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        typed = load_typed_catalog(columns, cache_dir=cache_dir, float32=True)
+        default = load_catalog(columns, cache_dir=cache_dir)
+
+    assert typed["star_name"].dtype == "category" and typed["discovered"].dtype == "Int16"
+    assert typed["updated"].dtype == "datetime64[s]" and typed["radius"].dtype == "float32"
+    assert typed["mass"].dtype == "float64"
+
+    # load_catalog() indexes the rows by name, compare them by position
+    typed = typed.reset_index(drop=True)
+    assert typed["# name"].equals(expected["# name"]) and typed["mass"].equals(expected["mass"])
+    assert typed["star_name"].astype(object).equals(expected["star_name"].astype(object))
+    assert (typed["discovered"].astype("Float64") == expected["discovered"]).fillna(True).all()
+    assert typed["discovered"].isna().equals(expected["discovered"].isna())
+    assert (typed["updated"] == pd.to_datetime(expected["updated"])).all()
+    for column in ("radius", "star_teff"):
+        assert np.allclose(typed[column], expected[column], rtol=1e-6, equal_nan=True)
+
+    assert typed.memory_usage(deep=True).sum() < default.memory_usage(deep=True).sum()
+
+
+def check_uncertainty():
+    """Monte Carlo habitability: reproducible for any number of processes, exact for planets without errors."""
+
+    from exoplanets_formula import make_habit_df
+    from habitability_uncertainty import ERROR_COLUMNS, load_uncertain_planets, uncertain_habitability
+
+    planets = load_uncertain_planets()
+    habits = make_habit_df()
+    assert list(planets["# name"]) == list(habits["Name"])
+    assert (planets[ERROR_COLUMNS] >= 0).all().all()
+
+    options = dict(planets=planets, samples=100, top_n=10, seed=1, max_cells=200_000)
+    result = uncertain_habitability(processes=1, **options)
+    pd.testing.assert_frame_equal(result, uncertain_habitability(processes=2, **options))
+    assert not result.equals(uncertain_habitability(processes=1, **dict(options, seed=2)))
+
+    assert np.allclose(result["Formula"], habits["Formula"], equal_nan=True)
+    exact = (planets[ERROR_COLUMNS] == 0).all(axis=1).to_numpy() & np.isfinite(result["Formula"].to_numpy())
+    assert exact.sum() > 0
+    for column in ("Formula_median", "Formula_p5", "Formula_p95"):
+        assert np.allclose(result[column][exact], result["Formula"][exact])
+    assert (result["Formula_p5"] <= result["Formula_median"]).all()
+    assert (result["Formula_median"] <= result["Formula_p95"]).all()
+    assert result["P_mass_range"].between(0, 1).all() and result["P_top10"].between(0, 1).all()
+    assert result["P_top10"].sum() >= 10
+
+
+def check_similarity():
+    """Similarity search: the KD-tree finds the planets of a brute-force search, the saved index is reused."""
+
+    from catalog_cache import CATALOG_PATH
+    from planet_similarity import SimilarityIndex, esi, load_index, similarity_features
+
+    features = similarity_features()
+    index = SimilarityIndex(features)
+    points = (SimilarityIndex._transform(features) - index.center) / index.scale
+
+    def brute_force(reference, k):
+        distances = np.sqrt(((points - index._point(reference)) ** 2).sum(axis=1))
+        return np.sort(distances)[:k]
+
+    earth = index.reference("Earth")
+    assert earth["mass"] == 1.0
+    result = index.nearest("Earth", k=10)
+    assert len(result) == 10 and "Earth" not in set(result["# name"])
+    assert np.allclose(result["distance"], brute_force(earth, 11)[1:])
+    assert np.allclose(result["ESI"], esi(result, earth))
+    assert np.allclose(esi({feature: [value] for feature, value in earth.items()}, earth), 1.0)
+
+    queries = ["Mars", features["# name"][5], dict(earth, mass=2.0)]
+    for query, batch in zip(queries, index.nearest_batch(queries, k=7)):
+        pd.testing.assert_frame_equal(batch, index.nearest(query, k=7))
+    assert np.allclose(index.nearest(queries[2], k=7)["distance"], brute_force(queries[2], 7))
+
+    within = index.within("Earth", 1.0)
+    assert np.array_equal(within["distance"], np.sort(within["distance"]))
+    assert len(within) == (brute_force(earth, len(points)) <= 1.0).sum() - 1
+
+    try:
+        index.nearest("No such planet")
+        raise AssertionError("unknown planet accepted")
+    except KeyError:
+        pass
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, 'index.pkl')
+        built = load_index(path=path)
+        mtime = os.stat(path).st_mtime_ns
+        loaded = load_index(path=path)
+        assert os.stat(path).st_mtime_ns == mtime
+        assert np.array_equal(loaded.tree.data, built.tree.data)
+        pd.testing.assert_frame_equal(loaded.nearest("Earth"), index.nearest("Earth"))
+
+        # an index of another catalog is rebuilt
+        with open(CATALOG_PATH) as f:
+            lines = f.readlines()
+        other_catalog = os.path.join(work_dir, 'catalog.csv')
+        with open(other_catalog, 'w') as f:
+            f.writelines(lines[:-100])
+        assert len(load_index(catalog_path=other_catalog, path=path).names) < len(built.names)
+
+
+def check_star_systems():
+    """Star systems: per-star values give the same habitability as make_habit_df(), lookups of unknown stars."""
+
+    from exoplanets_formula import calculate_habitable_zone, make_habit_df
+    from star_systems import load_star_systems
+
+    systems = load_star_systems()
+    pd.testing.assert_frame_equal(systems.habits, make_habit_df().reset_index(drop=True))
+    assert np.allclose(systems.habitable_zone_distance(), calculate_habitable_zone(systems.planets), equal_nan=True)
+    assert systems.summary["planets"].sum() == len(systems.planets)
+
+    sun = systems.system("Sun")
+    assert list(sun["planets"]) == [8]
+    assert len(systems.planets_of("Sun")) == 8
+    assert len(systems.system("No Such Star")) == 0
+    assert len(systems.planets_of("No Such Star")) == 0
+
+
+def check_service():
+    """Query service: answers, status codes of bad queries and the row limits."""
+
+    import json
+    from habitability_service import MAX_ROWS, HabitabilityService
+
+    service = HabitabilityService()
+
+    def rows(path, query=''):
+        status, body = service.answer(path, query)
+        assert status == 200, (path, query, status)
+        return json.loads(body)['result']
+
+    planets = len(service.current[0].habits)
+    assert len(rows('/top', 'n=5')) == 5
+    assert len(rows('/top', 'n=0')) == 0
+    assert len(rows('/top', 'n=%d' % (MAX_ROWS + 1))) == min(planets, MAX_ROWS)
+    assert [planet["Name"] for planet in rows('/planet', 'name=Earth')] == ["Earth"]
+    assert all(0.1 <= planet["Mass"] <= 5 for planet in rows('/filter', 'column=Mass&min=0.1&max=5&limit=20'))
+    for path, query in (('/top', 'n=-5'), ('/top', 'n=x'), ('/top', 'by=Name'), ('/filter', 'column=Mass&limit=-1'),
+                        ('/solar', 'planet=99'), ('/planet', '')):
+        assert service.answer(path, query)[0] == 400, (path, query)
+    assert service.answer('/nothing')[0] == 404
+
+
+def check_shared_catalog():
+    """Shared catalog: the published tables give the loaded ones, versions move in single steps."""
+
+    from catalog_cache import load_catalog
+    from exoplanets_formula import EXO_COLUMNS, clean_exo_dataset, load_solar_planets, make_habit_df
+    import shared_catalog
+    from shared_catalog import KEEP_VERSIONS, SharedCatalog, attach, publish
+
+    with tempfile.TemporaryDirectory() as shared_dir:
+        try:
+            SharedCatalog(shared_dir)
+            raise AssertionError("attached to an empty folder")
+        except FileNotFoundError:
+            pass
+
+        catalog = attach(shared_dir)
+        assert catalog.version == 1 and publish(shared_dir=shared_dir) == 1
+
+        exoplanets = catalog.frame("exoplanets")
+        pd.testing.assert_frame_equal(exoplanets, clean_exo_dataset(load_catalog(EXO_COLUMNS)), check_index_type=False)
+        # copy(): bool columns are memmaps too, which assert_frame_equal() does not take for arrays
+        pd.testing.assert_frame_equal(catalog.frame("solar_planets").copy(), load_solar_planets(),
+                                      check_index_type=False)
+        mass = catalog.array("exoplanets", "mass")
+        assert isinstance(mass, np.memmap) and not mass.flags.writeable
+        assert np.shares_memory(catalog.frame("exoplanets", ["mass"])["mass"].to_numpy(), mass)
+
+        habits = make_habit_df(catalog.frame("exoplanets", ["# name", "mass", "star_distance", "star_mass",
+                                                            "eccentricity"]),
+                               catalog.frame("solar_planets"), clean=False)
+        pd.testing.assert_frame_equal(habits, make_habit_df())
+
+        untouched = SharedCatalog(shared_dir)
+        for version in range(2, KEEP_VERSIONS + 3):
+            assert publish(shared_dir=shared_dir, force=True) == version
+        assert not catalog.is_current() and catalog.refresh().version == KEEP_VERSIONS + 2
+        assert sorted(name for name in os.listdir(shared_dir) if name.startswith('v')) == \
+            ['v%06d' % version for version in range(3, KEEP_VERSIONS + 3)]
+
+        # handles of the removed version still read every column, also the ones they never asked for
+        assert len(mass) == len(exoplanets)
+        pd.testing.assert_frame_equal(untouched.frame("exoplanets"), exoplanets)
+        pd.testing.assert_frame_equal(untouched.frame("solar_planets"), catalog.frame("solar_planets"))
+
+        # a pointer read just before its version was removed: the attachment takes the new current version
+        stale = [{'version': 1, 'folder': 'v000001'}]
+        read_json = shared_catalog._read_json
+        shared_catalog._read_json = lambda path: stale.pop() if stale and path.endswith('current.json') \
+            else read_json(path)
+        try:
+            assert SharedCatalog(shared_dir).version == KEEP_VERSIONS + 2 and not stale
+        finally:
+            shared_catalog._read_json = read_json
+
+
+def check_solar_table():
+    """Solar system table: typed values of the scraped text, the cached table until the csv file changes."""
+
+    import shutil
+    from solar_schema import SOLAR_PLANETS_PATH, load_solar_table, parse_solar_planets
+
+    raw = pd.read_csv(SOLAR_PLANETS_PATH)
+    planets = parse_solar_planets(raw).set_index("Planet")
+    mercury, venus = planets.loc["Mercury"], planets.loc["Venus"]
+    assert mercury["diameter (km)"] == 4878.0 and venus["rotation period (in Earth days)"] == -243.0
+    assert venus["retrograde rotation"] and not mercury["retrograde rotation"]
+    assert (mercury["minimum temperature at surface (C)"], mercury["maximum temperature at surface (C)"]) == (-180, 430)
+    assert venus["minimum temperature at surface (C)"] == venus["maximum temperature at surface (C)"] == 465
+    assert planets["rings?"].dtype == bool and not mercury["rings?"]
+    assert planets["number of moons"].dtype == "Int16"
+    assert planets.attrs["units"]["diameter (km)"] == "km"
+    assert planets.attrs["units"]["rotation period (in Earth days)"] == "Earth days"
+    assert len(planets) == len(raw)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, 'solarPlanets.csv')
+        cache_dir = os.path.join(work_dir, 'cache')
+        shutil.copyfile(SOLAR_PLANETS_PATH, path)
+
+        first = load_solar_table(path, cache_dir)
+        pd.testing.assert_frame_equal(first, parse_solar_planets(raw))
+        mtime = os.stat(os.path.join(cache_dir, 'planets.pkl')).st_mtime_ns
+        pd.testing.assert_frame_equal(load_solar_table(path, cache_dir), first)
+        assert os.stat(os.path.join(cache_dir, 'planets.pkl')).st_mtime_ns == mtime
+        assert load_solar_table(path, cache_dir).attrs == first.attrs
+
+        raw.iloc[:2].to_csv(path, index=False)
+        assert list(load_solar_table(path, cache_dir)["Planet"]) == ["Mercury", "Venus"]
+
+
+def check_output():
+    """Result writers: every written row is found again through the lookup index, in every format.
+
+    The frame of make_habit_df() is concatenated from two parts, and the blocks are made small,
+    so the files have several blocks that are not cut where the parts of the frame meet.
+    """
+
+    import habitability_output
+    from exoplanets_formula import make_habit_df
+    from habitability_output import ResultIndex, read_results, write_results
+
+    habits = make_habit_df()
+    block_rows = habitability_output.BLOCK_ROWS
+    habitability_output.BLOCK_ROWS = 100
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for extension in ('csv', 'parquet', 'feather'):
+                path = os.path.join(work_dir, 'habits.' + extension)
+                write_results(habits, path, index_by="Name", chunksize=300)
+                assert len(read_results(path)) == len(habits), extension
+                index = ResultIndex(path)
+                for name, count in habits["Name"].value_counts().items():
+                    assert len(index.lookup(name)) == count, (extension, name)
+                assert len(index.lookup('No Such Planet')) == 0, extension
+    finally:
+        habitability_output.BLOCK_ROWS = block_rows
+
+
+def check_universe_merge():
+    """Universe merge: the committed merged files, written again only when something changed."""
+
+    import filecmp
+    from catalog_cache import load_catalog
+    from universe_merge import (EXO_CLEAN_PATH, SOURCE_COLUMNS, UNIVERSE_PATH, hash_join, merge_universe, name_keys,
+                                update_merged_files)
+
+    keys = name_keys(pd.Series(["Kepler-22 b", "kepler 22b", "KEPLER-22B", "Kepler-22 c", None, ""]))
+    assert len(set(keys[:3])) == 1 and keys[3] != keys[0] and keys[4] == keys[5]
+    assert list(hash_join(np.array([3, 1, 7, 3]), np.array([1, 2, 3]))) == [2, 0, -1, 2]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        universe_path = os.path.join(work_dir, 'universe_merged.csv')
+        exo_clean_path = os.path.join(work_dir, 'exoPlanets_clean.csv')
+        state_path = os.path.join(work_dir, 'state.json')
+        paths = dict(universe_path=universe_path, exo_clean_path=exo_clean_path, state_path=state_path)
+
+        assert update_merged_files(**paths)
+        assert filecmp.cmp(universe_path, UNIVERSE_PATH, shallow=False)
+        assert filecmp.cmp(exo_clean_path, EXO_CLEAN_PATH, shallow=False)
+        assert not update_merged_files(**paths)
+
+        # a changed output is written again
+        with open(universe_path, 'a') as f:
+            f.write('\n')
+        assert update_merged_files(**paths)
+        assert filecmp.cmp(universe_path, UNIVERSE_PATH, shallow=False)
+
+    # a solar system planet that is also in the catalog is kept once
+    catalog = load_catalog(SOURCE_COLUMNS)
+    universe, exo_clean = merge_universe(catalog)
+    duplicate = catalog.loc[catalog.index.isin(exo_clean["Planet"])].iloc[:1].copy()
+    duplicate.index = pd.Index(["EARTH"], name=catalog.index.name)
+    merged, _ = merge_universe(pd.concat([catalog, duplicate]))
+    assert (merged["Planet"].str.lower() == "earth").sum() == 1
+    pd.testing.assert_frame_equal(merged, universe)
+
+
+def check_sweep():
+    """Parameter sweep: one setting at a time gives the broadcasted Formula, the default setting the ranking."""
+
+    from exoplanets_formula import calculate_habitable_zone, formula_values, habit_inputs, make_habit_df, mass_in_range
+    from habitability_sweep import (DEFAULT_GRID, DEFAULT_PARAMETERS, INPUT_COLUMNS, parameter_grid, rank_matrix,
+                                    sweep_formula, sweep_habitability)
+    from ranking import HabitabilityRanking
+
+    assert len(parameter_grid(**DEFAULT_GRID)) == 720
+    try:
+        parameter_grid(gravity=[1.0])
+        raise AssertionError("unknown constant accepted")
+    except ValueError:
+        pass
+
+    planets = habit_inputs()
+    habits = make_habit_df()
+    inputs = {column: planets[column].to_numpy(dtype=float) for column in INPUT_COLUMNS}
+    grid = parameter_grid(norm=[5.0, DEFAULT_PARAMETERS["norm"]], mass_max=[4.0, DEFAULT_PARAMETERS["mass_max"]],
+                          luminosity_exponent=[3.0, 3.5], divisor=[10.0, 20.0])
+    formula = sweep_formula(inputs, {name: grid[name].to_numpy() for name in DEFAULT_PARAMETERS})
+
+    for number, setting in grid.iterrows():
+        hzs = calculate_habitable_zone(inputs, setting["luminosity_exponent"])
+        massr = mass_in_range(inputs["mass"], setting["mass_min"], setting["mass_max"])
+        expected = formula_values(hzs, inputs["eccentricity"], massr, setting["norm"], setting["inf_value"],
+                                  setting["cap"], setting["divisor"])[0]
+        assert np.allclose(formula[number], expected, equal_nan=True), setting
+
+    default = parameter_grid()
+    baseline = sweep_formula(inputs, {name: default[name].to_numpy() for name in DEFAULT_PARAMETERS})
+    assert np.allclose(baseline[0], habits["Formula"], equal_nan=True)
+    ranks = rank_matrix(baseline)[0]
+    assert np.array_equal(np.argsort(ranks), HabitabilityRanking(habits).order("Formula"))
+
+    distribution, settings = sweep_habitability(planets, grid, top_n=10, max_cells=len(planets) * 3)
+    chunked = sweep_habitability(planets, grid, top_n=10, processes=2)
+    pd.testing.assert_frame_equal(distribution, chunked[0])
+    pd.testing.assert_frame_equal(settings, chunked[1])
+
+    assert np.array_equal(distribution["Rank"], ranks)
+    assert (distribution["Rank_best"] <= distribution["Rank"]).all()
+    assert (distribution["Rank"] <= distribution["Rank_worst"]).all()
+    assert np.allclose(distribution[["P_rank%d" % rank for rank in range(1, 11)]].sum(), 1.0)
+    assert np.allclose(distribution["P_top10"].sum(), 10)
+    is_default = (settings[list(DEFAULT_PARAMETERS)] == default.iloc[0]).all(axis=1)
+    assert is_default.sum() == 1
+    assert settings.loc[is_default, "Same_top"].all() and np.allclose(settings.loc[is_default, "Spearman"], 1.0)
+    assert (settings["Top1"][is_default] == habits["Name"][ranks == 1].iloc[0]).all()
+
+
+def check_orbits():
+    """Orbit propagation: Kepler's equation solved like a scalar Newton loop, time in the zone of known orbits."""
+
+    import math
+    from exoplanets_formula import make_habit_df
+    from orbit_propagation import distance_series, orbit_planets, solve_kepler, time_in_habitable_zone
+
+    def newton(m, e):
+        m = math.remainder(m, 2 * math.pi)
+        anomaly = m if e < 0.8 else math.copysign(math.pi, m)
+        for _ in range(100):
+            step = (anomaly - e * math.sin(anomaly) - m) / (1 - e * math.cos(anomaly))
+            anomaly -= step
+            if abs(step) < 1e-15:
+                break
+        return anomaly
+
+    rng = np.random.default_rng(0)
+    m = rng.uniform(-10, 10, (50, 20))
+    e = np.concatenate([rng.uniform(0, 1, 45), [0.0, 0.999, 0.9999]])
+    e = np.concatenate([e, [1.0, np.nan]])[:, None]
+    for method in ("halley", "newton"):
+        anomaly = solve_kepler(m, e, method=method)
+        assert anomaly.shape == m.shape and np.isnan(anomaly[-2:]).all() and not np.isnan(anomaly[:-2]).any()
+        expected = np.array([[newton(m[row, column], e[row, 0]) for column in range(m.shape[1])]
+                             for row in range(len(m) - 2)])
+        assert np.allclose(anomaly[:-2], expected, rtol=0, atol=1e-9), method
+
+    for bad in (dict(method="bisection"), dict(max_iterations=1, tolerance=0.0)):
+        try:
+            solve_kepler(m, e, **bad)
+            raise AssertionError("accepted %r" % bad)
+        except (ValueError, RuntimeError):
+            pass
+
+    # on an orbit with eccentricity e a planet is closer than the semi-major axis for 1/2 - e/pi of the time
+    eccentricity = np.array([0.0, 0.1, 0.5, 0.9])
+    orbits = pd.DataFrame({"semi_major_axis": 2.0, "orbital_period": 100.0, "eccentricity": eccentricity})
+    shares = time_in_habitable_zone(orbits, np.zeros(4), np.full(4, 2.0), steps=100_000)
+    assert np.allclose(shares[1:], 0.5 - eccentricity[1:] / math.pi, atol=1e-4)
+    assert np.allclose(time_in_habitable_zone(orbits, np.full(4, 1.9), np.full(4, 2.1))[0], 1.0)
+
+    times = np.linspace(0, 300, 77)
+    distances = distance_series(orbits, times)
+    assert np.allclose(distances[0], 2.0) and np.allclose(distances[:, 0], 2.0 * (1 - eccentricity))
+    assert np.array_equal(distance_series(orbits, times, max_cells=100), distances)
+
+    planets = orbit_planets()
+    assert list(planets["# name"]) == list(make_habit_df()["Name"])
+    assert planets["semi_major_axis"].notna().all()
+    assert np.allclose(planets.set_index("# name").loc["Earth", ["semi_major_axis", "orbital_period"]], [1.0, 365.25])
+
+
+def check_animation():
+    """Animations: frame folders and GIF files, rejected empty animations."""
+
+    from PIL import Image
+    from plot_animation import render_animation, write_animation
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # a .png animation is written as a folder of frames
+        folder = render_animation("orbits", os.path.join(work_dir, 'orbits.png'), processes=1, frames=3)
+        assert sorted(os.listdir(folder)) == ['frame_00000.png', 'frame_00001.png', 'frame_00002.png']
+        umask = os.umask(0)
+        os.umask(umask)
+        assert os.stat(folder).st_mode & 0o777 == 0o777 & ~umask, oct(os.stat(folder).st_mode)
+
+        frames = [open(os.path.join(folder, name), 'rb').read() for name in sorted(os.listdir(folder))]
+        gif = write_animation(frames, os.path.join(work_dir, 'orbits.gif'), encoder='')
+        with Image.open(gif) as image:
+            assert image.n_frames == 3
+
+        for write in (lambda: render_animation("orbits", os.path.join(work_dir, 'none.gif'), processes=1, frames=0),
+                      lambda: write_animation([], os.path.join(work_dir, 'none.gif'), encoder='')):
+            try:
+                write()
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('an animation without frames was written')
+
+
+def check_catalog_diff():
+    """Catalog diff: known added, removed and modified rows, the same diff in memory and streamed."""
+
+    from catalog_cache import CATALOG_PATH
+    from catalog_diff import diff_catalogs, diff_report
+    from exoplanets_formula import make_habit_df
+    from ranking import HabitabilityRanking
+
+    catalog = pd.read_csv(CATALOG_PATH)
+    rng = np.random.default_rng(0)
+    unique = np.flatnonzero(~catalog["# name"].duplicated(keep=False).to_numpy())
+    habits = make_habit_df()
+    best = habits.loc[HabitabilityRanking(habits).order("Formula"), "Name"]
+    best = best[best.isin(catalog["# name"].iloc[unique])].iloc[0]
+    # the first unique rows are copied as new planets, the others are changed
+    candidates = unique[4:][catalog["# name"].iloc[unique[4:]] != best]
+    picked = rng.choice(candidates, 40, replace=False)
+    heavier, new_star, emptied, removed = picked[:10], picked[10:20], picked[20:25], np.sort(picked[25:])
+
+    changed = catalog.copy()
+    changed.loc[heavier, "mass"] = changed.loc[heavier, "mass"].fillna(1.0) * 2
+    changed.loc[new_star, "star_name"] = ["Renamed star %d" % number for number in range(10)]
+    changed.loc[emptied, "orbital_period"] = np.nan
+    emptied = emptied[catalog.loc[emptied, "orbital_period"].notna().to_numpy()]
+    # the best exoplanet leaves the mass range
+    changed.loc[catalog["# name"] == best, "mass"] *= 100
+    added = changed.iloc[unique[:3]].copy()
+    added["# name"] = ["New planet %d" % number for number in range(3)]
+    repeated = changed.iloc[[unique[3]]]
+    changed = pd.concat([changed.drop(index=removed), added, repeated], ignore_index=True)
+    changed["new_column"] = 1.0
+    changed = changed.drop(columns=["mag_k"])
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        new_path = os.path.join(work_dir, 'catalog.csv')
+        changed.to_csv(new_path, index=False)
+        diff = diff_catalogs(CATALOG_PATH, new_path)
+        streamed = diff_catalogs(CATALOG_PATH, new_path, stream=True, chunksize=700, buckets=8)
+        same = diff_catalogs(CATALOG_PATH, CATALOG_PATH, scores=False)
+
+    for key in ("added", "removed", "modified", "changes", "ranks"):
+        pd.testing.assert_frame_equal(streamed[key], diff[key], check_dtype=False, obj=key)
+    pd.testing.assert_series_equal(streamed["column_counts"], diff["column_counts"])
+
+    assert diff["rows"] == (len(catalog), len(changed))
+    assert list(diff["added"]["Name"]) == list(added["# name"]) + list(repeated["# name"])
+    assert list(diff["added"]["row"]) == list(range(len(changed) - 4, len(changed)))
+    assert list(diff["removed"]["row"]) == list(removed)
+    assert list(diff["removed"]["Name"]) == list(catalog["# name"][removed])
+
+    modified = diff["modified"].set_index("Name")
+    assert set(modified.index) == set(catalog["# name"][np.concatenate([heavier, new_star, emptied])]) | {best}
+    assert modified.loc[catalog["# name"][heavier], "planet"].all()
+    assert not modified.loc[catalog["# name"][heavier], "star"].any()
+    assert modified.loc[catalog["# name"][new_star], "star"].all()
+    assert modified.loc[catalog["# name"][emptied], "orbit"].all()
+    assert diff["column_counts"]["mass"] == 11 and diff["column_counts"]["star_name"] == 10
+    assert diff["column_counts"]["orbital_period"] == len(emptied)
+    assert diff["columns_added"] == ["new_column"] and diff["columns_removed"] == ["mag_k"]
+    movement = diff["ranks"].set_index("Name").loc[best]
+    assert movement["new_rank"] > movement["old_rank"] and movement["movement"] < 0
+    assert best in diff_report(diff)
+
+    assert same["rows"] == (len(catalog), len(catalog)) and same["ranks"] is None
+    assert len(same["added"]) == len(same["removed"]) == len(same["modified"]) == len(same["changes"]) == 0
+
+
+# Checks by name, in the order they run
+CHECKS = {
+    "scoring": check_scoring,
+    "catalog_cache": check_catalog_cache,
+    "imports": check_imports,
+    "stream": check_stream,
+    "ranking": check_ranking,
+    "incremental": check_incremental,
+    "scraper": check_scraper,
+    "async_scraper": check_async_scraper,
+    "plot_cache": check_plot_cache,
+    "overview": check_overview,
+    "synthetic": check_synthetic_catalog,
+    "profiling": check_profiling,
+    "schema": check_schema,
+    "uncertainty": check_uncertainty,
+    "similarity": check_similarity,
+    "star_systems": check_star_systems,
+    "service": check_service,
+    "shared_catalog": check_shared_catalog,
+    "solar_table": check_solar_table,
+    "output": check_output,
+    "universe_merge": check_universe_merge,
+    "sweep": check_sweep,
+    "orbits": check_orbits,
+    "animation": check_animation,
+    "catalog_diff": check_catalog_diff,
+}
+
+
+def main():
+    """Runs the checks and prints which ones failed.
+
+    Returns:
+        Exit code, 1 if a check failed
+    """
+
+    parser = argparse.ArgumentParser(description="Checks of the Windows to the Universe modules.")
+    parser.add_argument("checks", nargs="*", default=list(CHECKS),
+                        help="checks to run: %s (all by default)" % ', '.join(CHECKS))
+    args = parser.parse_args()
+
+    failed = False
+    for name in args.checks:
+        try:
+            CHECKS[name]()
+        except Exception:
+            print('  %-16s FAILED' % name)
+            traceback.print_exc()
+            failed = True
+        else:
+            print('  %-16s ok' % name)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -1,15 +1,45 @@
-import numpy as np
-from plotnine import *
-import pandas as pd
-import math
-import os
-import sys
-from ourSolarSystem import *
+import profiling
+from lazy_imports import lazy_import
+from catalog_cache import load_catalog
+from catalog_schema import schema_dtypes
+from habitability_output import write_results
+from plot_render import HABITABILITY_PLOT, HABITABILITY_THEME, RENDER_CACHE_DIR, render_plot, show_rendered
+from solar_schema import load_solar_table
+from ranking import HabitabilityRanking
 
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# most important parameters of the exoplanet catalog for our purpose
+EXO_COLUMNS = ["planet_status", "mass", "radius", "orbital_period", "semi_major_axis", "eccentricity", "angular_distance", "discovered", "updated", "tzero_tr", "temp_calculated", "detection_type", "star_name", "star_age", "star_radius", "star_distance", "star_teff", "star_mass"]
+
+# Default locations of the datasets
+SOLAR_PLANETS_PATH = 'data/solarPlanets.csv'
+HABITABILITY_PATH = 'data/habitability.csv'
+
+# Constants of the Formula (habitability_sweep.py checks how much the ranking depends on them)
+FORMULA_NORM = 6.77047     # normalizes the Formula for exoplanets
+MASS_RANGE = (0.1, 5.0)    # habitable between 0.1 and 5.0 earth masses
+LUMINOSITY_EXPONENT = 3    # luminosity of a star = mass of star to the power of 3
+INF_FORMULA = 50           # value of an infinite Formula (Earth)
+FORMULA_CAP = 1            # Formula values over FORMULA_CAP are divided by FORMULA_DIVISOR
+FORMULA_DIVISOR = 10
+
+
+def load_solar_planets(path=SOLAR_PLANETS_PATH):
+    """Loads the solar system planets dataset scraped by ourSolarSystem.py.
+
+    Args:
+        path: Path of the csv file.
+
+    Returns:
+        Dataframe of the solar system planets in typed columns (parsed once and cached, see solar_schema.py)
+    """
+
+    return load_solar_table(path)
 
-# Loading dataset
-d = pd.read_csv('data/exoplanet.eu_catalog.csv', index_col=0)
-df_planets = pd.read_csv('data/solarPlanets.csv')
 
 def clean_exo_dataset(d):
     """Cleans exoplanet dataset.
@@ -21,17 +51,15 @@ def clean_exo_dataset(d):
         Cleaned dataframe.
     """
     
-    exoplanets = pd.DataFrame(d)
-    
-    # extract most important parameters for our purpose
-    exoplanets = exoplanets[["planet_status", "mass", "radius", "orbital_period", "semi_major_axis", "eccentricity", "angular_distance", "discovered", "updated", "tzero_tr", "temp_calculated", "detection_type", "star_name", "star_age", "star_radius", "star_distance", "star_teff", "star_mass"]]
-
-    exoplanets.reset_index(inplace=True)
-    exoplanets.index = exoplanets.index + 1
-
+    exoplanets = d if isinstance(d, pd.DataFrame) else pd.DataFrame(d)
 
     # which parameters should be NaN-free?
-    exoplanets.dropna(subset= ["mass", "radius", "eccentricity", "tzero_tr", "temp_calculated", "star_radius", "star_teff", "star_distance", "star_mass"], inplace=True) # too many NaNs but also relevant factors: "log_g", "angular_distance", "temp_measured", "temp_calculated, "molecules"
+    keep = exoplanets[["mass", "radius", "eccentricity", "tzero_tr", "temp_calculated", "star_radius", "star_teff", "star_distance", "star_mass"]].notna().all(axis=1).to_numpy() # too many NaNs but also relevant factors: "log_g", "angular_distance", "temp_measured", "temp_calculated, "molecules"
+
+    # extract most important parameters for our purpose, only the kept rows are copied
+    exoplanets = exoplanets.loc[keep, EXO_COLUMNS].reset_index()
+    # rows keep their catalog number (starting at 1)
+    exoplanets.index = np.flatnonzero(keep) + 1
 
     return exoplanets
 
@@ -52,24 +80,42 @@ def habitility_parameters(planet):
     return mass, hz, orbit
 
 
-def calculate_habitable_zone(planet):
+def optimal_distance(star_mass, luminosity_exponent=LUMINOSITY_EXPONENT):
+    """Calculates the optimal distance of the habitable zone of stars.
+
+    Args:
+        star_mass: Mass of the stars (solar masses).
+        luminosity_exponent: Exponent of the mass-luminosity relation of the stars.
+
+    Returns:
+        Optimal distance (AU)
+    """
+
+    #calculate luminosities
+    l_sun = pow(1, luminosity_exponent) # mass of sun = 1
+    l_star = np.power(star_mass, luminosity_exponent) # luminosity of star = mass of star to the power of 3
+
+    return np.sqrt(l_star/l_sun) #d = optimal habitable zone, formula from Wikipedia
+
+
+def calculate_habitable_zone(planet, luminosity_exponent=LUMINOSITY_EXPONENT, hz_optimal=None):
     """Calculates the distance of a planet to the habitable zone.
     
     Args:
         planet: The planet to calculate the habitable zone of.
+        luminosity_exponent: Exponent of the mass-luminosity relation of the stars.
+        hz_optimal: Optimal distance of the habitable zone of the star of every planet, e.g. computed
+            once per star (see star_systems.py), from the star masses if None.
         
     Returns:
         Hz distance
     """
 
-    #calculate luminosities
-    l_sun = pow(1, 3) # mass of sun = 1
-    l_star = pow(planet["star_mass"], 3) # luminosity of star = mass of star to the power of 3
-
     #calculate distance to habitable zone
-    d = math.sqrt(l_star/l_sun) #d = optimal habitable zone, formula from Wikipedia
-    star_dist = float(planet["star_distance"]) #actual mean distance to star
-    dist_hz = abs(star_dist - d) # difference star_dist to habitable zone
+    # NumPy functions so this works for a single planet row as well as for whole columns
+    d = optimal_distance(planet["star_mass"], luminosity_exponent) if hz_optimal is None else hz_optimal
+    star_dist = np.asarray(planet["star_distance"], dtype=float) #actual mean distance to star
+    dist_hz = np.abs(star_dist - d) # difference star_dist to habitable zone
 
     return dist_hz
 
@@ -84,15 +130,11 @@ def habits_earth(df_planets):
         pd.DataFrame: Cleaned DataFrame with necessary columns for habitability analysis.
     """
 
-    # Reset the index of the DataFrame
-    df_planets = df_planets.reset_index()
-
-    # Rename the columns for better readability
-    df_planets = df_planets.rename(columns={"Unnamed: 0": "# name", "mass (Earth=1)": "mass", "mean distance from Sun (AU)": "star_distance", 
-                                          "orbital eccentricity": "eccentricity"}, inplace=False)
-
-    # Select only the necessary columns for habitability analysis
-    df_planets = df_planets[["# name", "mass", "star_distance", "eccentricity"]]
+    # Select only the necessary columns for habitability analysis, with the names of the exoplanet catalog
+    df_planets = pd.DataFrame({"# name": df_planets["Planet"].array,
+                               "mass": df_planets["mass (Earth=1)"].to_numpy(),
+                               "star_distance": df_planets["mean distance from Sun (AU)"].to_numpy(),
+                               "eccentricity": df_planets["orbital eccentricity"].to_numpy()})
 
     # Add a column for the star mass, which is the same for all planets in the solar system (unity is solar masses)
     df_planets["star_mass"] = 1
@@ -100,132 +142,291 @@ def habits_earth(df_planets):
     return df_planets
 
 
-def make_habit_df():
-    """Makes habitility dataframe for exoplanets and/or solar system planets.
-    
+def score_habitability(planets, hz_optimal=None):
+    """Calculates the habitability values of many planets at once.
+
+    Works on whole columns with NumPy instead of looping over the planets one by one,
+    so it also stays fast for catalogs with millions of rows.
+
     Args:
-        None
-        
+        planets: DataFrame (or dict of arrays) with the columns "# name", "mass", "star_distance",
+            "star_mass" and "eccentricity".
+        hz_optimal: Optimal distance of the habitable zone of the star of every planet (see
+            calculate_habitable_zone()), "star_mass" is not needed then.
+
     Returns:
-        :return habitility dataframe with necessary parameters for Formula
+        Habitility dataframe with the columns Name, Mass, HZ, Orbit, Mass_range, Formula and Formula_easy
+    """
+
+    planets = pd.DataFrame(planets)
+
+    # the same three parameters as in habitility_parameters(), but for all planets
+    masses = np.asarray(planets["mass"], dtype=float)
+    hzs = np.asarray(calculate_habitable_zone(planets, hz_optimal=hz_optimal), dtype=float)
+    orbits = np.asarray(planets["eccentricity"], dtype=float)
+    massr = mass_in_range(masses) #habitable between 0.1 and 5.0 earth masses
+
+    #naming columns
+    data = {"Name": planets["# name"].array,
+              "Mass": masses,
+              "HZ": hzs,
+              "Orbit": orbits,
+              "Mass_range": massr}
+    habits = pd.DataFrame(data) # actual habitility dataframe
+
+    habits["Formula"], habits["Formula_easy"] = formula_values(hzs, orbits, massr)
+
+    # Replacing any infinite values to 50 (in the other columns as well)
+    habits.replace([np.inf], INF_FORMULA, inplace=True)
+
+    return habits
+
+
+def mass_in_range(masses, mass_min=MASS_RANGE[0], mass_max=MASS_RANGE[1]):
+    """Marks the masses inside the habitable mass range.
+
+    Works element-wise and broadcasts, e.g. masses of shape (planets,) with limits of shape (settings, 1).
+
+    Args:
+        masses: Planet masses.
+        mass_min: Lower limit (exclusive).
+        mass_max: Upper limit (exclusive).
+
+    Returns:
+        Array with 1 inside the range, else 0
+    """
+
+    return ((mass_min < masses) & (masses < mass_max)).astype(np.int64)
+
+
+def formula_values(hzs, orbits, massr, norm=FORMULA_NORM, inf_value=INF_FORMULA, cap=FORMULA_CAP,
+                   divisor=FORMULA_DIVISOR):
+    """Calculates Formula and Formula_easy from the habitability parameters.
+
+    Works element-wise on arrays of any shape (e.g. planets x samples), the constants broadcast as well.
+
+    Args:
+        hzs: Distances to the habitable zone.
+        orbits: Orbital eccentricities.
+        massr: 1 if the mass is in the habitable range, else 0.
+        norm: Normalization of the Formula.
+        inf_value: Value of infinite Formula values.
+        cap: Formula values over cap are divided by divisor.
+        divisor: See cap.
+
+    Returns:
+        Formula and Formula_easy arrays
+    """
+
+    #FORMULA is normalized for exoplanets, that´s why values for solar system planets are so high.
+    # Values for exoplanets in range 0 (not habitable) to 1 (very habitable).
+    # (division by zero is expected for Earth, which gives inf and is handled below)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Formula based on distance to habitable zone, orbit and mass, normalized for exoplanets
+        formula = norm/hzs * (1-orbits) * massr
+
+        # Formula without taking mass into account
+        formula_easy = norm/hzs * (1-orbits)
+
+    # In this small section we adjust the higher values of planets in our solar system to fit into the graph
+    # Replacing any infinite values to 50
+    formula = np.where(formula == np.inf, inf_value, formula)
+    formula_easy = np.where(formula_easy == np.inf, inf_value, formula_easy)
+    # Dividing any values over 1 by 10
+    formula = np.where(formula > cap, formula/divisor, formula)
+
+    return formula, formula_easy
+
+
+def habit_inputs(d=None, df_planets=None, clean=True):
+    """Collects the Formula inputs of the exoplanets and the solar system planets.
+
+    Args:
+        d: exoplanet catalog, loaded (only the EXO_COLUMNS, in the compact schema of catalog_schema.py)
+            from the csv cache if None.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+        clean: False if d is already cleaned (e.g. the exoplanets of the shared catalog, see shared_catalog.py).
+
+    Returns:
+        Dataframe with "# name", "mass", "star_distance", "star_mass" and "eccentricity", exoplanets first
     """
 
     #exoplanet dataframe
-    d = pd.read_csv('data/exoplanet.eu_catalog.csv', index_col=0)
-    exoplanets = clean_exo_dataset(d) 
+    if d is None:
+        with profiling.stage("load") as record:
+            d = load_catalog(EXO_COLUMNS, dtypes=schema_dtypes(EXO_COLUMNS))
+            record["rows"] = len(d)
+    if clean:
+        with profiling.stage("clean") as record:
+            exoplanets = clean_exo_dataset(d) 
+            record["rows"] = len(exoplanets)
+    else:
+        exoplanets = d
     exoplanets = exoplanets[["# name", "mass", "star_distance", "star_mass", "eccentricity"]]
     exoplanets = exoplanets.reset_index(drop=True)
 
     # solar system dataframe
+    if df_planets is None:
+        df_planets = load_solar_planets()
     solar_system = habits_earth(df_planets) 
 
     # both dataframes merged
-    all_exoplanets = pd.concat([exoplanets, solar_system], axis=0, ignore_index=True) 
-    
-    #lists for dataframe
-    names = []
-    masses = []
-    hzs = []
-    orbits = []
-    massr = []
-
-    # filling new dataframe with habitility values
-    for planet in all_exoplanets.index: 
-        values = habitility_parameters(all_exoplanets.loc[planet])
-        names.append(all_exoplanets["# name"][planet])
-        masses.append(float(values[0]))
-        hzs.append(float(values[1]))
-        orbits.append(float(values[2]))
-        massr.append(1 if (0.1 < float(values[0])<5.0) else 0) #habitable between 0.1 and 5.0 earth masses
+    return pd.concat([exoplanets, solar_system], axis=0, ignore_index=True)
 
-    #naming columns
-    data = {"Name": names, 
-              "Mass": masses,
-              "HZ": hzs,
-              "Orbit": orbits,
-              "Mass_range": massr}
-    habits = pd.DataFrame(data) # actual habitility dataframe
 
+def make_habit_df(d=None, df_planets=None, clean=True):
+    """Makes habitility dataframe for exoplanets and/or solar system planets.
     
+    Args:
+        d: exoplanet catalog, loaded (only the EXO_COLUMNS, in the compact schema of catalog_schema.py)
+            from the csv cache if None.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+        clean: False if d is already cleaned (e.g. the exoplanets of the shared catalog, see shared_catalog.py).
+        
+    Returns:
+        :return habitility dataframe with necessary parameters and values of the Formula
+    """
+
+    all_exoplanets = habit_inputs(d, df_planets, clean)
+
+    # scoring all planets at once
+    with profiling.stage("score", rows=len(all_exoplanets)):
+        habits = score_habitability(all_exoplanets) # actual habitility dataframe
+
     return habits
 
-def plot_habitability(habitable_plot):
-    """Plots the 20 most habitable planets and exoplanets
+def make_habitability_plot(habitable_plot, spec=HABITABILITY_PLOT, theme_spec=HABITABILITY_THEME):
+    """Creates the plot of the 20 most habitable planets and exoplanets
 
     Args:
         habitable_plot (pd.DataFrame): DataFrame containing information the habitability of planets and exoplanets.
+        spec: Axes, colours, size, title and caption of the plot, like HABITABILITY_PLOT of plot_render.py.
+        theme_spec: Colours and title size, like HABITABILITY_THEME of plot_render.py.
 
     Returns:
-        Printed plot
+        plotnine ggplot object
     """
 
+    # plotnine is slow to import, so only here where it is actually needed
+    from plotnine import (ggplot, aes, geom_point, scale_y_log10, scale_color_gradient, theme_minimal, theme,
+                          element_rect, element_text, labs)
+
     # Create the scatter plot
-    custom_colors = ["red", "orange", "yellow", "green", "blue"]
+    custom_colors = spec['colors']
+    text = theme_spec['text']
 
     plot1 = (
-        ggplot(habitable_plot, aes(x='Name', y='Formula', color='Formula'))
+        ggplot(habitable_plot, aes(x=spec['x'], y=spec['y'], color=spec['y']))
         + geom_point(size=5)
         + scale_y_log10()
         + scale_color_gradient(low=custom_colors[0], high=custom_colors[-1]) # Scale the color gradient of the points using the custom colors defined above
         + theme_minimal() # Using a minimal theme for the plot
         + theme(
         # Adjusting the plot size
-        figure_size=(15, 8),
+        figure_size=spec['figure_size'],
         # Customizing background and text colors
-        panel_background=element_rect(fill='black'),
-        plot_background=element_rect(fill='black'),
-        axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color
-        axis_text_y=element_text(color='white'),  # Setting y-axis text color 
-        axis_title_x=element_text(color='white'),  # Setting x-axis title color 
-        axis_title_y=element_text(color='white'),  # Setting y-axis title color 
-        legend_title=element_text(color='white'),  # Setting legend title color 
-        legend_text=element_text(color='white'), # Setting legend text color
-        plot_title=element_text(color='white', size=20), # Setting caption color and size
-        plot_caption=element_text(color='white') # Setting caption color
+        panel_background=element_rect(fill=theme_spec['background']),
+        plot_background=element_rect(fill=theme_spec['background']),
+        axis_text_x=element_text(angle=45, hjust=1, color=text),  # Rotating x-axis labels and setting text color
+        axis_text_y=element_text(color=text),  # Setting y-axis text color 
+        axis_title_x=element_text(color=text),  # Setting x-axis title color 
+        axis_title_y=element_text(color=text),  # Setting y-axis title color 
+        legend_title=element_text(color=theme_spec['legend_text']),  # Setting legend title color 
+        legend_text=element_text(color=theme_spec['legend_text']), # Setting legend text color
+        plot_title=element_text(color=text, size=theme_spec['title_size']), # Setting caption color and size
+        plot_caption=element_text(color=text) # Setting caption color
         )
-        + labs(title="Most habitable planets and exoplanets") # Setting plot title
+        + labs(title=spec['title']) # Setting plot title
         # Setting a caption
-        + labs(caption="Note: The formula values are normalised for exoplanets, therefore planets in our solar system have a much higher value and have therefore all been divided by 10 and Earth set to 50 as its value is infinite.")
+        + labs(caption=spec['caption'])
 
                             )
     
-    return print(plot1)
+    return plot1
 
-# make habitility dataframe
-habits = make_habit_df() 
+def render_habitability_plot(habitable_plot, fmt='png', dpi=100, cache_dir=RENDER_CACHE_DIR):
+    """Renders the plot of the most habitable planets to a file, or returns the file rendered earlier
+    for the same planets (see render_plot() of plot_render.py).
 
-#FORMULA is normalized for exoplanets, that´s why values for solar system planets are so high. 
-# Values for exoplanets in range 0 (not habitable) to 1 (very habitable).
-# Formula based on distance to habitable zone, orbit and mass, normalized for exoplanets
-habits["Formula"] = 6.77047/habits["HZ"] * (1-habits["Orbit"]) * habits["Mass_range"] 
+    Args:
+        habitable_plot (pd.DataFrame): DataFrame containing information the habitability of planets and exoplanets.
+        fmt: File format, "png" or "svg".
+        dpi: Resolution of png files.
+        cache_dir: Folder of the render cache.
 
-# Formula without taking mass into account
-habits["Formula_easy"] = 6.77047/habits["HZ"] * (1-habits["Orbit"]) 
+    Returns:
+        Path of the rendered file
+    """
 
-# In this small section we adjust the higher values of planets in our solar system to fit into the graph 
-# Replacing any infinite values to 50
-habits.replace([np.inf], 50, inplace=True)
-# Dividing any values over 1 by 10 
-habits['Formula'] = np.where(habits['Formula'] > 1, habits["Formula"]/10, habits['Formula'])
+    # only the columns the plot uses go into the hash
+    data = habitable_plot[[HABITABILITY_PLOT['x'], HABITABILITY_PLOT['y']]]
 
-# Prints the dataframe, sorted by highest habitability value
-print(habits.sort_values(by = "Formula", ascending = False).head(30)) 
-# Saves DataFrame to csv file
-habits.sort_values(by = "Formula", ascending = False).to_csv('data/habitability.csv')
-# Saves the first 20 entries of the DataFrame to variable    
-habitable_plot = habits.sort_values(by = "Formula", ascending = False).head(20)
+    return render_plot(make_habitability_plot, data, HABITABILITY_PLOT, HABITABILITY_THEME, fmt, dpi, cache_dir)
 
-if __name__ == "__main__":
+def plot_habitability(habitable_plot):
+    """Plots the 20 most habitable planets and exoplanets
 
-    plot_habitability(habitable_plot)    
+    Args:
+        habitable_plot (pd.DataFrame): DataFrame containing information the habitability of planets and exoplanets.
 
+    Returns:
+        Path of the rendered plot
+    """
 
+    return show_rendered(render_habitability_plot(habitable_plot))
 
+def main(catalog=None, out_path=HABITABILITY_PATH, compression=None, index=False):
+    """Runs the whole habitability analysis: scores all planets, prints and saves the ranking and plots the top 20.
 
+    Args:
+        catalog: SharedCatalog of shared_catalog.py to work on the shared tables, the csv files are loaded if None.
+        out_path: File of the ranking, .csv, .parquet or .feather (see habitability_output.py).
+        compression: Compression of parquet / feather files, the default of habitability_output.py if None.
+        index: True to write a lookup index by planet name next to the file.
 
-    
-    
+    Returns:
+        None
+    """
+
+    # make habitility dataframe
+    if catalog is None:
+        habits = make_habit_df() # includes the Formula values
+    else:
+        habits = make_habit_df(catalog.frame("exoplanets", ["# name", "mass", "star_distance", "star_mass", "eccentricity"]),
+                               catalog.frame("solar_planets"), clean=False)
 
+    # ranking by Formula, sorted only once (see ranking.py)
+    with profiling.stage("rank", rows=len(habits)):
+        ranking = HabitabilityRanking(habits)
+        ranked = ranking.ranked()
 
+    # Prints the dataframe, sorted by highest habitability value
+    print(ranking.top(30))
+    # Saves DataFrame to file, replacing the old one in a single step
+    with profiling.stage("write", rows=len(ranked)):
+        write_results(ranked, out_path, compression=compression, index_by="Name" if index else None)
+    # Saves the first 20 entries of the DataFrame to variable
+    habitable_plot = ranking.top(20)
 
+    with profiling.stage("plot", rows=len(habitable_plot)):
+        plot_habitability(habitable_plot)
+
+
+if __name__ == "__main__":
 
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ranks all planets and exoplanets by habitability.")
+    parser.add_argument("--shared", action="store_true", help="use the shared catalog of shared_catalog.py")
+    parser.add_argument("--out", default=HABITABILITY_PATH, help="ranking file to write (.csv, .parquet, .feather)")
+    parser.add_argument("--compression", default=None, help="compression of parquet / feather files")
+    parser.add_argument("--index", action="store_true", help="write a lookup index by planet name")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    catalog = None
+    if args.shared:
+        from shared_catalog import attach
+        catalog = attach()
+    main(catalog, args.out, args.compression, args.index)
@@ -0,0 +1,213 @@
+import os
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, load_catalog
+from exoplanets_formula import (EXO_COLUMNS, HABITABILITY_PATH, clean_exo_dataset, habits_earth, load_solar_planets,
+                                score_habitability)
+from habitability_output import write_results
+from ranking import HabitabilityRanking
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Where the last scored snapshot of the catalog is kept
+STATE_PATH = 'data/.cache/habitability_state.pkl'
+
+# Catalog columns the habitability values depend on
+SCORE_INPUTS = ["# name", "mass", "star_distance", "star_mass", "eccentricity"]
+
+# Columns of the habitility dataframe
+SCORE_COLUMNS = ["Name", "Mass", "HZ", "Orbit", "Mass_range", "Formula", "Formula_easy"]
+
+
+def row_keys(names):
+    """Unique key of every catalog row: the planet name, numbered if a name occurs more than once.
+
+    Args:
+        names: Planet names in catalog order.
+
+    Returns:
+        Array of keys
+    """
+
+    names = pd.Series(names, dtype=object).reset_index(drop=True)
+    occurrence = names.groupby(names).cumcount()
+    return names.where(occurrence == 0, names + '#' + occurrence.astype(str)).to_numpy(dtype=object)
+
+
+def load_state(path=STATE_PATH):
+    """Loads the last scored snapshot, None if there is none yet.
+
+    Args:
+        path: Path of the state file.
+
+    Returns:
+        Dict with "rows" (dataframe indexed by row key with updated date, content hash and
+        the habitability values, in catalog order) and "order" (ranking by Formula as positions)
+    """
+
+    try:
+        return pd.read_pickle(path)
+    except FileNotFoundError:
+        return None
+
+
+def save_state(state, path=STATE_PATH):
+    """Saves the scored snapshot, replacing the old one in a single step.
+
+    Args:
+        state: Dict like the one returned by load_state().
+        path: Path of the state file.
+
+    Returns:
+        None
+    """
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    pd.to_pickle(state, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def _is_ranked(formulas, positions):
+    """Checks if positions are sorted by highest Formula first and ties by position."""
+
+    descending = formulas[:-1] > formulas[1:]
+    tie_in_order = (formulas[:-1] == formulas[1:]) & (positions[:-1] < positions[1:])
+    return bool(np.all(descending | tie_in_order))
+
+
+def patch_order(formula, old_order, new_position, changed):
+    """Updates a ranking by Formula after some rows changed, without sorting all rows again.
+
+    The unchanged rows keep their relative order from the old ranking, the changed and new rows
+    are sorted among themselves and inserted with np.searchsorted. If the catalog order of the
+    unchanged rows changed as well, everything is ranked again.
+
+    Args:
+        formula: Formula values of the new habitility dataframe.
+        old_order: Old ranking as positions in the old habitility dataframe.
+        new_position: Position of every old row in the new dataframe, -1 for removed rows.
+        changed: Boolean mask of the new rows that were scored again (or are new).
+
+    Returns:
+        New ranking as positions in the new habitility dataframe, like
+        HabitabilityRanking(habits).order("Formula")
+    """
+
+    missing = np.isnan(formula)
+
+    # unchanged rows with a value, in their old ranking order
+    kept = new_position[old_order]
+    kept = kept[kept >= 0]
+    kept = kept[~changed[kept] & ~missing[kept]]
+    kept_formula = formula[kept]
+
+    if not _is_ranked(kept_formula, kept):
+        return HabitabilityRanking(pd.DataFrame({"Formula": formula})).order("Formula")
+
+    # changed rows, sorted by Formula and position
+    inserted = np.flatnonzero(changed & ~missing)
+    inserted = inserted[np.lexsort((inserted, -formula[inserted]))]
+
+    # insertion points: first by Formula (kept_formula is descending), then by position among equal values
+    key = -kept_formula
+    lower = np.searchsorted(key, -formula[inserted], side='left')
+    upper = np.searchsorted(key, -formula[inserted], side='right')
+    points = lower.copy()
+    for number in np.flatnonzero(upper > lower):
+        points[number] += np.searchsorted(kept[lower[number]:upper[number]], inserted[number])
+
+    order = np.insert(kept, points, inserted)
+
+    # NaN values come last, in position order
+    return np.concatenate([order, np.flatnonzero(missing)])
+
+
+def update_habitability(catalog_path=CATALOG_PATH, state_path=STATE_PATH, out_path=HABITABILITY_PATH,
+                        df_planets=None):
+    """Scores only the new and changed rows of the catalog and patches the ranking.
+
+    A row counts as changed if its "updated" date or the hash of the columns the habitability
+    values depend on differ from the last snapshot. Rows that are no longer in the cleaned catalog
+    are dropped. The result is the same as scoring everything again with make_habit_df().
+
+    Args:
+        catalog_path: Path of the catalog csv file.
+        state_path: Path of the state file of the last run, it is updated at the end.
+        out_path: Path of the habitability file to write (.csv, .parquet, .feather), nothing is written if None.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+
+    Returns:
+        Habitility dataframe, its HabitabilityRanking and a dict with the number of added,
+        changed, removed and unchanged rows
+    """
+
+    exoplanets = clean_exo_dataset(load_catalog(EXO_COLUMNS, path=catalog_path)).reset_index(drop=True)
+    keys = row_keys(exoplanets["# name"])
+    hashes = pd.util.hash_pandas_object(exoplanets[SCORE_INPUTS], index=False).to_numpy()
+    updated = exoplanets["updated"].astype(object).where(exoplanets["updated"].notna(), '').to_numpy(dtype=object)
+
+    # compare with the last snapshot
+    state = load_state(state_path)
+    old_rows = state["rows"] if state is not None else pd.DataFrame(columns=["updated", "hash"] + SCORE_COLUMNS)
+    old_index = old_rows.index.get_indexer(keys)
+    known = old_index >= 0
+    unchanged = known.copy()
+    unchanged[known] = ((old_rows["updated"].to_numpy(dtype=object)[old_index[known]] == updated[known]) &
+                        (old_rows["hash"].to_numpy()[old_index[known]] == hashes[known]))
+    changed = ~unchanged
+
+    # scores: stored ones for unchanged rows, new ones for the rest
+    scored = score_habitability(exoplanets.loc[changed, SCORE_INPUTS])
+    habits = {"Name": exoplanets["# name"].array}
+    for column in SCORE_COLUMNS[1:]:
+        values = np.empty(len(exoplanets), dtype=scored[column].dtype)
+        values[unchanged] = old_rows[column].to_numpy()[old_index[unchanged]]
+        values[changed] = scored[column].to_numpy()
+        habits[column] = values
+    habits = pd.DataFrame(habits)
+
+    # solar system planets come last, like in make_habit_df(), they are always scored again
+    if df_planets is None:
+        df_planets = load_solar_planets()
+    solar_system = score_habitability(habits_earth(df_planets))
+    habits = pd.concat([habits, solar_system], axis=0, ignore_index=True)
+    changed = np.concatenate([changed, np.ones(len(solar_system), dtype=bool)])
+
+    # patch the ranking of the last run, or rank everything on the first run
+    formula = habits["Formula"].to_numpy(dtype=float)
+    if state is None:
+        order = HabitabilityRanking(habits).order("Formula")
+    else:
+        new_position = np.full(len(state["order"]), -1)
+        new_position[:len(old_rows)] = pd.Index(keys).get_indexer(old_rows.index)
+        order = patch_order(formula, state["order"], new_position, changed)
+    ranking = HabitabilityRanking(habits, orders={("Formula", False): order})
+
+    if out_path is not None:
+        write_results(ranking.ranked(), out_path)
+
+    # new snapshot (only the exoplanets, the solar system is always scored again)
+    rows = habits.iloc[:len(exoplanets)].copy()
+    rows.index = pd.Index(keys)
+    rows.insert(0, "hash", hashes)
+    rows.insert(0, "updated", updated)
+    save_state({"rows": rows, "order": order}, state_path)
+
+    stats = {"added": int((~known).sum()),
+             "changed": int((known & changed[:len(exoplanets)]).sum()),
+             "removed": int(len(old_rows) - known.sum()),
+             "unchanged": int(unchanged.sum())}
+
+    return habits, ranking, stats
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    # Scores the catalog given on the command line (or the default one) incrementally
+    habits, ranking, stats = update_habitability(*sys.argv[1:2])
+    print(stats)
+    print(ranking.top(30))
@@ -0,0 +1,431 @@
+import csv
+import io
+import os
+from lazy_imports import lazy_import
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# File formats of the results, by file extension
+OUTPUT_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+
+# Compression of every format if none is given (csv is written as plain text so rows can be found by offset)
+DEFAULT_COMPRESSION = {'csv': None, 'parquet': 'snappy', 'feather': 'lz4'}
+
+# Maximum rows of one parquet row group / feather record batch, a lookup reads at most one of them
+BLOCK_ROWS = 65_536
+
+# The lookup index of a result file is stored next to it under this suffix
+INDEX_SUFFIX = '.idx.npy'
+
+# One slot of the lookup index: hash of the name, row in the file, block (row group / batch) and
+# offset inside the block (the byte offset of the row for csv files), row -1 marks an empty slot
+INDEX_FIELDS = [('key', '<u8'), ('row', '<i8'), ('block', '<i8'), ('offset', '<i8')]
+
+
+def output_format(path, fmt=None):
+    """Format of a result file, from the file extension if fmt is None.
+
+    Args:
+        path: Path of the file.
+        fmt: "csv", "parquet" or "feather", or None.
+
+    Returns:
+        Name of the format
+    """
+
+    if fmt is None:
+        fmt = OUTPUT_FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise ValueError('Unknown result file extension of %s (known: %s)' % (path, ', '.join(OUTPUT_FORMATS)))
+    if fmt not in DEFAULT_COMPRESSION:
+        raise ValueError('Unknown result format %r (known: %s)' % (fmt, ', '.join(DEFAULT_COMPRESSION)))
+    return fmt
+
+
+def name_keys(names):
+    """64 bit hashes of planet names, the same in every run.
+
+    Args:
+        names: Names (array-like of str).
+
+    Returns:
+        Array of uint64
+    """
+
+    # names are mostly unique, factorizing them first (categorize) would only cost time
+    return pd.util.hash_array(np.asarray(names, dtype=object), categorize=False)
+
+
+def _line_starts(data):
+    """Byte offsets of the csv records in a block of csv text (newlines inside quoted fields do not count)."""
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    # inside quotes the number of quote characters so far is odd (an escaped "" changes it twice)
+    quoted = np.bitwise_xor.accumulate(buffer == ord('"'))
+    ends = np.flatnonzero((buffer == ord('\n')) & ~quoted)
+    return np.concatenate([[0], ends[:-1] + 1])
+
+
+def build_index(keys, rows, blocks, offsets):
+    """Builds the open addressing hash table of the lookup index.
+
+    Every entry goes to the slot of its hash or, if that one is taken, the next free slot after it.
+    All entries are placed at once round by round, where entries that want the same free slot leave
+    it to the lowest row and move on. The table is at most half full, so a lookup probes few slots.
+
+    Args:
+        keys: Hashes of the names (from name_keys()).
+        rows: Row of every entry in the file.
+        blocks: Block (row group / batch) of every entry.
+        offsets: Offset inside the block of every entry.
+
+    Returns:
+        Structured array with the INDEX_FIELDS
+    """
+
+    slots = 1 << max(3, (2 * len(keys)).bit_length())
+    table = np.zeros(slots, dtype=INDEX_FIELDS)
+    table['row'] = -1
+
+    position = (np.asarray(keys, dtype=np.uint64) & np.uint64(slots - 1)).astype(np.int64)
+    pending = np.arange(len(keys))
+    while len(pending):
+        candidates = pending[table['row'][position[pending]] < 0]
+        taken, first = np.unique(position[candidates], return_index=True)
+        placed = candidates[first]
+        table['key'][taken] = keys[placed]
+        table['row'][taken] = rows[placed]
+        table['block'][taken] = blocks[placed]
+        table['offset'][taken] = offsets[placed]
+
+        # the others probe the next slot
+        pending = pending[~np.isin(pending, placed, assume_unique=True)]
+        position[pending] = (position[pending] + 1) & (slots - 1)
+
+    return table
+
+
+class ResultWriter:
+    """Writes a result table chunk by chunk into a csv, parquet or feather file.
+
+    Everything goes into path + '.tmp' first, the finished file replaces the old one in a single
+    step on close(). Readers never see a half written file and a crash leaves the old file as it
+    was. Use it as context manager, on an exception the temporary file is removed.
+
+    If index_by is given, a lookup index (see ResultIndex) of that column is written as well.
+    """
+
+    def __init__(self, path, fmt=None, compression=None, index_by=None):
+        """Starts a result file.
+
+        Args:
+            path: Path of the file.
+            fmt: "csv", "parquet" or "feather", from the file extension if None.
+            compression: Compression of parquet ("snappy", "zstd", "gzip", ...) or feather ("lz4", "zstd")
+                files, DEFAULT_COMPRESSION if None, "none" for no compression.
+            index_by: Column (e.g. "Name") for the lookup index, no index if None.
+        """
+
+        self.path = path
+        self.format = output_format(path, fmt)
+        self.compression = DEFAULT_COMPRESSION[self.format] if compression is None else compression
+        if self.format == 'csv' and self.compression not in (None, 'none'):
+            raise ValueError('csv results are written uncompressed, use parquet or feather for compression')
+        self.index_by = index_by
+        self.tmp_path = path + '.tmp'
+        self.rows = 0
+
+        self._started = False
+        self._file = None
+        self._writer = None
+        self._schema = None
+        self._blocks = 0
+        self._index_parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        if error_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, chunk):
+        """Appends the rows of a dataframe, all chunks need the same columns.
+
+        Args:
+            chunk: Dataframe (the index is written as well).
+
+        Returns:
+            None
+        """
+
+        rows = np.arange(self.rows, self.rows + len(chunk))
+        if self.format == 'csv':
+            data = chunk.to_csv(header=not self._started).encode('utf-8')
+            starts = _line_starts(data)
+            if not self._started:
+                self._file = open(self.tmp_path, 'wb')
+                starts = starts[1:]   # the header
+            blocks = np.zeros(len(chunk), dtype=np.int64)
+            offsets = self._file.tell() + starts
+            self._file.write(data)
+        else:
+            blocks, offsets = self._write_arrow(chunk)
+
+        if self.index_by is not None:
+            self._index_parts.append((name_keys(chunk[self.index_by]), rows, blocks, offsets))
+        self.rows += len(chunk)
+        self._started = True
+
+    def _write_arrow(self, chunk):
+        """Writes a chunk into the parquet / feather file, returns block and offset of its rows."""
+
+        # pyarrow is slow to import, so only here where it is actually needed
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(chunk, preserve_index=True)
+        compression = None if self.compression == 'none' else self.compression
+        if self._writer is None:
+            self._schema = table.schema
+            if self.format == 'parquet':
+                self._writer = pq.ParquetWriter(self.tmp_path, self._schema, compression=compression or 'none')
+            else:
+                self._file = pa.OSFile(self.tmp_path, 'wb')
+                self._writer = pa.ipc.new_file(self._file, self._schema,
+                                               options=pa.ipc.IpcWriteOptions(compression=compression))
+        else:
+            table = table.cast(self._schema)
+        # one chunk, so the blocks are cut every BLOCK_ROWS rows and not also at the chunk boundaries
+        # of the table (a concatenated dataframe has one per part)
+        table = table.combine_chunks()
+
+        if self.format == 'parquet':
+            self._writer.write_table(table, row_group_size=BLOCK_ROWS)
+        else:
+            self._writer.write_table(table, max_chunksize=BLOCK_ROWS)
+
+        # both cut the chunk into blocks of BLOCK_ROWS rows
+        positions = np.arange(len(chunk))
+        blocks = self._blocks + positions // BLOCK_ROWS
+        self._blocks += -(-len(chunk) // BLOCK_ROWS)
+        return blocks, positions % BLOCK_ROWS
+
+    def _close_files(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """Finishes the file (and its index) and moves it into place.
+
+        Returns:
+            None
+        """
+
+        if not self._started:
+            raise ValueError('Nothing written to %s' % self.path)
+        self._close_files()
+
+        index_path = self.path + INDEX_SUFFIX
+        if self.index_by is not None:
+            keys, rows, blocks, offsets = (np.concatenate(parts) for parts in zip(*self._index_parts))
+            # np.save adds ".npy" to names without it
+            np.save(index_path + '.tmp.npy', build_index(keys, rows, blocks, offsets))
+
+        os.replace(self.tmp_path, self.path)
+        if self.index_by is not None:
+            os.replace(index_path + '.tmp.npy', index_path)
+        elif os.path.exists(index_path):
+            # an index of an older version of the file would point to the wrong rows
+            os.remove(index_path)
+
+    def abort(self):
+        """Stops writing and removes the temporary file, the old file stays as it was.
+
+        Returns:
+            None
+        """
+
+        self._close_files()
+        for path in (self.tmp_path, self.path + INDEX_SUFFIX + '.tmp.npy'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def write_results(frame, path, fmt=None, compression=None, index_by=None, chunksize=1_000_000):
+    """Writes a result table in a single step (see ResultWriter).
+
+    Args:
+        frame: Dataframe, e.g. HabitabilityRanking.ranked().
+        path: Path of the file, the format comes from the extension (.csv, .parquet, .feather).
+        fmt: "csv", "parquet" or "feather", from the file extension if None.
+        compression: Compression of parquet / feather files, DEFAULT_COMPRESSION if None.
+        index_by: Column (e.g. "Name") for the lookup index, no index if None.
+        chunksize: Rows converted at once.
+
+    Returns:
+        None
+    """
+
+    with ResultWriter(path, fmt, compression, index_by) as writer:
+        for start in range(0, max(len(frame), 1), chunksize):
+            writer.write(frame.iloc[start:start + chunksize])
+
+
+def read_results(path, fmt=None, columns=None):
+    """Reads a result table written by write_results() or ResultWriter.
+
+    Args:
+        path: Path of the file.
+        fmt: "csv", "parquet" or "feather", from the file extension if None.
+        columns: Columns to read, all if None (csv files are read completely anyway).
+
+    Returns:
+        Dataframe with the index it was written with
+    """
+
+    fmt = output_format(path, fmt)
+    if fmt == 'csv':
+        frame = pd.read_csv(path, index_col=0)
+        return frame if columns is None else frame[columns]
+
+    # pyarrow is slow to import, so only here where it is actually needed
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == 'parquet':
+        table = pq.read_table(path, columns=columns)
+    else:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns + [column for column in table.schema.pandas_metadata['index_columns']
+                                            if isinstance(column, str)])
+    return table.to_pandas()
+
+
+class ResultIndex:
+    """Lookup index of a result file: finds the rows of a planet without reading the whole file.
+
+    The hash table is memory-mapped, a lookup probes a few of its slots and then reads one csv
+    record (by byte offset) or one parquet row group / feather batch of at most BLOCK_ROWS rows.
+    """
+
+    def __init__(self, path, fmt=None, column="Name"):
+        """Opens the index of a result file.
+
+        Args:
+            path: Path of the result file (not of the index).
+            fmt: "csv", "parquet" or "feather", from the file extension if None.
+            column: Column the index was built from.
+        """
+
+        self.path = path
+        self.format = output_format(path, fmt)
+        self.column = column
+        self.table = np.load(path + INDEX_SUFFIX, mmap_mode='r')
+        self._mask = len(self.table) - 1
+
+    def entries(self, name):
+        """Slots of all rows with a name (hash matches, the name is checked when the rows are read).
+
+        Returns:
+            Structured array with the INDEX_FIELDS, in row order
+        """
+
+        key = name_keys([name])[0]
+        slot = int(key) & self._mask
+        found = []
+        while self.table['row'][slot] >= 0:
+            if self.table['key'][slot] == key:
+                found.append(self.table[slot])
+            slot = (slot + 1) & self._mask
+        return np.sort(np.array(found, dtype=INDEX_FIELDS), order='row')
+
+    def lookup(self, name):
+        """Rows of a planet.
+
+        Args:
+            name: Name of the planet.
+
+        Returns:
+            Dataframe with the rows of the planet (empty if it is not in the file)
+        """
+
+        entries = self.entries(name)
+        if self.format == 'csv':
+            frame = self._read_csv_rows(entries['offset'])
+        else:
+            frame = self._read_arrow_rows(entries['block'], entries['offset'])
+        if len(frame) == 0:
+            return frame
+        return frame[frame[self.column] == name]
+
+    def _read_csv_rows(self, offsets):
+        """Reads csv records at byte offsets, with the header of the file."""
+
+        with open(self.path, newline='', encoding='utf-8') as f:
+            text = io.StringIO()
+            writer = csv.writer(text)
+            writer.writerow(next(csv.reader(f)))
+            for offset in offsets:
+                f.seek(int(offset))
+                writer.writerow(next(csv.reader(f)))
+        text.seek(0)
+        return pd.read_csv(text, index_col=0)
+
+    def _read_arrow_rows(self, blocks, offsets):
+        """Reads rows given by block and offset from a parquet / feather file."""
+
+        # pyarrow is slow to import, so only here where it is actually needed
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parts = []
+        if self.format == 'parquet':
+            source = pq.ParquetFile(self.path)
+            schema = source.schema_arrow
+            for block, offset in zip(blocks, offsets):
+                parts.append(source.read_row_group(int(block)).slice(int(offset), 1))
+        else:
+            with pa.memory_map(self.path) as source:
+                reader = pa.ipc.open_file(source)
+                schema = reader.schema
+                for block, offset in zip(blocks, offsets):
+                    parts.append(pa.Table.from_batches([reader.get_batch(int(block)).slice(int(offset), 1)]))
+        if not parts:
+            return schema.empty_table().to_pandas()
+        return pa.concat_tables(parts).to_pandas()
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Converts habitability results and looks up planets in them.")
+    parser.add_argument("source", help="result file to read (.csv, .parquet, .feather)")
+    parser.add_argument("--out", default=None, help="result file to write, the format comes from the extension")
+    parser.add_argument("--compression", default=None, help="compression of parquet / feather files")
+    parser.add_argument("--index", action="store_true", help="write a lookup index by Name")
+    parser.add_argument("--lookup", nargs="*", default=[], help="planets to look up with the index of source")
+    args = parser.parse_args()
+
+    if args.out:
+        write_results(read_results(args.source), args.out, compression=args.compression,
+                      index_by="Name" if args.index else None)
+        print('%s: %d bytes' % (args.out, os.path.getsize(args.out)))
+    if args.lookup:
+        index = ResultIndex(args.source)
+        for name in args.lookup:
+            print(index.lookup(name))
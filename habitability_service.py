@@ -0,0 +1,299 @@
+import functools
+import http.server
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, load_catalog
+from catalog_schema import schema_dtypes
+from exoplanets_formula import EXO_COLUMNS, SOLAR_PLANETS_PATH, load_solar_planets, make_habit_df
+from plottingAndAllTheFun import ATTRIBUTE_GROUPS, load_planets
+from ranking import HabitabilityRanking
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Address of the service (only reachable from this machine)
+HOST = '127.0.0.1'
+PORT = 8765
+
+# Seconds between two checks of the source files
+RELOAD_INTERVAL = 5.0
+
+# Number of answers kept in the response cache
+CACHE_SIZE = 1024
+
+# Maximum number of rows of a single answer
+MAX_ROWS = 10_000
+
+
+class QueryError(ValueError):
+    """A query with missing or invalid parameters (answered with status 400)."""
+
+
+class Snapshot:
+    """Scored catalog and solar system tables of one version of the source files."""
+
+    def __init__(self, catalog_path=CATALOG_PATH, solar_path=SOLAR_PLANETS_PATH):
+        """Loads and scores everything once.
+
+        Args:
+            catalog_path: Path of the exoplanet catalog.
+            solar_path: Path of solarPlanets.csv.
+        """
+
+        self.sources = source_state([catalog_path, solar_path])
+        self.loaded = time.time()
+
+        catalog = load_catalog(EXO_COLUMNS, path=catalog_path, dtypes=schema_dtypes(EXO_COLUMNS))
+        self.habits = make_habit_df(catalog, load_solar_planets(solar_path))
+        self.ranking = HabitabilityRanking(self.habits)
+        self.solar_planets = load_planets(solar_path)
+
+        # positions of every name, for by-name queries
+        self.names = pd.Series(np.arange(len(self.habits))).groupby(self.habits["Name"].to_numpy(dtype=object)).apply(list).to_dict()
+
+
+def source_state(paths):
+    """Size and modification time of the source files, to notice when they change."""
+
+    state = []
+    for path in paths:
+        stat = os.stat(path)
+        state.append((path, stat.st_size, stat.st_mtime_ns))
+    return tuple(state)
+
+
+def _records(frame):
+    """Rows of a dataframe as list of dicts (NaN becomes null)."""
+
+    return json.loads(frame.to_json(orient='records'))
+
+
+def _number(params, name, default=None, kind=float):
+    """A number parameter of a query."""
+
+    if name not in params:
+        if default is None:
+            raise QueryError('Missing parameter %r' % name)
+        return default
+    try:
+        return kind(params[name])
+    except ValueError:
+        raise QueryError('Parameter %r must be a number, not %r' % (name, params[name])) from None
+
+
+def _count(params, name, default):
+    """A number of rows parameter of a query, at most MAX_ROWS."""
+
+    count = _number(params, name, default, int)
+    if count < 0:
+        raise QueryError('Parameter %r must not be negative, not %d' % (name, count))
+    return min(count, MAX_ROWS)
+
+
+class HabitabilityService:
+    """Answers habitability queries from a catalog that is loaded and scored once.
+
+    Queries (all GET, answers are json):
+        /top?n=20&by=Formula            the n best planets (by any column of the habitility dataframe)
+        /planet?name=Earth              all planets with that name
+        /filter?column=Mass&min=0.1&max=5&limit=100   planets with a column inside a range, best first
+        /solar?planet=2                 one solar system planet (the "(1)" view of display_info())
+        /solar?group=0                  an attribute group of all planets (the "(2)" view of display_info())
+        /status                         version of the data and cache statistics
+
+    Answers are kept in an LRU cache per data version. A background thread checks the source files
+    and swaps in a newly scored snapshot when they change, queries keep being answered meanwhile.
+    """
+
+    def __init__(self, catalog_path=CATALOG_PATH, solar_path=SOLAR_PLANETS_PATH, cache_size=CACHE_SIZE):
+        """Loads the first snapshot.
+
+        Args:
+            catalog_path: Path of the exoplanet catalog.
+            solar_path: Path of solarPlanets.csv.
+            cache_size: Number of answers kept in the response cache.
+        """
+
+        self.catalog_path = catalog_path
+        self.solar_path = solar_path
+        self.current = (Snapshot(catalog_path, solar_path), 1)   # snapshot and its version, swapped together
+        self._answer_cached = functools.lru_cache(maxsize=cache_size)(self._answer)
+        self._stop = threading.Event()
+
+    def reload_if_changed(self):
+        """Loads and scores the source files again if they changed, then swaps the snapshot in one step.
+
+        Returns:
+            True if a new snapshot was loaded
+        """
+
+        old_snapshot, version = self.current
+        if source_state([self.catalog_path, self.solar_path]) == old_snapshot.sources:
+            return False
+
+        # a single assignment, so a query sees either the old or the new snapshot
+        self.current = (Snapshot(self.catalog_path, self.solar_path), version + 1)
+        self._answer_cached.cache_clear()
+        return True
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """Starts the background thread that reloads the data when the source files change.
+
+        Args:
+            interval: Seconds between two checks.
+
+        Returns:
+            The thread
+        """
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reload_if_changed()
+                except (OSError, ValueError, KeyError):
+                    # a half written file, the next check tries again
+                    pass
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stops the background reloading."""
+
+        self._stop.set()
+
+    def answer(self, path, query=''):
+        """Answers a query, from the response cache if it was asked before for the same data version.
+
+        Args:
+            path: Path of the query, e.g. "/top".
+            query: Query string, e.g. "n=20&by=Formula".
+
+        Returns:
+            Status code and json answer as bytes
+        """
+
+        params = tuple(sorted((key, values[-1]) for key, values in parse_qs(query).items()))
+        snapshot, version = self.current
+        if path == '/status':
+            return self._answer(snapshot, version, path, params)
+        return self._answer_cached(snapshot, version, path, params)
+
+    def _answer(self, snapshot, version, path, params):
+        """Computes the answer of a query (see answer())."""
+
+        params = dict(params)
+        try:
+            if path == '/top':
+                n = _count(params, 'n', 20)
+                by = params.get('by', 'Formula')
+                if by not in snapshot.habits.columns or by == 'Name':
+                    raise QueryError('Unknown column %r' % by)
+                body = _records(snapshot.ranking.top(n, by))
+
+            elif path == '/planet':
+                if 'name' not in params:
+                    raise QueryError("Missing parameter 'name'")
+                body = _records(snapshot.habits.iloc[snapshot.names.get(params['name'], [])])
+
+            elif path == '/filter':
+                column = params.get('column')
+                if column not in snapshot.habits.columns or column == 'Name':
+                    raise QueryError('Unknown column %r' % column)
+                low = _number(params, 'min', -np.inf)
+                high = _number(params, 'max', np.inf)
+                limit = _count(params, 'limit', 100)
+                values = snapshot.habits[column].to_numpy(dtype=float)
+                order = snapshot.ranking.order()
+                inside = order[(values[order] >= low) & (values[order] <= high)]
+                body = _records(snapshot.habits.iloc[inside[:limit]])
+
+            elif path == '/solar':
+                planets = snapshot.solar_planets
+                if 'planet' in params:
+                    number = _number(params, 'planet', kind=int)
+                    if not 0 <= number < len(planets):
+                        raise QueryError('planet must be between 0 and %d' % (len(planets) - 1))
+                    body = _records(planets.iloc[[number]])
+                elif params.get('group') in ATTRIBUTE_GROUPS:
+                    body = _records(planets[ATTRIBUTE_GROUPS[params['group']]])
+                else:
+                    raise QueryError('Give planet=0..%d or group=%s' % (len(planets) - 1, '|'.join(ATTRIBUTE_GROUPS)))
+
+            elif path == '/status':
+                info = self._answer_cached.cache_info()
+                body = {'version': version, 'loaded': snapshot.loaded, 'planets': len(snapshot.habits),
+                        'sources': snapshot.sources, 'cache': {'hits': info.hits, 'misses': info.misses,
+                                                               'size': info.currsize}}
+            else:
+                return 404, json.dumps({'error': 'Unknown query %s' % path}).encode('utf-8')
+
+        except QueryError as error:
+            return 400, json.dumps({'error': str(error)}).encode('utf-8')
+
+        return 200, json.dumps({'version': version, 'result': body}).encode('utf-8')
+
+
+def make_server(service, host=HOST, port=PORT):
+    """Creates the HTTP server of a service (start it with serve_forever()).
+
+    Args:
+        service: HabitabilityService.
+        host: Address to listen on.
+        port: Port to listen on, 0 for any free port.
+
+    Returns:
+        http.server.ThreadingHTTPServer
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'   # keeps connections open between queries
+        disable_nagle_algorithm = True   # headers and body go out at once instead of waiting for a delayed ack
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, body = service.answer(url.path, url.query)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+    return Server((host, port), Handler)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local habitability query service (json over http).")
+    parser.add_argument("--host", default=HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    parser.add_argument("--interval", type=float, default=RELOAD_INTERVAL, help="seconds between source file checks")
+    args = parser.parse_args()
+
+    service = HabitabilityService()
+    service.watch(args.interval)
+    server = make_server(service, args.host, args.port)
+    print('Serving on http://%s:%d (for example /top?n=20)' % (args.host, server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
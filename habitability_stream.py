@@ -0,0 +1,203 @@
+import csv
+import heapq
+import math
+import os
+import tempfile
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH
+from exoplanets_formula import EXO_COLUMNS, clean_exo_dataset, habits_earth, load_solar_planets, score_habitability
+from habitability_output import ResultWriter, output_format
+
+# heavy libraries are only imported when they are used for the first time
+pd = lazy_import('pandas')
+
+
+# Number of catalog rows that are read and scored at once
+CHUNK_SIZE = 100_000
+
+# Maximum number of sorted run files that are merged at once
+MAX_MERGE_FILES = 128
+
+
+def iter_catalog_chunks(path=CATALOG_PATH, chunksize=CHUNK_SIZE):
+    """Reads the exoplanet catalog in chunks, only the columns clean_exo_dataset() needs.
+
+    Args:
+        path: Path of the catalog csv file.
+        chunksize: Number of rows per chunk.
+
+    Returns:
+        Iterator over dataframes indexed by "# name", like pd.read_csv(path, index_col=0)
+    """
+
+    return pd.read_csv(path, index_col=0, usecols=lambda column: column == '# name' or column in EXO_COLUMNS,
+                       chunksize=chunksize)
+
+
+def iter_scored_chunks(path=CATALOG_PATH, chunksize=CHUNK_SIZE, df_planets=None):
+    """Cleans and scores the catalog chunk by chunk, followed by the planets of our solar system.
+
+    The index of the scored chunks continues from chunk to chunk, so it is the same as the
+    index of the habitility dataframe of make_habit_df().
+
+    Args:
+        path: Path of the catalog csv file.
+        chunksize: Number of rows per chunk.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+
+    Returns:
+        Iterator over habitility dataframes
+    """
+
+    offset = 0
+
+    for chunk in iter_catalog_chunks(path, chunksize):
+        exoplanets = clean_exo_dataset(chunk)
+        exoplanets = exoplanets[["# name", "mass", "star_distance", "star_mass", "eccentricity"]]
+
+        habits = score_habitability(exoplanets)
+        habits.index = pd.RangeIndex(offset, offset + len(habits))
+        offset += len(habits)
+        yield habits
+
+    # solar system planets come last, like in make_habit_df()
+    if df_planets is None:
+        df_planets = load_solar_planets()
+    habits = score_habitability(habits_earth(df_planets))
+    habits.index = pd.RangeIndex(offset, offset + len(habits))
+    yield habits
+
+
+def _rank_key(formula, index):
+    """Sort key of a planet, bigger is better: highest Formula first, NaN last, ties by catalog order."""
+
+    if math.isnan(formula):
+        return (0, 0.0, -index)
+    return (1, formula, -index)
+
+
+def _csv_rank_key(row, formula_column):
+    """Sort key of a row of a habitability csv file, see _rank_key()."""
+
+    formula = float(row[formula_column]) if row[formula_column] else math.nan
+    return _rank_key(formula, int(row[0]))
+
+
+def _merge_runs(run_paths, out_file, formula_column):
+    """Merges sorted run files (without header) into one sorted, open csv file."""
+
+    files = [open(path, newline='') for path in run_paths]
+    try:
+        readers = [csv.reader(f) for f in files]
+        writer = csv.writer(out_file, lineterminator=os.linesep)
+        merged = heapq.merge(*readers, key=lambda row: _csv_rank_key(row, formula_column), reverse=True)
+        for row in merged:
+            writer.writerow(row)
+    finally:
+        for f in files:
+            f.close()
+
+
+def stream_habitability(path=CATALOG_PATH, out_path=None, chunksize=CHUNK_SIZE, top_k=30, df_planets=None):
+    """Scores a catalog that does not have to fit into memory.
+
+    The catalog is read and scored in chunks. The best planets are kept in a heap of size top_k,
+    so the memory use only depends on chunksize and top_k. If out_path is given, the full ranking
+    is written as well: every sorted chunk is appended to a temporary run file and the runs
+    are merged into the final csv file, row for row.
+
+    The result is the same as for make_habit_df() sorted with
+    sort_values(by="Formula", ascending=False, kind="stable"), ties keep the catalog order.
+
+    Args:
+        path: Path of the catalog csv file.
+        out_path: Path of the habitability file to write (.csv, .parquet, .feather), nothing is written if None.
+        chunksize: Number of catalog rows per chunk.
+        top_k: Number of planets in the returned ranking.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+
+    Returns:
+        Habitility dataframe of the top_k planets, sorted by highest habitability value
+    """
+
+    heap = []
+    top_rows = None
+    header = None
+
+    with tempfile.TemporaryDirectory(prefix='habitability_runs_') as run_dir:
+        run_paths = []
+
+        for habits in iter_scored_chunks(path, chunksize, df_planets):
+            if header is None:
+                header = [''] + list(habits.columns)
+            ranked = habits.sort_values(by="Formula", ascending=False, kind="stable")
+
+            # append-only run file of this chunk
+            if out_path is not None and len(ranked):
+                run_path = os.path.join(run_dir, '%06d.csv' % len(run_paths))
+                ranked.to_csv(run_path, header=False)
+                run_paths.append(run_path)
+
+            # bounded heap: the chunk is sorted, so we can stop at the first planet that is not good enough
+            formulas = ranked["Formula"].to_numpy()
+            for position, index in enumerate(ranked.index[:top_k]):
+                key = _rank_key(float(formulas[position]), int(index))
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (key, int(index)))
+                elif key > heap[0][0]:
+                    heapq.heapreplace(heap, (key, int(index)))
+                else:
+                    break
+
+            # only the rows that are still in the heap are kept
+            top_rows = pd.concat([top_rows, ranked.head(top_k)]) if top_rows is not None else ranked.head(top_k)
+            top_rows = top_rows[top_rows.index.isin([index for key, index in heap])]
+
+        if out_path is not None:
+            formula_column = header.index("Formula")
+
+            # merge in several passes if there are too many runs to open at once
+            merge_count = 0
+            while len(run_paths) > MAX_MERGE_FILES:
+                merged_paths = []
+                for start in range(0, len(run_paths), MAX_MERGE_FILES):
+                    merge_count += 1
+                    merged_path = os.path.join(run_dir, 'merged_%06d.csv' % merge_count)
+                    with open(merged_path, 'w', newline='') as f:
+                        _merge_runs(run_paths[start:start + MAX_MERGE_FILES], f, formula_column)
+                    merged_paths.append(merged_path)
+                run_paths = merged_paths
+
+            # csv: merged into a temporary file next to out_path, which then replaces the old file in a single
+            # step. Other formats: merged into a csv run and written chunk by chunk through a ResultWriter
+            csv_output = output_format(out_path) == 'csv'
+            merged_path = out_path + '.tmp' if csv_output else os.path.join(run_dir, 'merged.csv')
+            with open(merged_path, 'w', newline='') as f:
+                csv.writer(f, lineterminator=os.linesep).writerow(header)
+                _merge_runs(run_paths, f, formula_column)
+
+            if csv_output:
+                os.replace(merged_path, out_path)
+            else:
+                with ResultWriter(out_path) as writer:
+                    for chunk in pd.read_csv(merged_path, index_col=0, dtype={"Name": str}, chunksize=chunksize):
+                        writer.write(chunk)
+
+    # best planet first
+    order = [index for key, index in sorted(heap, reverse=True)]
+    return top_rows.loc[order]
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scores an exoplanet catalog chunk by chunk.")
+    parser.add_argument("catalog", nargs="?", default=CATALOG_PATH, help="catalog csv file (exoplanet.eu columns)")
+    parser.add_argument("--out", default="data/habitability.csv", help="habitability file to write (.csv, .parquet, .feather)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="catalog rows per chunk")
+    parser.add_argument("--top", type=int, default=30, help="number of planets to print")
+    args = parser.parse_args()
+
+    # Prints the best planets, the full ranking is in the csv file
+    print(stream_habitability(args.catalog, args.out, args.chunksize, args.top))
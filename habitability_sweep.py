@@ -0,0 +1,279 @@
+import concurrent.futures
+import os
+from lazy_imports import lazy_import
+from exoplanets_formula import (FORMULA_CAP, FORMULA_DIVISOR, FORMULA_NORM, INF_FORMULA, LUMINOSITY_EXPONENT,
+                                MASS_RANGE, calculate_habitable_zone, formula_values, habit_inputs, mass_in_range)
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Constants of the Formula that can be swept, with the values exoplanets_formula.py uses
+DEFAULT_PARAMETERS = {"norm": FORMULA_NORM, "mass_min": MASS_RANGE[0], "mass_max": MASS_RANGE[1],
+                      "luminosity_exponent": LUMINOSITY_EXPONENT, "inf_value": INF_FORMULA, "cap": FORMULA_CAP,
+                      "divisor": FORMULA_DIVISOR}
+
+# Grid of the command line if no values are given: ranges around the constants of exoplanets_formula.py (720 settings)
+DEFAULT_GRID = {"norm": [5.0, FORMULA_NORM, 10.0], "mass_min": [0.05, 0.1, 0.15, 0.2],
+                "mass_max": [2.0, 4.0, 5.0, 7.0, 10.0], "luminosity_exponent": [2.5, 3.0, 3.5, 4.0],
+                "divisor": [5.0, 10.0, 20.0]}
+
+# Size of the top group (top 20 like the plot of exoplanets_formula)
+TOP_N = 20
+
+# Maximum settings x planets of one chunk, bounds the memory of every worker (about 8 MB per array)
+MAX_CELLS = 1_000_000
+
+# Formula inputs of the planets
+INPUT_COLUMNS = ["mass", "star_distance", "star_mass", "eccentricity"]
+
+# Planet inputs, baseline and top group size of the worker processes (set by _init_worker())
+_worker_state = {}
+
+
+def parameter_grid(**values):
+    """All combinations of the given values of the Formula constants.
+
+    Args:
+        **values: Values of the DEFAULT_PARAMETERS to combine, a single value or a list each.
+            Constants that are not given keep their default value.
+
+    Returns:
+        Dataframe with one row per setting and one column per constant
+    """
+
+    unknown = set(values) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError('Unknown Formula constants: %s' % ', '.join(sorted(unknown)))
+
+    axes = [np.atleast_1d(np.asarray(values.get(name, default), dtype=float))
+            for name, default in DEFAULT_PARAMETERS.items()]
+    mesh = np.meshgrid(*axes, indexing='ij')
+    return pd.DataFrame({name: values.ravel() for name, values in zip(DEFAULT_PARAMETERS, mesh)})
+
+
+def sweep_formula(inputs, settings):
+    """Formula of all planets for many settings of the constants, in one broadcasted computation.
+
+    Args:
+        inputs: Dict of the INPUT_COLUMNS arrays of the planets.
+        settings: Dict of the DEFAULT_PARAMETERS arrays of the settings.
+
+    Returns:
+        Array settings x planets
+    """
+
+    def column(name):
+        return np.asarray(settings[name], dtype=float)[:, None]
+
+    # the habitable zone only depends on the exponent, so it is computed once per distinct exponent
+    exponents, which = np.unique(np.asarray(settings["luminosity_exponent"], dtype=float), return_inverse=True)
+    hzs = np.asarray(calculate_habitable_zone(inputs, exponents[:, None]), dtype=float)[which]
+
+    massr = mass_in_range(inputs["mass"], column("mass_min"), column("mass_max"))
+    return formula_values(hzs, inputs["eccentricity"], massr, column("norm"), column("inf_value"), column("cap"),
+                          column("divisor"))[0]
+
+
+def rank_matrix(formula):
+    """Rank of every planet in every setting, 1 is the best.
+
+    Ties are broken by the position of the planets, NaN values come last, like the order of
+    ranking.HabitabilityRanking.
+
+    Args:
+        formula: Array settings x planets.
+
+    Returns:
+        int32 array settings x planets
+    """
+
+    key = np.where(np.isnan(formula), np.inf, -formula)
+    order = np.argsort(key, axis=1, kind='stable')
+    ranks = np.empty(order.shape, dtype=np.int32)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(1, order.shape[1] + 1, dtype=np.int32), order.shape),
+                      axis=1)
+    return ranks
+
+
+def _init_worker(inputs, baseline_ranks, top_n):
+    """Keeps the planet inputs and the baseline of a sweep in the worker, so tasks only carry their settings."""
+
+    _worker_state.update(inputs=inputs, baseline_ranks=baseline_ranks, top_n=top_n,
+                         baseline_top=np.flatnonzero(baseline_ranks <= top_n))
+
+
+def _sweep_chunk(settings):
+    """Ranks all planets for a chunk of settings and reduces the ranks to per planet and per setting statistics."""
+
+    baseline_ranks, top_n = _worker_state["baseline_ranks"], _worker_state["top_n"]
+    ranks = rank_matrix(sweep_formula(_worker_state["inputs"], settings))
+    planets = ranks.shape[1]
+
+    # how often every planet reaches every rank of the top group
+    rows, columns = np.nonzero(ranks <= top_n)
+    top_counts = np.bincount(columns * top_n + ranks[rows, columns] - 1, minlength=planets * top_n)
+
+    # Spearman correlation with the baseline (ranks are unique, so the short formula is exact)
+    squared = ((ranks - baseline_ranks[None, :]).astype(float) ** 2).sum(axis=1)
+    spearman = 1 - 6 * squared / (planets * (planets ** 2 - 1.0)) if planets > 1 else np.ones(len(ranks))
+
+    return {"top_counts": top_counts.reshape(planets, top_n), "best": ranks.min(axis=0), "worst": ranks.max(axis=0),
+            "sum": ranks.sum(axis=0, dtype=np.int64), "sum_squares": (ranks.astype(float) ** 2).sum(axis=0),
+            "overlap": (ranks[:, _worker_state["baseline_top"]] <= top_n).sum(axis=1),
+            "spearman": spearman, "top1": np.argmin(ranks, axis=1)}
+
+
+def sweep_habitability(planets=None, grid=None, top_n=TOP_N, processes=1, max_cells=MAX_CELLS):
+    """Ranks all planets for every setting of the Formula constants and measures how stable the ranking is.
+
+    Every chunk of settings is scored for all planets at once (settings x planets arrays), ranked
+    and reduced to statistics right away, so the memory stays bounded by max_cells no matter how
+    large the grid is. The chunks can run in a process pool, the planet inputs are sent to every
+    worker once.
+
+    Args:
+        planets: Dataframe with "# name" and the INPUT_COLUMNS (e.g. from habit_inputs()), loaded if None.
+        grid: Dataframe of settings from parameter_grid(), DEFAULT_GRID if None.
+        top_n: Size of the top group.
+        processes: Number of worker processes, the number of CPUs if None, 1 to run in this process.
+        max_cells: Maximum settings x planets of one chunk.
+
+    Returns:
+        Rank distribution of every planet (in the order of planets) with Name, Formula and Rank with the
+        default constants, best / worst / mean / std of the rank, P_top<top_n> and P_rank1 ... P_rank<top_n>
+        (share of settings with that rank); and the grid with Top_overlap (share of the default top group
+        still in the top group), Same_top, Spearman (rank correlation with the default) and Top1 (best planet)
+    """
+
+    if planets is None:
+        planets = habit_inputs()
+    if grid is None:
+        grid = parameter_grid(**DEFAULT_GRID)
+    grid = grid.reset_index(drop=True)
+
+    inputs = {column: planets[column].to_numpy(dtype=float) for column in INPUT_COLUMNS}
+    top_n = min(top_n, len(planets))
+    baseline_formula = sweep_formula(inputs, {name: [value] for name, value in DEFAULT_PARAMETERS.items()})
+    baseline_ranks = rank_matrix(baseline_formula)[0]
+
+    rows = max(1, max_cells // max(1, len(planets)))
+    chunks = [{name: grid[name].to_numpy(dtype=float)[start:start + rows] for name in DEFAULT_PARAMETERS}
+              for start in range(0, len(grid), rows)]
+
+    if processes == 1:
+        _init_worker(inputs, baseline_ranks, top_n)
+        parts = list(map(_sweep_chunk, chunks))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes or os.cpu_count(), initializer=_init_worker,
+                                                    initargs=(inputs, baseline_ranks, top_n)) as executor:
+            parts = list(executor.map(_sweep_chunk, chunks))
+
+    def combine(key, reduce):
+        return reduce([part[key] for part in parts], axis=0)
+
+    settings = len(grid)
+    mean = combine("sum", np.sum) / settings
+    top_counts = combine("top_counts", np.sum)
+
+    distribution = pd.DataFrame({"Name": planets["# name"].array, "Formula": baseline_formula[0],
+                                 "Rank": baseline_ranks, "Rank_best": combine("best", np.min),
+                                 "Rank_worst": combine("worst", np.max), "Rank_mean": mean,
+                                 "Rank_std": np.sqrt(np.maximum(combine("sum_squares", np.sum) / settings - mean ** 2, 0)),
+                                 "P_top%d" % top_n: top_counts.sum(axis=1) / settings})
+    for rank in range(top_n):
+        distribution["P_rank%d" % (rank + 1)] = top_counts[:, rank] / settings
+
+    overlap = combine("overlap", np.concatenate)
+    result = grid.copy()
+    result["Top_overlap"] = overlap / top_n
+    result["Same_top"] = overlap == top_n
+    result["Spearman"] = combine("spearman", np.concatenate)
+    result["Top1"] = planets["# name"].to_numpy(dtype=object)[combine("top1", np.concatenate)]
+
+    return distribution, result
+
+
+def stability_report(distribution, settings, top_n=TOP_N):
+    """Text summary of a sweep: how much of the default top group survives and which constants matter.
+
+    Args:
+        distribution: Rank distribution from sweep_habitability().
+        settings: Settings from sweep_habitability().
+        top_n: Size of the top group used for the sweep.
+
+    Returns:
+        Report as string
+    """
+
+    top_n = min(top_n, len(distribution))
+    p_top = distribution["P_top%d" % top_n]
+    lines = ['%d settings x %d planets' % (len(settings), len(distribution)),
+             'Top %d unchanged in %.1f%% of the settings, overlap with the default top %d: mean %.2f, worst %.2f' %
+             (top_n, settings["Same_top"].mean() * 100, top_n, settings["Top_overlap"].mean(),
+              settings["Top_overlap"].min()),
+             'Spearman correlation with the default ranking: median %.3f, worst %.3f' %
+             (settings["Spearman"].median(), settings["Spearman"].min()),
+             'Always in the top %d: %d planets, in the top %d for some settings: %d planets' %
+             (top_n, (p_top == 1).sum(), top_n, (p_top > 0).sum()),
+             '', 'Default top %d (rank range and share of settings in the top %d):' % (top_n, top_n)]
+
+    default_top = distribution.sort_values("Rank").head(top_n)
+    for planet in default_top.itertuples(index=False):
+        lines.append('  %3d  %-28s ranks %4d - %-6d P_top %.2f' %
+                     (planet.Rank, planet.Name, planet.Rank_best, planet.Rank_worst, getattr(planet, "P_top%d" % top_n)))
+
+    lines += ['', 'Mean overlap with the default top %d per value of each constant:' % top_n]
+    for name in DEFAULT_PARAMETERS:
+        if settings[name].nunique() > 1:
+            overlap = settings.groupby(name, sort=True)["Top_overlap"].mean()
+            lines.append('  %-20s %s' % (name, '  '.join('%g: %.2f' % item for item in overlap.items())))
+
+    return '\n'.join(lines)
+
+
+def parse_values(text):
+    """Values of a constant from the command line: "a,b,c" or "start:stop:num" (evenly spaced).
+
+    Args:
+        text: Values as text.
+
+    Returns:
+        List of floats
+    """
+
+    if ':' in text:
+        start, stop, num = text.split(':')
+        return list(np.linspace(float(start), float(stop), int(num)))
+    return [float(value) for value in text.split(',')]
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import time
+    from habitability_output import write_results
+
+    parser = argparse.ArgumentParser(description="Ranks all planets for a grid of settings of the Formula constants.")
+    for name, default in DEFAULT_PARAMETERS.items():
+        parser.add_argument("--" + name.replace('_', '-'), type=parse_values, default=None,
+                            help="values as a,b,c or start:stop:num (default %g)" % default)
+    parser.add_argument("--top", type=int, default=TOP_N, help="size of the top group")
+    parser.add_argument("--processes", type=int, default=1, help="number of worker processes, 0 for all CPUs")
+    parser.add_argument("--out", default=None, help="file for the rank distribution (.csv, .parquet, .feather)")
+    parser.add_argument("--settings-out", default=None, help="file for the stability of every setting")
+    args = parser.parse_args()
+
+    values = {name: getattr(args, name) for name in DEFAULT_PARAMETERS if getattr(args, name) is not None}
+    grid = parameter_grid(**(values or DEFAULT_GRID))
+
+    start = time.perf_counter()
+    distribution, settings = sweep_habitability(grid=grid, top_n=args.top, processes=args.processes or None)
+    print(stability_report(distribution, settings, args.top))
+    print('Swept in %.2f s' % (time.perf_counter() - start))
+
+    if args.out:
+        write_results(distribution, args.out)
+    if args.settings_out:
+        write_results(settings, args.settings_out)
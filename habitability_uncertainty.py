@@ -0,0 +1,236 @@
+import concurrent.futures
+import os
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, load_catalog
+from exoplanets_formula import (EXO_COLUMNS, calculate_habitable_zone, clean_exo_dataset, formula_values,
+                                habits_earth, load_solar_planets, mass_in_range, score_habitability)
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Number of samples drawn per planet
+SAMPLES = 10_000
+
+# Size of the ranking group for the probability (top 20 like the plot of exoplanets_formula)
+TOP_N = 20
+
+# Share of the samples inside the reported credible interval
+INTERVAL = 0.9
+
+# Maximum planets x samples of one chunk, bounds the memory of every worker (about 8 MB per array)
+MAX_CELLS = 1_000_000
+
+# Formula inputs with uncertainties in the catalog, and the range their samples are clipped to
+UNCERTAIN_INPUTS = {"mass": (0.0, float("inf")), "eccentricity": (0.0, 1.0), "star_mass": (0.0, float("inf")),
+                    "star_distance": (0.0, float("inf"))}
+
+ERROR_COLUMNS = [column + suffix for column in UNCERTAIN_INPUTS for suffix in ("_error_min", "_error_max")]
+
+
+def load_uncertain_planets(catalog_path=CATALOG_PATH, df_planets=None):
+    """Loads the Formula inputs and their uncertainties of all planets, in the order of make_habit_df().
+
+    The catalog gives the lower and upper uncertainty of a value as error_min and error_max.
+    Missing or infinite uncertainties count as 0 (the value is used as it is), and so do the
+    solar system planets, which have no uncertainties.
+
+    Args:
+        catalog_path: Path of the exoplanet catalog.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+
+    Returns:
+        Dataframe with "# name", the four Formula inputs and their _error_min / _error_max columns
+    """
+
+    catalog = load_catalog(EXO_COLUMNS + ERROR_COLUMNS, path=catalog_path)
+    exoplanets = clean_exo_dataset(catalog)
+
+    # clean_exo_dataset() numbers the kept rows by catalog position (starting at 1)
+    errors = catalog[ERROR_COLUMNS].iloc[exoplanets.index - 1].reset_index(drop=True)
+    exoplanets = pd.concat([exoplanets[["# name"] + list(UNCERTAIN_INPUTS)].reset_index(drop=True), errors], axis=1)
+
+    if df_planets is None:
+        df_planets = load_solar_planets()
+    solar_system = habits_earth(df_planets)
+
+    planets = pd.concat([exoplanets, solar_system], axis=0, ignore_index=True)
+    errors = planets[ERROR_COLUMNS].to_numpy(dtype=float)
+    planets[ERROR_COLUMNS] = np.where(np.isfinite(errors), np.abs(errors), 0.0)
+
+    return planets
+
+
+def sample_parameters(values, errors_min, errors_max, rng, samples):
+    """Draws samples of one Formula input for many planets from a split normal distribution.
+
+    Below the catalog value the spread is error_min, above it error_max.
+
+    Args:
+        values: Catalog values (planets).
+        errors_min: Lower uncertainties (planets).
+        errors_max: Upper uncertainties (planets).
+        rng: numpy random Generator.
+        samples: Number of samples per planet.
+
+    Returns:
+        Array planets x samples
+    """
+
+    z = rng.standard_normal((len(values), samples))
+    spread = np.where(z < 0, errors_min[:, None], errors_max[:, None])
+    return values[:, None] + z * spread
+
+
+def score_samples(inputs, rng, samples):
+    """Draws samples of all Formula inputs and scores them like score_habitability().
+
+    Args:
+        inputs: Dict column -> (values, errors_min, errors_max) arrays of the planets.
+        rng: numpy random Generator.
+        samples: Number of samples per planet.
+
+    Returns:
+        HZ, Mass_range and Formula arrays, each planets x samples
+    """
+
+    sampled = {}
+    for column, (low, high) in UNCERTAIN_INPUTS.items():
+        sampled[column] = np.clip(sample_parameters(*inputs[column], rng, samples), low, high)
+
+    hzs = calculate_habitable_zone(sampled)
+    massr = mass_in_range(sampled["mass"])
+    formula = formula_values(hzs, sampled["eccentricity"], massr)[0]
+
+    return hzs, massr, formula
+
+
+def _chunk_inputs(planets):
+    """Formula inputs of a chunk of planets, as expected by score_samples()."""
+
+    return {column: (planets[column].to_numpy(dtype=float),
+                     planets[column + "_error_min"].to_numpy(dtype=float),
+                     planets[column + "_error_max"].to_numpy(dtype=float)) for column in UNCERTAIN_INPUTS}
+
+
+def _largest(values, n):
+    """The n largest values of every column (NaN counts as -inf), padded with -inf, as array n x columns."""
+
+    values = np.where(np.isnan(values), -np.inf, values)
+    if len(values) < n:
+        values = np.concatenate([values, np.full((n - len(values), values.shape[1]), -np.inf)])
+    return np.partition(values, len(values) - n, axis=0)[len(values) - n:]
+
+
+def _summarize_chunk(planets, seed, samples, top_n, interval):
+    """First pass over a chunk: percentiles of every planet and the top_n Formula values of every sample."""
+
+    hzs, massr, formula = score_samples(_chunk_inputs(planets), np.random.default_rng(seed), samples)
+
+    quantiles = [0.5, (1 - interval) / 2, (1 + interval) / 2]
+    with np.errstate(invalid='ignore'):
+        summary = {"Formula": np.nanquantile(formula, quantiles, axis=1),
+                   "HZ": np.nanquantile(hzs, quantiles, axis=1),
+                   "P_mass_range": massr.mean(axis=1)}
+
+    return summary, _largest(formula, top_n)
+
+
+def _count_chunk(planets, seed, samples, thresholds):
+    """Second pass over a chunk: number of samples in which each planet reaches the top (same seed, same samples)."""
+
+    formula = score_samples(_chunk_inputs(planets), np.random.default_rng(seed), samples)[2]
+    return (formula >= thresholds[None, :]).sum(axis=1)
+
+
+def uncertain_habitability(planets=None, samples=SAMPLES, top_n=TOP_N, interval=INTERVAL, seed=0, processes=None,
+                           max_cells=MAX_CELLS):
+    """Propagates the catalog uncertainties through the Formula with Monte Carlo sampling.
+
+    Every planet gets `samples` draws of mass, eccentricity, star mass and star distance, all
+    planets x samples arrays are scored at once. The planets are split into chunks of at most
+    max_cells values, which run in a process pool. The samples of a chunk come from its own seed,
+    so the results do not depend on the number of processes.
+
+    The probability of a top rank needs the top_n threshold of every sample over all planets:
+    the first pass keeps the top_n values of every sample per chunk, the second pass draws the
+    same samples again and counts how often each planet reaches the threshold. Ties at the
+    threshold count for all tied planets.
+
+    Args:
+        planets: Dataframe from load_uncertain_planets(), loaded if None.
+        samples: Number of samples per planet.
+        top_n: Size of the top group for the probability.
+        interval: Share of the samples inside the credible interval, e.g. 0.9 for the 5% and 95% quantiles.
+        seed: Seed of the random generator.
+        processes: Number of worker processes, the number of CPUs if None, 1 to run in this process.
+        max_cells: Maximum planets x samples of one chunk.
+
+    Returns:
+        Dataframe in the order of make_habit_df() with Name, the point value of the Formula, median
+        and credible interval of Formula and HZ, P_mass_range (share of samples inside the mass
+        range) and P_top<top_n> (share of samples in which the planet is among the top_n)
+    """
+
+    if planets is None:
+        planets = load_uncertain_planets()
+
+    rows = max(1, max_cells // samples)
+    chunks = [planets.iloc[start:start + rows] for start in range(0, len(planets), rows)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    if processes == 1:
+        executor = None
+        run = map
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes or os.cpu_count())
+        run = executor.map
+
+    try:
+        summaries = list(run(_summarize_chunk, chunks, seeds, [samples] * len(chunks), [top_n] * len(chunks),
+                             [interval] * len(chunks)))
+
+        # top_n threshold of every sample over all planets
+        thresholds = _largest(np.concatenate([largest for _, largest in summaries]), top_n).min(axis=0)
+
+        counts = np.concatenate(list(run(_count_chunk, chunks, seeds, [samples] * len(chunks),
+                                         [thresholds] * len(chunks))))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    low, high = (1 - interval) / 2 * 100, (1 + interval) / 2 * 100
+    result = pd.DataFrame({"Name": planets["# name"].array,
+                           "Formula": score_habitability(planets)["Formula"].to_numpy()})
+    for column in ("Formula", "HZ"):
+        quantiles = np.concatenate([summary[column] for summary, _ in summaries], axis=1)
+        result[column + "_median"] = quantiles[0]
+        result["%s_p%g" % (column, low)] = quantiles[1]
+        result["%s_p%g" % (column, high)] = quantiles[2]
+    result["P_mass_range"] = np.concatenate([summary["P_mass_range"] for summary, _ in summaries])
+    result["P_top%d" % top_n] = counts / samples
+
+    return result
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Habitability with the uncertainties of the exoplanet catalog.")
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="samples per planet")
+    parser.add_argument("--top", type=int, default=TOP_N, help="size of the top group")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--out", default=None, help="csv file to write")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = uncertain_habitability(samples=args.samples, top_n=args.top, seed=args.seed, processes=args.processes)
+    print(result.sort_values("P_top%d" % args.top, ascending=False, kind="stable").head(30))
+    print("%d planets x %d samples in %.1f s" % (len(result), args.samples, time.perf_counter() - start))
+
+    if args.out:
+        result.to_csv(args.out)
@@ -0,0 +1,57 @@
+import importlib.util
+import sys
+import threading
+import types
+
+# held while a lazy module is executed, so threads that use it at the same time wait for the first one
+_load_lock = threading.RLock()
+
+
+class _LazyModule(types.ModuleType):
+    """Placeholder module that executes the real module on the first attribute access.
+
+    Unlike importlib.util.LazyLoader (before Python 3.12), other threads never see a half-executed
+    module: they wait until the module is complete.
+    """
+
+    def __getattribute__(self, attr):
+        with _load_lock:
+            # the first thread executes the module, the others find a normal module afterwards
+            # (attribute accesses while the module is executed come from that same thread)
+            loading = '_lazy_loading' in types.ModuleType.__getattribute__(self, '__dict__')
+            if type(self) is _LazyModule and not loading:
+                self._lazy_loading = True
+                try:
+                    self.__spec__.loader.exec_module(self)
+                    self.__class__ = types.ModuleType
+                finally:
+                    del self._lazy_loading
+        return types.ModuleType.__getattribute__(self, attr)
+
+
+def lazy_import(name):
+    """Imports a module only when one of its attributes is used for the first time.
+
+    Importing numpy, pandas or plotnine takes a lot longer than everything else in this
+    project, so the modules only pay for them once they really need them.
+
+    Args:
+        name: Name of the module, e.g. "pandas".
+
+    Returns:
+        The module (which is loaded on first attribute access)
+    """
+
+    # already imported (lazily or not), nothing to do
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named '%s'" % name, name=name)
+
+    module = importlib.util.module_from_spec(spec)
+    module.__class__ = _LazyModule
+    sys.modules[name] = module
+
+    return module
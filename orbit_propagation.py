@@ -0,0 +1,291 @@
+import math
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, load_catalog
+from exoplanets_formula import EXO_COLUMNS, clean_exo_dataset, load_solar_planets
+from star_systems import StarSystems, system_planets
+from universe_merge import DAYS_PER_YEAR
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Orbit columns of the catalog besides the EXO_COLUMNS: time of periastron (JD) and argument of periastron (degrees)
+ORBIT_COLUMNS = ["tperi", "omega"]
+
+# Kepler's equation is solved until the error of the eccentric anomaly is below this (radians)
+KEPLER_TOLERANCE = 1e-12
+
+# Iterations after which an element that has not converged is an error
+MAX_ITERATIONS = 50
+
+# Maximum planets x timesteps of one chunk, bounds the memory (about 8 MB per array)
+MAX_CELLS = 1_000_000
+
+# Timesteps per orbit for the time in the habitable zone
+ORBIT_STEPS = 1_000
+
+
+def solve_kepler(mean_anomaly, eccentricity, tolerance=KEPLER_TOLERANCE, max_iterations=MAX_ITERATIONS,
+                 method="halley"):
+    """Solves Kepler's equation M = E - e sin(E) for the eccentric anomaly E, for whole arrays at once.
+
+    All elements iterate together, elements that have converged drop out of the iteration, so the
+    few slow ones (high eccentricity near periastron) do not cost a full pass over the array. An
+    element has converged when the error left after its last step, estimated from the order of
+    the method, is below the tolerance.
+    The start value is the one of Danby (E = M + 0.85 e sign(sin M)), which converges for every
+    eccentricity below 1.
+
+    Args:
+        mean_anomaly: Mean anomalies in radians, any shape.
+        eccentricity: Eccentricities, broadcast against mean_anomaly (e.g. planets x 1).
+        tolerance: Largest error (radians) left after the last iteration.
+        max_iterations: Maximum number of iterations.
+        method: "halley" (third order) or "newton" (second order).
+
+    Returns:
+        Eccentric anomalies in radians in the shape of the broadcast inputs, NaN where the eccentricity
+        is missing or not in [0, 1)
+
+    Raises:
+        RuntimeError: If some elements do not converge within max_iterations.
+    """
+
+    if method not in ("halley", "newton"):
+        raise ValueError('Unknown method %r, use "halley" or "newton"' % method)
+
+    mean_anomaly, eccentricity = np.broadcast_arrays(np.asarray(mean_anomaly, dtype=float),
+                                                     np.asarray(eccentricity, dtype=float))
+    shape = mean_anomaly.shape
+    # the mean anomaly is reduced to [-pi, pi), where the start value works best
+    mean_anomaly = np.remainder(mean_anomaly.ravel() + math.pi, 2 * math.pi) - math.pi
+    eccentricity = eccentricity.ravel()
+
+    with np.errstate(invalid='ignore'):
+        valid = (eccentricity >= 0) & (eccentricity < 1) & np.isfinite(mean_anomaly)
+    anomaly = np.full(mean_anomaly.shape, np.nan)
+
+    # only the elements that still iterate are kept in the working arrays
+    active = np.flatnonzero(valid)
+    m, e = mean_anomaly[active], eccentricity[active]
+    # sign(sin M) = sign(M) on [-pi, pi)
+    current = m + 0.85 * e * np.sign(m)
+
+    for _ in range(max_iterations):
+        if not len(active):
+            break
+        e_sin, e_cos = e * np.sin(current), e * np.cos(current)
+        f = current - e_sin - m
+        f_prime = 1 - e_cos
+        size = np.abs(f / f_prime)
+        if method == "halley":
+            step = f * f_prime / (f_prime * f_prime - 0.5 * f * e_sin)
+            # the error after the step is about (f''^2 / 4f'^2 - f''' / 6f') size^3
+            remaining = ((e_sin / (2 * f_prime)) ** 2 + np.abs(e_cos) / (6 * f_prime)) * (size * size * size)
+        else:
+            step = f / f_prime
+            # the error after the step is about f'' / 2f' size^2
+            remaining = np.abs(e_sin) / (2 * f_prime) * (size * size)
+        current = current - step
+
+        # an element is done if the next correction would be below the tolerance, which saves the
+        # iteration that only confirms the convergence
+        done = (size <= tolerance) | (remaining <= tolerance)
+        if done.any():
+            anomaly[active[done]] = current[done]
+            keep = ~done
+            active, m, e, current = active[keep], m[keep], e[keep], current[keep]
+    else:
+        if len(active):
+            raise RuntimeError('Kepler equation did not converge for %d elements in %d iterations'
+                               % (len(active), max_iterations))
+
+    return anomaly.reshape(shape)
+
+
+def orbit_planets(catalog_path=CATALOG_PATH, df_planets=None):
+    """Loads the orbits of all planets of make_habit_df(), with the columns of their stars.
+
+    Where the catalog has no semi-major axis it comes from Kepler's third law (period and star mass).
+    The solar system planets have no time of periastron, their orbits start at periastron at time 0.
+
+    Args:
+        catalog_path: Path of the exoplanet catalog.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+
+    Returns:
+        Dataframe like star_systems.system_planets() plus orbital_period (days), tperi and omega
+    """
+
+    catalog = load_catalog(EXO_COLUMNS + ORBIT_COLUMNS, path=catalog_path)
+    exoplanets = clean_exo_dataset(catalog)
+    if df_planets is None:
+        df_planets = load_solar_planets()
+
+    planets = system_planets(exoplanets, df_planets)
+    # clean_exo_dataset() numbers the kept rows by catalog position (starting at 1)
+    orbits = catalog[["orbital_period"] + ORBIT_COLUMNS].iloc[exoplanets.index - 1].reset_index(drop=True)
+    solar_orbits = pd.DataFrame({"orbital_period": df_planets["orbital period (Earth years)"].to_numpy(dtype=float)
+                                 * DAYS_PER_YEAR})
+    orbits = pd.concat([orbits, solar_orbits], axis=0, ignore_index=True)
+    for column in ["orbital_period"] + ORBIT_COLUMNS:
+        planets[column] = orbits[column].to_numpy(dtype=float)
+
+    # a^3 = M P^2 (AU, solar masses, years)
+    kepler_axis = np.cbrt(planets["star_mass"].to_numpy(dtype=float) *
+                          (planets["orbital_period"].to_numpy(dtype=float) / DAYS_PER_YEAR) ** 2)
+    planets["semi_major_axis"] = planets["semi_major_axis"].fillna(pd.Series(kepler_axis))
+
+    return planets
+
+
+def mean_anomalies(planets, times):
+    """Mean anomaly of every planet at every time.
+
+    Args:
+        planets: Dataframe with orbital_period (days) and optionally tperi (same time scale as times).
+        times: Times in days.
+
+    Returns:
+        Array planets x times in radians, in [0, 2 pi)
+    """
+
+    period = planets["orbital_period"].to_numpy(dtype=float)[:, None]
+    tperi = planets["tperi"].to_numpy(dtype=float) if "tperi" in planets else np.zeros(len(planets))
+    phase = (np.asarray(times, dtype=float)[None, :] - np.nan_to_num(tperi)[:, None]) / period
+    return 2 * math.pi * (phase - np.floor(phase))
+
+
+def orbit_positions(planets, anomaly):
+    """Positions in the orbital plane and distances to the star from the eccentric anomalies.
+
+    The x axis points to the ascending node: the periastron lies at the angle omega, or on the
+    x axis where omega is unknown.
+
+    Args:
+        planets: Dataframe with semi_major_axis (AU), eccentricity and optionally omega (degrees).
+        anomaly: Eccentric anomalies, planets x times.
+
+    Returns:
+        Dict with x, y and distance (AU), each planets x times
+    """
+
+    a = planets["semi_major_axis"].to_numpy(dtype=float)[:, None]
+    e = planets["eccentricity"].to_numpy(dtype=float)[:, None]
+    cos_anomaly, sin_anomaly = np.cos(anomaly), np.sin(anomaly)
+
+    # periastron on the x axis
+    x = a * (cos_anomaly - e)
+    y = a * np.sqrt(1 - e * e) * sin_anomaly
+
+    if "omega" in planets:
+        omega = np.radians(np.nan_to_num(planets["omega"].to_numpy(dtype=float)))[:, None]
+        x, y = x * np.cos(omega) - y * np.sin(omega), x * np.sin(omega) + y * np.cos(omega)
+
+    return {"x": x, "y": y, "distance": a * (1 - e * cos_anomaly)}
+
+
+def propagate(planets, times, max_cells=MAX_CELLS, tolerance=KEPLER_TOLERANCE, method="halley"):
+    """Positions of all planets at all times, in chunks of planets.
+
+    Args:
+        planets: Dataframe with semi_major_axis, orbital_period, eccentricity and optionally tperi and omega.
+        times: Times in days.
+        max_cells: Maximum planets x times of one chunk (at least one planet per chunk).
+        tolerance: See solve_kepler().
+        method: See solve_kepler().
+
+    Yields:
+        Position of the first planet of the chunk and the dict of orbit_positions() of the chunk
+    """
+
+    times = np.asarray(times, dtype=float)
+    rows = max(1, max_cells // max(1, len(times)))
+    for start in range(0, len(planets), rows):
+        chunk = planets.iloc[start:start + rows]
+        e = chunk["eccentricity"].to_numpy(dtype=float)[:, None]
+        anomaly = solve_kepler(mean_anomalies(chunk, times), e, tolerance, method=method)
+        yield start, orbit_positions(chunk, anomaly)
+
+
+def distance_series(planets, times, max_cells=MAX_CELLS, dtype="float64"):
+    """Distance to the star of every planet at every time.
+
+    Args:
+        planets: See propagate().
+        times: Times in days.
+        max_cells: Maximum planets x times computed at once.
+        dtype: dtype of the result, e.g. "float32" to halve the memory of long series.
+
+    Returns:
+        Array planets x times in AU
+    """
+
+    distances = np.empty((len(planets), len(times)), dtype=dtype)
+    for start, positions in propagate(planets, times, max_cells):
+        distances[start:start + len(positions["distance"])] = positions["distance"]
+    return distances
+
+
+def time_in_habitable_zone(planets, hz_inner, hz_outer, times=None, steps=ORBIT_STEPS, max_cells=MAX_CELLS):
+    """Share of the time every planet spends between the edges of the habitable zone.
+
+    Without times the share is taken over one full orbit: `steps` times evenly spaced over the
+    period, which only depend on the eccentricity, not on period or time of periastron.
+
+    Args:
+        planets: See propagate().
+        hz_inner: Inner edge of the habitable zone of every planet (AU).
+        hz_outer: Outer edge of the habitable zone of every planet (AU).
+        times: Times in days, one full orbit if None.
+        steps: Timesteps of the full orbit.
+        max_cells: Maximum planets x times computed at once.
+
+    Returns:
+        Array in the order of the planets, NaN where the orbit is unknown
+    """
+
+    if times is None:
+        planets = planets.assign(orbital_period=1.0, tperi=0.0)
+        times = (np.arange(steps) + 0.5) / steps
+
+    hz_inner, hz_outer = np.asarray(hz_inner, dtype=float), np.asarray(hz_outer, dtype=float)
+    shares = np.empty(len(planets))
+    for start, positions in propagate(planets, times, max_cells):
+        distance = positions["distance"]
+        stop = start + len(distance)
+        inside = (distance >= hz_inner[start:stop, None]) & (distance <= hz_outer[start:stop, None])
+        shares[start:stop] = np.where(np.isnan(distance).any(axis=1), np.nan, inside.mean(axis=1))
+    return shares
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time in the habitable zone on the eccentric orbits of all planets.")
+    parser.add_argument("names", nargs="*", help="planets to show the distance to their star over one orbit for")
+    parser.add_argument("--steps", type=int, default=ORBIT_STEPS, help="timesteps per orbit")
+    args = parser.parse_args()
+
+    planets = orbit_planets()
+    systems = StarSystems(planets)
+    table = pd.DataFrame({"Name": planets["# name"].array, "semi_major_axis": planets["semi_major_axis"],
+                          "eccentricity": planets["eccentricity"], "hz_inner": systems.broadcast("hz_inner"),
+                          "hz_outer": systems.broadcast("hz_outer"), "in_hz": systems.in_habitable_zone()})
+    table["hz_time"] = time_in_habitable_zone(planets, table["hz_inner"], table["hz_outer"], steps=args.steps)
+
+    # planets that are inside for part of their orbit, and planets where the mean orbit gives the wrong answer
+    print(table[(table["hz_time"] > 0) | table["in_hz"]].sort_values("hz_time", ascending=False, kind="stable"))
+
+    for name in args.names:
+        planet = planets[planets["# name"] == name]
+        if planet.empty:
+            print('\n%s is not among the cleaned planets' % name)
+            continue
+        times = np.linspace(0, planet["orbital_period"].iloc[0], 13)
+        distance = distance_series(planet.assign(tperi=0.0), times)[0]
+        print('\n%s, distance to the star (AU) over one orbit from periastron:' % name)
+        for time, value in zip(times, distance):
+            print('  day %10.2f  %8.4f' % (time, value))
@@ -1,49 +1,177 @@
-import numpy as np
-from plotnine import *
-import pandas as pd
+import glob
+import hashlib
+import io
+import json
+import os
+from lazy_imports import lazy_import
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 # for webscraping
-from bs4 import BeautifulSoup
-import requests
+requests = lazy_import('requests')
+etree = lazy_import('lxml.etree')
 
 
+# Where downloaded pages (and the tables parsed from them) are kept between runs
+HTTP_CACHE_DIR = 'data/.cache/http'
+
+# Seconds to wait for the server before giving up
+TIMEOUT = 10
+
+# How often a failed request is tried again, and the base of the waiting time between tries (in seconds)
+RETRIES = 3
+BACKOFF = 0.5
+
+# Pooled session that is shared by all requests, created on first use
+_session = None
 
-def scrape_planets_table(url):
-    """Scrapes this specific table from this html webpage,
-    and transforms it into a dataframe
+
+def get_session(retries=RETRIES, backoff=BACKOFF):
+    """Returns the shared requests session, with connection pooling and bounded retries.
+
+    Failed connections and the status codes 429, 500, 502, 503 and 504 are retried up to
+    `retries` times, waiting backoff, 2*backoff, 4*backoff ... seconds in between.
+    The settings only apply to the first call, which creates the session.
 
     Args:
-        url: The URL of the webpage to scrape.
+        retries: Maximum number of retries per request.
+        backoff: Base of the waiting time between retries in seconds.
 
     Returns:
-        returns the created dataframe made up of the html table
+        requests.Session
+    """
+
+    global _session
+
+    if _session is None:
+        from urllib3.util.retry import Retry
+
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET', 'HEAD']))
+        adapter = requests.adapters.HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=16)
+        _session = requests.Session()
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+
+    return _session
+
+
+def cache_path(url, cache_dir=HTTP_CACHE_DIR):
+    """Returns the base path of the cache files of a URL (without file extension).
+
+    Args:
+        url: The URL of the webpage.
+        cache_dir: Folder of the response cache.
+
+    Returns:
+        Path in the cache folder
     """
-    # Make a request to the URL and get the HTML content
-    req = requests.get(url)
-    content = req.text
 
-    # Parse the HTML content using BeautifulSoup
-    soup = BeautifulSoup(content, features="lxml")
+    return os.path.join(cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32])
+
+
+def fetch_page(url, cache_dir=HTTP_CACHE_DIR, session=None, timeout=TIMEOUT):
+    """Downloads a webpage, or confirms that the cached copy is still up to date.
+
+    The ETag and Last-Modified headers of the last response are sent back as If-None-Match and
+    If-Modified-Since. If the server answers 304 (Not Modified), the cached copy is used.
 
-    # Find the table containing the planets' data
-    table_planets = soup.find('table')
-    
-    # Find all the table header elements (th tags)
-    table_headers = table_planets.find_all('th')
+    Args:
+        url: The URL of the webpage.
+        cache_dir: Folder of the response cache.
+        session: requests session to use, the shared one of get_session() if None.
+        timeout: Seconds to wait for the server.
+
+    Returns:
+        Dict with "content" (bytes), "encoding", "modified" (False if the cached copy was used)
+        and "path" (base path of the cache files)
+    """
+
+    session = session or get_session()
+    path = cache_path(url, cache_dir)
+
+    # validators of the cached copy, if there is one
+    meta = None
+    headers = {}
+    if os.path.exists(path + '.json') and os.path.exists(path + '.html'):
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    response = session.get(url, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and meta is not None:
+        with open(path + '.html', 'rb') as f:
+            content = f.read()
+        return {'content': content, 'encoding': meta.get('encoding'), 'modified': False, 'path': path}
+
+    response.raise_for_status()
+
+    # new version of the page: both files are written to temporary files first. The old validators are
+    # removed before the content is replaced and the new ones come last, so validators always belong to
+    # the .html next to them (an interrupted write only costs a full download next time)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path + '.html.tmp', 'wb') as f:
+        f.write(response.content)
+    meta = {'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'encoding': response.encoding}
+    with open(path + '.json.tmp', 'w') as f:
+        json.dump(meta, f)
+    if os.path.exists(path + '.json'):
+        os.remove(path + '.json')
+    os.replace(path + '.html.tmp', path + '.html')
+    os.replace(path + '.json.tmp', path + '.json')
+
+    return {'content': response.content, 'encoding': response.encoding, 'modified': True, 'path': path}
+
+
+def parse_planets_table(content, encoding=None):
+    """Transforms the first html table of a webpage into a dataframe.
+
+    The first row holds the column names and the first column the row names (the planets' attributes).
+    lxml parses the page only until the end of the first table, and the table can have any size.
 
-    # Create an empty list to store the extracted table headers
-    tlist = []
-    
-    # Loop through each table header element and extract the text
-    for th in table_headers:
-        text = th.text  # extract only th's text
-        tlist.append(text)
+    Args:
+        content: html of the webpage as bytes (or str).
+        encoding: Encoding of the page, detected by lxml if None.
 
-    # Convert the list of table headers into a numpy array
-    np_tlist = np.array(tlist)
+    Returns:
+        Dataframe with one row per column of the html table (one row per planet)
+    """
 
-    # Reshape the numpy array into a 2D array with shape (17, 9)
-    np_tlist = np_tlist.reshape((17, 9))
+    if isinstance(content, str):
+        content = content.encode(encoding or 'utf-8')
+        encoding = encoding or 'utf-8'
+
+    # Find the table containing the planets' data, the rest of the page is not parsed at all
+    table_planets = None
+    for event, element in etree.iterparse(io.BytesIO(content), events=('start', 'end'), tag='table',
+                                          html=True, encoding=encoding):
+        if event == 'start' and table_planets is None:
+            table_planets = element
+        elif event == 'end' and element is table_planets:
+            break
+
+    if table_planets is None:
+        raise ValueError('No table found in the webpage')
+
+    # text of every cell (th or td), row by row
+    rows = []
+    for tr in table_planets.iter('tr'):
+        cells = [''.join(cell.itertext()) for cell in tr if cell.tag in ('th', 'td')]
+        if cells:
+            rows.append(cells)
+
+    # Convert the list of cells into a numpy array (rows shorter than the first one are filled up)
+    width = len(rows[0])
+    np_tlist = np.array([row[:width] + [''] * (width - len(row)) for row in rows])
 
     # Divide the numpy array into columns, indices, and values
     # Columns: extract the first row of the numpy array as column names (excluding the first element)
@@ -54,17 +182,49 @@ def scrape_planets_table(url):
     values = np_tlist[1:, 1:]
 
     # Create a DataFrame using the extracted columns, indices, and values
-    # Note: df_index = pd.Index(index) is commented out and not used in this version of the code
     df_table = pd.DataFrame(columns=columns, index=index, data=values)
 
-    # Drop any rows containing NaN (Not a Number) values from the DataFrame (inplace is not specified, so the original DataFrame is not modified)
-    df_table.dropna()
-
     # Transpose the DataFrame, swapping rows and columns
-    df_table_transposed = df_table.transpose()
+    return df_table.transpose()
+
+
+def scrape_planets_table(url, cache_dir=HTTP_CACHE_DIR, session=None):
+    """Scrapes this specific table from this html webpage,
+    and transforms it into a dataframe
+
+    If the page did not change since the last call (304 Not Modified),
+    the table parsed last time is returned without parsing the page again.
+    The parsed table is stored under a hash of the page content, so it is never used for
+    another version of the page.
+
+    Args:
+        url: The URL of the webpage to scrape.
+        cache_dir: Folder of the response cache.
+        session: requests session to use, the shared one of get_session() if None.
+
+    Returns:
+        returns the created dataframe made up of the html table
+    """
+    # Make a request to the URL (or reuse the cached page) and get the HTML content
+    page = fetch_page(url, cache_dir, session)
+    content_hash = hashlib.sha256(page['content']).hexdigest()[:16]
+    table_path = '%s.%s.table.pkl' % (page['path'], content_hash)
+
+    # page not modified: no parsing needed
+    if not page['modified'] and os.path.exists(table_path):
+        return pd.read_pickle(table_path)
+
+    df_table = parse_planets_table(page['content'], page['encoding'])
+    df_table.to_pickle(table_path + '.tmp')
+    os.replace(table_path + '.tmp', table_path)
+
+    # tables of older versions of the page are not used anymore
+    for old_path in glob.glob(glob.escape(page['path']) + '.*.table.pkl'):
+        if old_path != table_path:
+            os.remove(old_path)
 
     # Return the transposed DataFrame
-    return df_table_transposed
+    return df_table
 
 
 
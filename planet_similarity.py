@@ -0,0 +1,285 @@
+import os
+import pickle
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, file_hash, load_catalog
+from exoplanets_formula import EXO_COLUMNS, SOLAR_PLANETS_PATH, clean_exo_dataset, load_solar_planets
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Where the similarity index is kept between runs
+INDEX_PATH = 'data/.cache/similarity_index.pkl'
+
+# Version of the index file, a change forces a rebuild
+INDEX_VERSION = 1
+
+# Features of the similarity space (Earth units and Kelvin)
+FEATURES = ["mass", "radius", "temp_calculated", "eccentricity"]
+
+# Features that span orders of magnitude, they are compared on a log scale
+LOG_FEATURES = {"mass", "radius", "temp_calculated"}
+
+# Weights of the Earth Similarity Index (radius and temperature as in the ESI, mass stands in for
+# the density, eccentricity is our own addition)
+ESI_WEIGHTS = {"mass": 1.07, "radius": 0.57, "temp_calculated": 5.58, "eccentricity": 1.0}
+
+# exoplanet.eu gives masses and radii in Jupiter units
+JUPITER_MASS_EARTHS = 317.83
+JUPITER_RADIUS_EARTHS = 11.209
+
+
+def similarity_features(exoplanets=None, df_planets=None):
+    """Collects the similarity features of all cleaned exoplanets and the solar system planets.
+
+    Args:
+        exoplanets: Cleaned exoplanet dataframe from clean_exo_dataset(), loaded if None.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+
+    Returns:
+        Dataframe with "# name" and the FEATURES in Earth units and Kelvin, exoplanets first
+    """
+
+    if exoplanets is None:
+        exoplanets = clean_exo_dataset(load_catalog(EXO_COLUMNS))
+    if df_planets is None:
+        df_planets = load_solar_planets()
+
+    exo_features = pd.DataFrame({"# name": exoplanets["# name"].array,
+                                 "mass": exoplanets["mass"].to_numpy(dtype=float) * JUPITER_MASS_EARTHS,
+                                 "radius": exoplanets["radius"].to_numpy(dtype=float) * JUPITER_RADIUS_EARTHS,
+                                 "temp_calculated": exoplanets["temp_calculated"].to_numpy(dtype=float),
+                                 "eccentricity": exoplanets["eccentricity"].to_numpy(dtype=float)})
+
+    # the surface temperature is given as range in Celsius, its middle in Kelvin is compared
+    temperature = (df_planets["minimum temperature at surface (C)"].to_numpy(dtype=float) +
+                   df_planets["maximum temperature at surface (C)"].to_numpy(dtype=float)) / 2 + 273.15
+    solar_features = pd.DataFrame({"# name": df_planets["Planet"].array,
+                                   "mass": df_planets["mass (Earth=1)"].to_numpy(dtype=float),
+                                   "radius": df_planets["diameter (Earth=1)"].to_numpy(dtype=float),
+                                   "temp_calculated": temperature,
+                                   "eccentricity": df_planets["orbital eccentricity"].to_numpy(dtype=float)})
+
+    return pd.concat([exo_features, solar_features], axis=0, ignore_index=True)
+
+
+def esi(features, reference):
+    """Earth Similarity Index-style score of planets compared with one reference planet.
+
+    Every feature contributes (1 - |x - x0| / (x + x0)) to the power of its weight / number of
+    features, eccentricity contributes (1 - |e - e0|). 1 means identical, 0 completely different.
+
+    Args:
+        features: Dict (or dataframe) feature -> array of the planets.
+        reference: Dict feature -> value of the reference planet.
+
+    Returns:
+        Array of scores
+    """
+
+    score = 1.0
+    for feature, weight in ESI_WEIGHTS.items():
+        values = np.asarray(features[feature], dtype=float)
+        if feature == "eccentricity":
+            term = 1 - np.abs(values - reference[feature])
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                term = 1 - np.abs(values - reference[feature]) / (values + reference[feature])
+        score = score * np.power(np.clip(term, 0, 1), weight / len(ESI_WEIGHTS))
+    return score
+
+
+class SimilarityIndex:
+    """KD-tree over the normalized features of all planets, for nearest neighbour and radius queries.
+
+    Mass, radius and temperature are compared on a log scale, every feature is scaled to mean 0
+    and standard deviation 1 so they all count the same. The tree is built once, each query then
+    only visits a few of its leaves.
+    """
+
+    def __init__(self, features, state=None):
+        """Builds the index.
+
+        Args:
+            features: Dataframe from similarity_features().
+            state: Center, scale and tree of a saved index (see save()), they are computed if None.
+        """
+
+        self.features = features.reset_index(drop=True)
+        self.names = self.features["# name"].to_numpy(dtype=object)
+
+        if state is not None:
+            self.center, self.scale, self.tree = state['center'], state['scale'], state['tree']
+            return
+
+        # scipy is slow to import, so only here where it is actually needed
+        from scipy.spatial import cKDTree
+
+        raw = self._transform(self.features)
+        self.center = raw.mean(axis=0)
+        self.scale = raw.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.tree = cKDTree((raw - self.center) / self.scale)
+
+    @staticmethod
+    def _transform(features):
+        """Feature matrix (planets x FEATURES) with the log features on a log scale."""
+
+        columns = []
+        for feature in FEATURES:
+            values = np.asarray(features[feature], dtype=float)
+            columns.append(np.log10(np.maximum(values, 1e-6)) if feature in LOG_FEATURES else values)
+        return np.column_stack(columns)
+
+    def reference(self, query):
+        """Features of a query: the name of a planet in the index, or a dict with the FEATURES.
+
+        Returns:
+            Dict feature -> value
+        """
+
+        if isinstance(query, str):
+            positions = np.flatnonzero(self.names == query)
+            if len(positions) == 0:
+                raise KeyError('Planet not in the similarity index: %r' % query)
+            return self.features.loc[positions[0], FEATURES].to_dict()
+        return {feature: float(query[feature]) for feature in FEATURES}
+
+    def _point(self, reference):
+        """Normalized position of a reference in the tree space."""
+
+        return (self._transform({feature: [value] for feature, value in reference.items()})[0] - self.center) / self.scale
+
+    def _result(self, positions, distances, reference, query):
+        """Dataframe of the found planets, closest first, without the query planet itself."""
+
+        result = self.features.iloc[positions].copy()
+        result.insert(1, "distance", distances)
+        result.insert(2, "ESI", esi(result, reference))
+        if isinstance(query, str):
+            result = result[result["# name"] != query]
+        return result
+
+    def nearest(self, query, k=50):
+        """The k planets closest to a query planet.
+
+        Args:
+            query: Name of a planet in the index (e.g. "Earth", "Kepler-22 b") or dict with the FEATURES.
+            k: Number of planets.
+
+        Returns:
+            Dataframe with name, distance in the normalized space, ESI-style score and the features
+        """
+
+        return self.nearest_batch([query], k)[0]
+
+    def nearest_batch(self, queries, k=50):
+        """The k closest planets of many queries, with one tree query for all of them.
+
+        Args:
+            queries: Names of planets or dicts with the FEATURES.
+            k: Number of planets per query.
+
+        Returns:
+            List of dataframes like nearest(), in the order of queries
+        """
+
+        references = [self.reference(query) for query in queries]
+        points = np.array([self._point(reference) for reference in references])
+
+        # one more, as a named query finds itself first
+        count = min(k + 1, len(self.names))
+        distances, positions = self.tree.query(points, count)
+        distances = distances.reshape(len(queries), count)
+        positions = positions.reshape(len(queries), count)
+
+        return [self._result(positions[number], distances[number], reference, query).head(k)
+                for number, (reference, query) in enumerate(zip(references, queries))]
+
+    def within(self, query, radius):
+        """All planets within a distance of a query planet in the normalized space.
+
+        Args:
+            query: Name of a planet in the index or dict with the FEATURES.
+            radius: Maximum distance (1 is one standard deviation of one feature).
+
+        Returns:
+            Dataframe like nearest(), closest first
+        """
+
+        reference = self.reference(query)
+        point = self._point(reference)
+        positions = np.array(self.tree.query_ball_point(point, radius), dtype=np.int64)
+        distances = np.sqrt(((self.tree.data[positions] - point) ** 2).sum(axis=1))
+        order = np.argsort(distances, kind="stable")
+
+        return self._result(positions[order], distances[order], reference, query)
+
+    def save(self, path=INDEX_PATH, source=None):
+        """Saves the index, replacing the old file in a single step.
+
+        Args:
+            path: Path of the index file.
+            source: Hashes of the input files, to detect when the index is outdated.
+
+        Returns:
+            None
+        """
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump({'version': INDEX_VERSION, 'source': source, 'features': self.features,
+                         'center': self.center, 'scale': self.scale, 'tree': self.tree}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+
+def load_index(catalog_path=CATALOG_PATH, solar_path=SOLAR_PLANETS_PATH, path=INDEX_PATH):
+    """Loads the saved similarity index, or builds and saves it if it is missing or outdated.
+
+    Args:
+        catalog_path: Path of the exoplanet catalog.
+        solar_path: Path of solarPlanets.csv.
+        path: Path of the index file.
+
+    Returns:
+        SimilarityIndex
+    """
+
+    source = {'catalog': file_hash(catalog_path), 'solar': file_hash(solar_path)}
+
+    try:
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if saved['version'] == INDEX_VERSION and saved['source'] == source:
+            return SimilarityIndex(saved['features'], saved)
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+        pass
+
+    exoplanets = clean_exo_dataset(load_catalog(EXO_COLUMNS, path=catalog_path))
+    index = SimilarityIndex(similarity_features(exoplanets, load_solar_planets(solar_path)))
+    index.save(path, source)
+
+    return index
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Finds the planets most similar to a planet.")
+    parser.add_argument("planets", nargs="*", default=["Earth"], help="names of the query planets")
+    parser.add_argument("-k", type=int, default=50, help="number of similar planets")
+    parser.add_argument("--radius", type=float, default=None, help="all planets within this distance instead")
+    args = parser.parse_args()
+
+    index = load_index()
+    if args.radius is None:
+        results = index.nearest_batch(args.planets, args.k)
+    else:
+        results = [index.within(planet, args.radius) for planet in args.planets]
+
+    for planet, result in zip(args.planets, results):
+        print('Planets similar to %s:' % planet)
+        print(result.to_string(index=False))
@@ -0,0 +1,450 @@
+import collections
+import concurrent.futures
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+from lazy_imports import lazy_import
+from plot_render import PLANET_COLORS, PLANET_ORDER, _use_headless_backend
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Where animations are written by default
+ANIMATION_DIR = 'data/animations'
+
+# Frames per second of the written animations
+FPS = 24
+
+# Resolution of the frames (the figures are 8 x 8 inches for the orbits, 10 x 8 for the ranking)
+DPI = 80
+
+# Frames rendered ahead per worker process: bounds the frames waiting in memory to be written in order
+FRAMES_AHEAD = 4
+
+# Colours of the ranking, from not habitable to very habitable (like make_habitability_plot())
+RANKING_COLORS = ["red", "orange", "yellow", "green", "blue"]
+
+
+class OrbitScene:
+    """The eight planets moving along their orbits around the sun.
+
+    Distances are drawn on a square root scale, so the inner planets stay visible next to Neptune.
+    """
+
+    @staticmethod
+    def precompute(frames=240, years=12.0, df_planets=None, path_steps=200):
+        """Positions of the planets in every frame, already in plot coordinates.
+
+        Args:
+            frames: Number of frames.
+            years: Time span of the animation in Earth years (12 is one orbit of Jupiter).
+            df_planets: Typed solar system planets, loaded with load_solar_planets() if None.
+            path_steps: Points of the drawn orbit of every planet.
+
+        Returns:
+            Dict of arrays: x, y (planets x frames), path_x, path_y (planets x path_steps), days (frames), names
+        """
+
+        from exoplanets_formula import load_solar_planets
+        from orbit_propagation import propagate
+        from universe_merge import DAYS_PER_YEAR
+
+        if df_planets is None:
+            df_planets = load_solar_planets()
+        df_planets = df_planets.set_index("Planet").reindex(PLANET_ORDER)
+        # without a time of periastron all planets start at their periastron
+        orbits = pd.DataFrame({"semi_major_axis": df_planets["mean distance from Sun (AU)"].to_numpy(dtype=float),
+                               "eccentricity": df_planets["orbital eccentricity"].to_numpy(dtype=float),
+                               "orbital_period": df_planets["orbital period (Earth years)"].to_numpy(dtype=float)
+                               * DAYS_PER_YEAR})
+
+        def plot_coordinates(times, orbits):
+            x, y = _positions(propagate(orbits, times))
+            # square root of the distance, same direction
+            scale = 1 / np.sqrt(np.maximum(np.hypot(x, y), 1e-12))
+            return x * scale, y * scale
+
+        days = np.linspace(0, years * DAYS_PER_YEAR, frames)
+        x, y = plot_coordinates(days, orbits)
+        # one full orbit per planet: the same times relative to the period
+        path_x, path_y = plot_coordinates(np.linspace(0, 1, path_steps), orbits.assign(orbital_period=1.0))
+
+        return {"x": x, "y": y, "path_x": path_x, "path_y": path_y, "days": days, "names": np.array(PLANET_ORDER)}
+
+    def __init__(self, arrays, dpi=DPI):
+        """Builds the figure once, frames only move the planets.
+
+        Args:
+            arrays: Arrays from precompute() (memory-mapped).
+            dpi: Resolution of the frames.
+        """
+
+        import matplotlib.pyplot as plt
+
+        self.arrays = arrays
+        self.dpi = dpi
+        self.figure, axes = plt.subplots(figsize=(8, 8), facecolor='black')
+        axes.set_facecolor('black')
+        axes.set_aspect('equal')
+        limit = np.abs(np.concatenate([arrays["path_x"], arrays["path_y"]])).max() * 1.05
+        axes.set_xlim(-limit, limit)
+        axes.set_ylim(-limit, limit)
+        axes.axis('off')
+
+        for path_x, path_y, color in zip(arrays["path_x"], arrays["path_y"], PLANET_COLORS):
+            axes.plot(path_x, path_y, color=color, linewidth=0.6, alpha=0.5)
+        axes.scatter([0], [0], s=200, color='gold')
+        self.planets = axes.scatter(arrays["x"][:, 0], arrays["y"][:, 0], s=60, c=PLANET_COLORS, zorder=3)
+        self.labels = [axes.text(0, 0, name, color='white', fontsize=8) for name in arrays["names"]]
+        self.title = axes.set_title('', color='white', fontsize=16)
+
+    def frames(self):
+        """Number of frames."""
+
+        return self.arrays["x"].shape[1]
+
+    def draw(self, frame):
+        """Renders one frame.
+
+        Args:
+            frame: Number of the frame.
+
+        Returns:
+            png file content (bytes)
+        """
+
+        x, y = self.arrays["x"][:, frame], self.arrays["y"][:, frame]
+        self.planets.set_offsets(np.column_stack([x, y]))
+        for label, label_x, label_y in zip(self.labels, x, y):
+            label.set_position((label_x + 0.08, label_y + 0.08))
+        self.title.set_text('Solar system, year %.2f (distances on a square root scale)' %
+                            (self.arrays["days"][frame] / 365.25))
+        return _png(self.figure, self.dpi)
+
+
+class RankingScene:
+    """The most habitable planets of the catalog as it grew, one frame per year of discovery."""
+
+    @staticmethod
+    def precompute(top_n=20, d=None, df_planets=None):
+        """Top planets by Formula of the catalog state of every year.
+
+        Args:
+            top_n: Number of planets shown.
+            d: exoplanet catalog with the EXO_COLUMNS, loaded from the csv cache if None.
+            df_planets: Typed solar system planets, loaded with load_solar_planets() if None.
+
+        Returns:
+            Dict of arrays: top (years x top_n positions, -1 if there are fewer planets), formula
+            (years x top_n), years, names (all planets)
+        """
+
+        from catalog_cache import load_catalog
+        from catalog_schema import schema_dtypes
+        from exoplanets_formula import EXO_COLUMNS, clean_exo_dataset, load_solar_planets, make_habit_df
+        from ranking import HabitabilityRanking
+
+        if d is None:
+            d = load_catalog(EXO_COLUMNS, dtypes=schema_dtypes(EXO_COLUMNS))
+        if df_planets is None:
+            df_planets = load_solar_planets()
+        exoplanets = clean_exo_dataset(d)
+        habits = make_habit_df(exoplanets, df_planets, clean=False)
+
+        # the solar system planets are known from the start (make_habit_df() puts them last)
+        discovered = np.full(len(habits), -np.inf)
+        discovered[:len(exoplanets)] = exoplanets["discovered"].to_numpy(dtype=float)
+        years = np.unique(discovered[np.isfinite(discovered)])
+
+        # the full order is sorted once, every year only keeps the planets known in that year
+        order = HabitabilityRanking(habits).order("Formula")
+        formula = habits["Formula"].to_numpy(dtype=float)
+        top = np.full((len(years), top_n), -1)
+        for frame, year in enumerate(years):
+            known = order[discovered[order] <= year][:top_n]
+            top[frame, :len(known)] = known
+
+        values = np.where(top >= 0, formula[top], np.nan)
+        return {"top": top, "formula": values, "years": years, "names": habits["Name"].to_numpy(dtype=str)}
+
+    def __init__(self, arrays, dpi=DPI):
+        """Builds the figure once, frames only move the points and change the names.
+
+        Args:
+            arrays: Arrays from precompute() (memory-mapped).
+            dpi: Resolution of the frames.
+        """
+
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import LinearSegmentedColormap, LogNorm
+
+        self.arrays = arrays
+        self.dpi = dpi
+        top_n = arrays["top"].shape[1]
+        self.figure, self.axes = plt.subplots(figsize=(10, 8), facecolor='black')
+        self.figure.subplots_adjust(left=0.25)
+        self.axes.set_facecolor('black')
+        self.axes.set_xscale('log')
+        formula = arrays["formula"][np.isfinite(arrays["formula"]) & (arrays["formula"] > 0)]
+        self.axes.set_xlim(formula.min() / 2, formula.max() * 2)
+        self.axes.set_ylim(top_n - 0.5, -0.5)
+        self.axes.set_yticks(np.arange(top_n))
+        self.axes.tick_params(colors='white')
+        self.axes.set_xlabel('Formula', color='white')
+
+        cmap = LinearSegmentedColormap.from_list('habitability', RANKING_COLORS)
+        self.points = self.axes.scatter(np.ones(top_n), np.arange(top_n), c=np.ones(top_n), s=80, cmap=cmap,
+                                        norm=LogNorm(formula.min(), formula.max()))
+        self.title = self.axes.set_title('', color='white', fontsize=18)
+
+    def frames(self):
+        """Number of frames."""
+
+        return len(self.arrays["years"])
+
+    def draw(self, frame):
+        """Renders one frame.
+
+        Args:
+            frame: Number of the frame.
+
+        Returns:
+            png file content (bytes)
+        """
+
+        top, formula = self.arrays["top"][frame], self.arrays["formula"][frame]
+        self.points.set_offsets(np.column_stack([formula, np.arange(len(top))]))
+        self.points.set_array(formula)
+        self.axes.set_yticklabels([self.arrays["names"][position] if position >= 0 else '' for position in top])
+        self.title.set_text('Most habitable planets known in %d' % self.arrays["years"][frame])
+        return _png(self.figure, self.dpi)
+
+
+# Animations by name
+SCENES = {"orbits": OrbitScene, "ranking": RankingScene}
+
+# Scene of the worker process (set by _init_worker())
+_worker_scene = {}
+
+
+def _positions(chunks):
+    """x and y of all planets from the chunks of orbit_propagation.propagate()."""
+
+    parts = [positions for _, positions in chunks]
+    return np.concatenate([part["x"] for part in parts]), np.concatenate([part["y"] for part in parts])
+
+
+def _png(figure, dpi):
+    """Renders a figure into png file content."""
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', dpi=dpi, facecolor=figure.get_facecolor())
+    return buffer.getvalue()
+
+
+def save_arrays(arrays, folder):
+    """Saves the precomputed arrays of a scene, one .npy file per array, for the workers to memory-map.
+
+    Args:
+        arrays: Dict of arrays from a precompute().
+        folder: Folder to write into.
+
+    Returns:
+        folder
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(folder, name + '.npy'), np.asarray(values))
+    return folder
+
+
+def load_arrays(folder):
+    """Memory-maps the arrays saved with save_arrays() (read only, shared through the page cache).
+
+    Args:
+        folder: Folder of the arrays.
+
+    Returns:
+        Dict of arrays
+    """
+
+    return {name[:-4]: np.load(os.path.join(folder, name), mmap_mode='r')
+            for name in sorted(os.listdir(folder)) if name.endswith('.npy')}
+
+
+def _init_worker(scene, folder, dpi):
+    """Builds the figure of the scene once per worker process."""
+
+    _use_headless_backend()
+    _worker_scene['scene'] = SCENES[scene](load_arrays(folder), dpi)
+
+
+def _draw_frame(frame):
+    """Renders one frame in the worker process."""
+
+    return _worker_scene['scene'].draw(frame)
+
+
+def render_frames(scene, folder, dpi=DPI, processes=None):
+    """Renders all frames of a scene in a process pool and yields them in order.
+
+    Every worker builds the figure once and only updates it per frame. At most FRAMES_AHEAD frames
+    per worker are in flight, so the frames waiting to be written stay bounded while the workers
+    never wait for the writer.
+
+    Args:
+        scene: Name of the scene in SCENES.
+        folder: Folder of the arrays saved with save_arrays().
+        dpi: Resolution of the frames.
+        processes: Number of worker processes, the number of CPUs if None, 1 to render in this process.
+
+    Yields:
+        png file content of every frame, in order
+    """
+
+    _init_worker(scene, folder, dpi)
+    frames = _worker_scene['scene'].frames()
+
+    if processes == 1:
+        for frame in range(frames):
+            yield _draw_frame(frame)
+        return
+
+    processes = processes or os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                                initargs=(scene, folder, dpi)) as executor:
+        pending = collections.deque()
+        for frame in range(frames):
+            pending.append(executor.submit(_draw_frame, frame))
+            if len(pending) >= processes * FRAMES_AHEAD:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def find_encoder():
+    """Path of a local ffmpeg, None if there is none."""
+
+    return shutil.which('ffmpeg')
+
+
+def write_animation(frames, out_path, fps=FPS, encoder=None):
+    """Writes frames in order into a GIF or MP4 file, or into a folder of png files.
+
+    MP4 needs ffmpeg. GIF is written with ffmpeg if there is one, otherwise with Pillow. If the
+    format cannot be written, the frames go into the folder <out_path without extension>_frames.
+    Everything is written under a temporary name and moved into place at the end.
+
+    Args:
+        frames: Iterable of png file contents, in order.
+        out_path: Path of the animation (.gif or .mp4).
+        fps: Frames per second.
+        encoder: Path of ffmpeg, searched with find_encoder() if None.
+
+    Returns:
+        Path of the written animation or frame folder
+    """
+
+    fmt = os.path.splitext(out_path)[1].lower().lstrip('.')
+    encoder = encoder or find_encoder()
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    tmp_path = '%s.%d.tmp.%s' % (os.path.splitext(out_path)[0], os.getpid(), fmt)
+
+    if encoder is not None and fmt in ('gif', 'mp4'):
+        # image2pipe reads the png files one after the other from stdin
+        options = (['-vf', 'split[a][b];[a]palettegen[p];[b][p]paletteuse'] if fmt == 'gif' else
+                   ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', '-c:v', 'libx264'])
+        process = subprocess.Popen([encoder, '-y', '-loglevel', 'error', '-f', 'image2pipe', '-framerate', str(fps),
+                                    '-i', '-'] + options + [tmp_path], stdin=subprocess.PIPE)
+        try:
+            for frame in frames:
+                process.stdin.write(frame)
+        finally:
+            process.stdin.close()
+        if process.wait() != 0:
+            raise RuntimeError('%s failed to encode %s' % (encoder, out_path))
+        os.replace(tmp_path, out_path)
+        return out_path
+
+    if fmt == 'gif':
+        from PIL import Image
+
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            raise ValueError('No frames to write to %s' % out_path)
+        first = Image.open(io.BytesIO(first))
+        # Pillow pulls the other frames one by one while it writes
+        first.save(tmp_path, format='GIF', save_all=True, loop=0, duration=round(1000 / fps),
+                   append_images=(Image.open(io.BytesIO(frame)) for frame in frames))
+        os.replace(tmp_path, out_path)
+        return out_path
+
+    folder = os.path.splitext(out_path)[0] + '_frames'
+    tmp_folder = tempfile.mkdtemp(prefix=os.path.basename(folder) + '.', dir=os.path.dirname(folder) or '.')
+    for number, frame in enumerate(frames):
+        with open(os.path.join(tmp_folder, 'frame_%05d.png' % number), 'wb') as f:
+            f.write(frame)
+    shutil.rmtree(folder, ignore_errors=True)
+    os.rename(tmp_folder, folder)
+    # mkdtemp() makes the folder private (0700), it gets the permissions of a folder made with os.makedirs()
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(folder, 0o777 & ~umask)
+    return folder
+
+
+def render_animation(scene, out_path=None, fps=FPS, dpi=DPI, processes=None, **options):
+    """Precomputes a scene, renders its frames in parallel and writes the animation.
+
+    Args:
+        scene: Name of the scene in SCENES, "orbits" or "ranking".
+        out_path: Path of the animation, <ANIMATION_DIR>/<scene>.gif if None.
+        fps: Frames per second.
+        dpi: Resolution of the frames.
+        processes: Number of worker processes, the number of CPUs if None, 1 to render in this process.
+        **options: Arguments of the precompute() of the scene, e.g. frames and years of the orbits.
+
+    Returns:
+        Path of the written animation or frame folder (see write_animation())
+
+    Raises:
+        ValueError: If the animation would have no frames.
+    """
+
+    if options.get("frames", 1) < 1:
+        raise ValueError('An animation needs at least one frame, not %d' % options["frames"])
+    if out_path is None:
+        out_path = os.path.join(ANIMATION_DIR, scene + '.gif')
+
+    with tempfile.TemporaryDirectory(prefix='animation_') as folder:
+        save_arrays(SCENES[scene].precompute(**options), folder)
+        return write_animation(render_frames(scene, folder, dpi, processes), out_path, fps)
+
+
+if __name__ == "__main__":
+
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Renders animations of the planets in parallel.")
+    parser.add_argument("scene", choices=list(SCENES), help="animation to render")
+    parser.add_argument("--out", default=None, help="animation file (.gif or .mp4), default %s/<scene>.gif"
+                        % ANIMATION_DIR)
+    parser.add_argument("--fps", type=int, default=FPS, help="frames per second")
+    parser.add_argument("--dpi", type=int, default=DPI, help="resolution of the frames")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--frames", type=int, default=240, help="frames of the orbits animation")
+    parser.add_argument("--years", type=float, default=12.0, help="years shown by the orbits animation")
+    parser.add_argument("--top", type=int, default=20, help="planets shown by the ranking animation")
+    args = parser.parse_args()
+
+    options = {"frames": args.frames, "years": args.years} if args.scene == "orbits" else {"top_n": args.top}
+    start = time.perf_counter()
+    path = render_animation(args.scene, args.out, args.fps, args.dpi, args.processes, **options)
+    print('Wrote %s in %.1f s' % (path, time.perf_counter() - start))
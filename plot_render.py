@@ -0,0 +1,278 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+from lazy_imports import lazy_import
+
+# heavy libraries are only imported when they are used for the first time
+pd = lazy_import('pandas')
+
+
+# Where rendered plots are kept, named by the hash of everything that goes into them
+RENDER_CACHE_DIR = 'data/.cache/plots'
+
+# Order of the planets on the x axis and their colours
+PLANET_ORDER = ['Mercury', 'Venus', 'Earth', 'Mars', 'Jupiter', 'Saturn', 'Uranus', 'Neptune']
+PLANET_COLORS = ['grey', 'brown', 'navy', 'red', 'green', 'yellow', 'cyan', 'blue']
+
+# Look of the attribute plots: black background with white axes
+DARK_THEME = {'background': 'black', 'text': 'white', 'legend_text': 'black', 'title_size': 20}
+
+# One entry per menu choice of plot_general():
+#   column: attribute on the y axis
+#   title: plot title
+#   y_min: lower limit of the y axis (the upper one is the maximum of the column), None for automatic limits
+#   label: color of the value labels below the points, None for no labels
+#   title_size: False to keep the default title size
+ATTRIBUTE_PLOTS = {
+    "0": {'column': 'diameter (Earth=1)', 'title': "Planet mass (Earth=1)", 'y_min': None, 'label': None,
+          'title_size': False},
+    "1": {'column': 'mass (Earth=1)', 'title': "Planet mass (Earth=1)", 'y_min': 0, 'label': None},
+    "2": {'column': 'mean distance from Sun (AU)', 'title': "Planet mean distance from Sun (AU)", 'y_min': 0,
+          'label': None},
+    "3": {'column': 'orbital period (Earth years)', 'title': "Planet orbital period (Earth years)", 'y_min': 0,
+          'label': None},
+    "4": {'column': 'orbital eccentricity', 'title': "Planet orbital eccentricity", 'y_min': 0, 'label': None},
+    "5": {'column': 'mean orbital velocity (km/sec)', 'title': "Planet mean orbital velocity (km/sec)", 'y_min': 0,
+          'label': None},
+    "6": {'column': 'rotation period (in Earth days)', 'title': "Planet rotation period (in Earth days))",
+          'y_min': -300, 'label': 'white'},
+    "7": {'column': 'inclination of axis (degrees)', 'title': "Planet inclination of axis (degrees)", 'y_min': None,
+          'label': None},
+    "8": {'column': 'gravity at equator (Earth=1)', 'title': "Planet gravity at equator (Earth=1", 'y_min': -1,
+          'label': 'black'},
+    "9": {'column': 'escape velocity (km/sec)', 'title': "Planet escape velocity (km/sec)", 'y_min': 0, 'label': None},
+    "10": {'column': 'mean density (water=1)', 'title': "Planet mean density (water=1)", 'y_min': None,
+           'label': None},
+}
+
+# The chart of the 20 most habitable planets of exoplanets_formula.py (see make_habitability_plot()),
+# with its own theme, white legend text on black
+HABITABILITY_PLOT = {'x': 'Name', 'y': 'Formula', 'colors': ["red", "orange", "yellow", "green", "blue"],
+                     'figure_size': (15, 8), 'title': "Most habitable planets and exoplanets",
+                     'caption': "Note: The formula values are normalised for exoplanets, therefore planets in our "
+                                "solar system have a much higher value and have therefore all been divided by 10 "
+                                "and Earth set to 50 as its value is infinite."}
+HABITABILITY_THEME = dict(DARK_THEME, legend_text='white')
+
+# matplotlib backends that can not open a window
+FILE_BACKENDS = {'agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template'}
+
+
+def order_planets(df_planets):
+    """Sorts the planets by their distance from the sun (Mercury first).
+
+    Args:
+        df_planets (pd.DataFrame): Dataset of the planets in our solar system (see load_planets()).
+
+    Returns:
+        Sorted dataframe with "Planet" as ordered categorical column
+    """
+
+    df_planets = df_planets.copy()
+    df_planets['Planet'] = pd.Categorical(df_planets['Planet'], categories=PLANET_ORDER, ordered=True)
+    return df_planets.sort_values('Planet')
+
+
+def build_attribute_plot(df_planets, spec, theme_spec=DARK_THEME):
+    """Builds the plot of one attribute of all planets from its entry in ATTRIBUTE_PLOTS.
+
+    Args:
+        df_planets (pd.DataFrame): Planets sorted with order_planets().
+        spec: Entry of ATTRIBUTE_PLOTS.
+        theme_spec: Colours and title size, like DARK_THEME.
+
+    Returns:
+        plotnine ggplot object
+    """
+
+    # plotnine is slow to import, so only here where it is actually needed
+    from plotnine import (ggplot, aes, geom_point, geom_text, scale_color_manual, scale_y_continuous, theme,
+                          element_rect, element_text, labs)
+
+    column = spec['column']
+    title_size = {} if spec.get('title_size') is False else {'size': theme_spec['title_size']}
+
+    plot = (ggplot(df_planets, aes(x='Planet', y=column, color='Planet'))
+            + geom_point(size=5))
+    if spec['label'] is not None:
+        plot = plot + geom_text(aes(label=column), va='top', color=spec['label'], nudge_y=-8)
+    plot = plot + scale_color_manual(values=PLANET_COLORS)
+    if spec['y_min'] is not None:
+        plot = plot + scale_y_continuous(limits=(spec['y_min'], max(df_planets[column])))
+
+    return (plot
+            + theme(panel_background=element_rect(fill=theme_spec['background']),
+                    plot_background=element_rect(fill=theme_spec['background']),
+                    axis_text_x=element_text(angle=45, hjust=1, color=theme_spec['text']),
+                    axis_text_y=element_text(color=theme_spec['text']),
+                    axis_title_x=element_text(color=theme_spec['text']),
+                    axis_title_y=element_text(color=theme_spec['text']),
+                    legend_title=element_text(color=theme_spec['legend_text']),
+                    legend_text=element_text(color=theme_spec['legend_text']),
+                    plot_title=element_text(color=theme_spec['text'], **title_size))
+            + labs(title=spec['title']))
+
+
+def render_key(data, spec, theme_spec, fmt, dpi):
+    """Hash of everything a rendered plot depends on: data slice, plot spec, theme and output format.
+
+    Args:
+        data (pd.DataFrame): Data of the plot.
+        spec: Plot spec (dict).
+        theme_spec: Theme (dict).
+        fmt: File format, "png" or "svg".
+        dpi: Resolution of png files.
+
+    Returns:
+        Hex digest
+    """
+
+    sha = hashlib.sha256()
+    sha.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    sha.update(json.dumps({'columns': [str(column) for column in data.columns],
+                           'dtypes': [str(dtype) for dtype in data.dtypes],
+                           'spec': spec, 'theme': theme_spec, 'format': fmt, 'dpi': dpi},
+                          sort_keys=True, default=str).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def render_plot(build, data, spec, theme_spec=DARK_THEME, fmt='png', dpi=100, cache_dir=RENDER_CACHE_DIR):
+    """Renders a plot to a file, or returns the file rendered earlier for the same input.
+
+    Args:
+        build: Function (data, spec, theme_spec) -> ggplot, e.g. build_attribute_plot.
+        data (pd.DataFrame): Data of the plot.
+        spec: Plot spec (dict), passed on to build.
+        theme_spec: Theme (dict), passed on to build.
+        fmt: File format, "png" or "svg".
+        dpi: Resolution of png files.
+        cache_dir: Folder of the render cache.
+
+    Returns:
+        Path of the rendered file
+    """
+
+    path = os.path.join(cache_dir, '%s.%s' % (render_key(data, spec, theme_spec, fmt, dpi), fmt))
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    plot = build(data, spec, theme_spec)
+
+    # written under a temporary name first, so the cache never holds half a file
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    plot.save(tmp_path, format=fmt, dpi=dpi, verbose=False)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def render_attribute_plot(df_planets, choice, fmt='png', dpi=100, cache_dir=RENDER_CACHE_DIR):
+    """Renders the plot of one menu choice of plot_general() to a file (see render_plot()).
+
+    Args:
+        df_planets (pd.DataFrame): Dataset of the planets in our solar system (see load_planets()).
+        choice: Key of ATTRIBUTE_PLOTS, e.g. "1" for the masses.
+        fmt: File format, "png" or "svg".
+        dpi: Resolution of png files.
+        cache_dir: Folder of the render cache.
+
+    Returns:
+        Path of the rendered file
+    """
+
+    spec = ATTRIBUTE_PLOTS[choice]
+
+    # only the columns the plot uses go into the hash
+    columns = ['Planet', spec['column']]
+    data = order_planets(df_planets[columns])
+
+    return render_plot(build_attribute_plot, data, spec, DARK_THEME, fmt, dpi, cache_dir)
+
+
+def show_rendered(path):
+    """Shows a rendered png file in a plot window, the way printing a ggplot object shows the plot.
+
+    Without a display (a file backend like Agg) only the path of the file is printed.
+
+    Args:
+        path: Path of the png file (from render_plot()).
+
+    Returns:
+        path
+    """
+
+    import matplotlib
+    if matplotlib.get_backend().lower() in FILE_BACKENDS:
+        print('Plot rendered to %s' % path)
+        return path
+
+    import matplotlib.pyplot as plt
+    image = plt.imread(path)
+    figure = plt.figure(figsize=(image.shape[1] / 100, image.shape[0] / 100), dpi=100)
+    axes = figure.add_axes((0, 0, 1, 1))
+    axes.imshow(image)
+    axes.axis('off')
+    plt.show()
+    return path
+
+
+def _use_headless_backend():
+    """Makes matplotlib render without a display (used in the worker processes)."""
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_all(df_planets, fmt='png', dpi=100, cache_dir=RENDER_CACHE_DIR, processes=None):
+    """Renders the plots of all attributes in parallel, one plot per worker process.
+
+    Plots that are already in the render cache are returned without starting any worker.
+
+    Args:
+        df_planets (pd.DataFrame): Dataset of the planets in our solar system (see load_planets()).
+        fmt: File format, "png" or "svg".
+        dpi: Resolution of png files.
+        cache_dir: Folder of the render cache.
+        processes: Number of worker processes, the number of CPUs if None.
+
+    Returns:
+        Dict menu choice -> path of the rendered file
+    """
+
+    paths = {}
+    missing = []
+    for choice, spec in ATTRIBUTE_PLOTS.items():
+        data = order_planets(df_planets[['Planet', spec['column']]])
+        path = os.path.join(cache_dir, '%s.%s' % (render_key(data, spec, DARK_THEME, fmt, dpi), fmt))
+        if os.path.exists(path):
+            paths[choice] = path
+        else:
+            missing.append(choice)
+
+    if missing:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes,
+                                                    initializer=_use_headless_backend) as executor:
+            futures = {choice: executor.submit(render_attribute_plot, df_planets, choice, fmt, dpi, cache_dir)
+                       for choice in missing}
+            for choice, future in futures.items():
+                paths[choice] = future.result()
+
+    return {choice: paths[choice] for choice in ATTRIBUTE_PLOTS}
+
+
+if __name__ == "__main__":
+
+    import argparse
+    from plottingAndAllTheFun import load_planets
+
+    parser = argparse.ArgumentParser(description="Renders all attribute plots of the solar system planets to files.")
+    parser.add_argument("--format", default="png", choices=["png", "svg"], help="file format")
+    parser.add_argument("--dpi", type=int, default=100, help="resolution of png files")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    _use_headless_backend()
+    for choice, path in render_all(load_planets(), args.format, args.dpi, processes=args.processes).items():
+        print('%-3s %-35s %s' % (choice, ATTRIBUTE_PLOTS[choice]['column'], path))
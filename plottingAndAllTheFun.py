@@ -1,22 +1,49 @@
-import numpy as np
-import matplotlib.pyplot as plt
-from plotnine import *
-import pandas as pd
+import profiling
+from lazy_imports import lazy_import
+from plot_render import ATTRIBUTE_PLOTS, order_planets, render_attribute_plot, show_rendered
+from solar_schema import NAME_COLUMN, load_solar_table, parse_solar_planets
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 
 # Creating exception so user can exit at any point
 class ExitProgramException(Exception):
     pass
 
-# Load dataset
-df_planets = pd.read_csv('data/solarPlanets.csv')
+# Default location of the dataset
+SOLAR_PLANETS_PATH = 'data/solarPlanets.csv'
+
+# Columns of the attribute views of display_info(): spatial, movement and planetary attributes
+ATTRIBUTE_GROUPS = {"0": ["Planet", "diameter (km)", "mass (Earth=1)", "mean distance from Sun (AU)", "rings?"],
+                    "1": ["Planet", "orbital period (Earth years)", "orbital eccentricity", "mean orbital velocity (km/sec)",
+                          "rotation period (in Earth days)", "retrograde rotation", "inclination of axis (degrees)"],
+                    "2": ["Planet", "minimum temperature at surface (C)", "maximum temperature at surface (C)",
+                          "gravity at equator (Earth=1)", "escape velocity (km/sec)", "mean density (water=1)",
+                          "atmospheric composition"]}
+
+
+def load_planets(path=SOLAR_PLANETS_PATH, df_planets=None):
+    """Loads the dataset of the planets in our solar system in typed columns.
+
+    The csv file is only parsed when it changed, otherwise the typed table comes from the cache
+    (see solar_schema.py).
+
+    Args:
+        path: Path of the csv file created by ourSolarSystem.py.
+        df_planets: The dataset, typed (e.g. from the shared catalog of shared_catalog.py) or as read
+            from the csv file, loaded from path if None.
+
+    Returns:
+        Dataframe of the planets, ready for display_info() and plot_general()
+    """
 
-# Dataset cleanup and preparation
-df_planets = df_planets.rename_axis("planets")
-df_planets = df_planets.reset_index(drop=True)
-df_planets = df_planets.rename(columns={'Unnamed: 0': 'Planet'}, inplace=False)
-df_planets['rotation period (in Earth days)'] = df_planets['rotation period (in Earth days)'].str.rstrip('*')
-df_planets['rotation period (in Earth days)'] = df_planets['rotation period (in Earth days)'].apply(float)
+    if df_planets is None:
+        return load_solar_table(path)
+    if NAME_COLUMN in df_planets.columns:
+        return df_planets.reset_index(drop=True)
+    return parse_solar_planets(df_planets)
 
 
 def display_info(df_planets):
@@ -87,12 +114,8 @@ def display_info(df_planets):
                                 '(2) to compare planetary attributes\n'+
                                 '(x) to exit\n')
             match planet_num:
-                case "0":
-                    info_output = print(df_planets.iloc[:, [0, 2, 3, 4, 16]])
-                case "1":
-                    info_output = print(df_planets.iloc[:, [0, 5, 6, 7, 8, 9]])
-                case "2":
-                    info_output = print(df_planets.iloc[:, [0, 10, 11, 12, 13, 14]])
+                case "0" | "1" | "2":
+                    info_output = print(df_planets[ATTRIBUTE_GROUPS[planet_num]])
                 case "x":
                     ExitProgramException
                 case _:
@@ -115,15 +138,9 @@ def plot_general(df_planets):
         Prints the selected plot.
     
     """
-        
-   
-    correct_order = ['Mercury', 'Venus', 'Earth', 'Mars', 'Jupiter', 'Saturn', 'Uranus', 'Neptune']
 
     # Sort the DataFrame based on the correct order of the planets
-    df_planets['Planet'] = pd.Categorical(df_planets['Planet'], categories=correct_order, ordered=True)
-    df_planets = df_planets.sort_values('Planet')
-    # Applying colours to each planet
-    custom_colors = ['grey', 'brown', 'navy', 'red', 'green', 'yellow', 'cyan', 'blue']
+    df_planets = order_planets(df_planets)
 
 
     # User input to decide which attribute they want to compare
@@ -141,6 +158,7 @@ def plot_general(df_planets):
                                 '(9) to see a plot of the escape velocities\n' +
                                 '(10) to see a plot of the mean densities\n' +
                                 '... of all planets\n' +
+                                '(a) to render an animation of the planets moving along their orbits\n' +
                                 '(x) to exit or (b) to go back\n')
         
         if plot_choice == 'x':
@@ -149,201 +167,22 @@ def plot_general(df_planets):
         
         elif plot_choice == 'b':
             run_program(df_planets)
+
+        elif plot_choice == 'a':
+            # frames are rendered in parallel worker processes (see plot_animation.py)
+            from plot_animation import render_animation
+            with profiling.stage("animation", rows=len(df_planets)):
+                print('Animation written to %s' % render_animation("orbits", df_planets=df_planets))
         
         else:
 
-        # match case based on given user input
-            match plot_choice:
-                case "0":
-                    #adjusting plot appearance
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'diameter (Earth=1)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors) #applying custom color scheme
-                    #+ scale_y_continuous(limits=(-5,max(df_planets['diameter (Earth=1)'])))
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'), # Setting plot background to black
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),  # Setting legend text color to white
-                    plot_title=element_text(color='white'),  # Add plot title with white text
-                    )
-                    + labs(title="Planet mass (Earth=1)")
-                    )
-                    print(plot1)
-                case "1":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'mass (Earth=1)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors)
-                    + scale_y_continuous(limits=(0,max(df_planets['mass (Earth=1)']))) # Setting the min and max value shown on y-axis
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),
-                    plot_title=element_text(color='white', size=20)  # Setting legend text color to white
-                    )
-                    + labs(title="Planet mass (Earth=1)"))
-                    print(plot1)
-                case "2":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'mean distance from Sun (AU)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors)
-                    + scale_y_continuous(limits=(0,max(df_planets['mean distance from Sun (AU)'])))
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),
-                    plot_title=element_text(color='white', size=20)  # Setting legend text color to white
-                    )
-                    + ggtitle("Planet mean distance from Sun (AU)")) 
-                    print(plot1)
-                case "3":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'orbital period (Earth years)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors)
-                    + scale_y_continuous(limits=(0,max(df_planets['orbital period (Earth years)'])))
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),
-                    plot_title=element_text(color='white', size=20)  # Setting legend text color to white
-                    )
-                    + labs(title="Planet orbital period (Earth years)")) 
-                    print(plot1)
-                case "4":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'orbital eccentricity', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors)
-                    + scale_y_continuous(limits=(0,max(df_planets['orbital eccentricity'])))
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),
-                    plot_title=element_text(color='white', size=20)  # Setting legend text color to white
-                    )
-                    + labs(title="Planet orbital eccentricity")) 
-                    print(plot1)
-                case "5":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'mean orbital velocity (km/sec)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors)
-                    + scale_y_continuous(limits=(0,max(df_planets['mean orbital velocity (km/sec)'])))
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),
-                    plot_title=element_text(color='white', size=20)  # Setting legend text color to white
-                    )
-                    + labs(title="Planet mean orbital velocity (km/sec)")) 
-                    print(plot1)
-                case "6":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'rotation period (in Earth days)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + geom_text(aes(label='rotation period (in Earth days)'), va='top',color='white', nudge_y=-8)
-                    + scale_color_manual(values=custom_colors)
-                    + scale_y_continuous(limits=(-300,max(df_planets['rotation period (in Earth days)'])))
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),
-                    plot_title=element_text(color='white', size=20)  # Setting legend text color to white
-                    )
-                    + labs(title="Planet rotation period (in Earth days))")) 
-                    print(plot1)
-                case "7":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'inclination of axis (degrees)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors)
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),
-                    plot_title=element_text(color='white', size=20)  # Setting legend text color to white
-                    )
-                    + labs(title="Planet inclination of axis (degrees)")) 
-                    print(plot1)
-                case "8":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'gravity at equator (Earth=1)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + geom_text(aes(label='gravity at equator (Earth=1)'), va='top',color='black', nudge_y=-8)
-                    + scale_color_manual(values=custom_colors)
-                    + scale_y_continuous(limits=(-1,max(df_planets['gravity at equator (Earth=1)'])))
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),
-                    plot_title=element_text(color='white', size=20)  # Setting legend text color to white
-                    )
-                    + labs(title="Planet gravity at equator (Earth=1")) 
-                    print(plot1)
-                case "9":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'escape velocity (km/sec)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors)
-                    + scale_y_continuous(limits=(0,max(df_planets['escape velocity (km/sec)'])))
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),  # Setting legend text color to white
-                    plot_title=element_text(color='white', size=20))
-                    + labs(title="Planet escape velocity (km/sec)")) 
-                    print(plot1)
-                case "10":
-                    plot1 = (ggplot(df_planets, aes(x='Planet', y = 'mean density (water=1)', color = 'Planet'))
-                    + geom_point(size = 5)
-                    + scale_color_manual(values=custom_colors)
-                    + theme(panel_background=element_rect(fill='black'),
-                    plot_background=element_rect(fill='black'),
-                    axis_text_x=element_text(angle=45, hjust=1, color='white'),  # Rotating x-axis labels and setting text color to white
-                    axis_text_y=element_text(color='white'),  # Setting y-axis text color to white
-                    axis_title_x=element_text(color='white'),  # Setting x-axis title color to white
-                    axis_title_y=element_text(color='white'),  # Setting y-axis title color to white
-                    legend_title=element_text(color='black'),  # Setting legend title color to white
-                    legend_text=element_text(color='black'),  # Setting legend text color to white
-                    plot_title=element_text(color='white', size=20))
-                    + labs(title="Planet mean density (water=1)")) 
-                    print(plot1)
-                
-                case _: 
-                    print("Please enter a number between (0) and (11)") # Invalid input case
+        # every attribute plot is described by its entry in ATTRIBUTE_PLOTS, a plot that was shown
+        # before comes from the render cache (see plot_render.py)
+            if plot_choice in ATTRIBUTE_PLOTS:
+                with profiling.stage("plot " + ATTRIBUTE_PLOTS[plot_choice]['column'], rows=len(df_planets)):
+                    show_rendered(render_attribute_plot(df_planets, plot_choice))
+            else:
+                print("Please enter a number between (0) and (11)") # Invalid input case
             
     
 #still need docstring
@@ -387,6 +226,21 @@ def run_program(df_planets):
 
 if __name__ == "__main__":
 
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Windows to the Universe: planets of the solar system.")
+    parser.add_argument("--shared", action="store_true", help="use the shared catalog of shared_catalog.py")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+
+    with profiling.stage("load") as record:
+        if args.shared:
+            from shared_catalog import attach
+            df_planets = load_planets(df_planets=attach().frame("solar_planets"))
+        else:
+            df_planets = load_planets()
+        record["rows"] = len(df_planets)
     run_program(df_planets) 
 
 
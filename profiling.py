@@ -0,0 +1,248 @@
+import atexit
+import json
+import os
+import time
+
+# Environment variables that switch the profiling on without changing the command line
+PROFILE_ENV = 'HABITABILITY_PROFILE'     # path of the json report
+CPROFILE_ENV = 'HABITABILITY_CPROFILE'   # path of the cProfile dump of the slowest stage
+
+
+class Profiler:
+    """Collects time, row count and memory peaks of the stages of a run.
+
+    Every stage is timed with time.perf_counter(), the peak of newly allocated memory is taken
+    from tracemalloc (nested stages included) and the peak resident memory of the whole process
+    so far from getrusage(). If a cProfile path is given, every top-level stage runs under its
+    own cProfile profiler and only the statistics of the slowest stage are saved.
+    """
+
+    def __init__(self, report_path=None, cprofile_path=None, memory=True):
+        """Creates the profiler.
+
+        Args:
+            report_path: Path of the json report written by write(), nothing is written if None.
+            cprofile_path: Path of the cProfile dump of the slowest stage, no cProfile if None.
+            memory: False to skip the tracemalloc measurement (it slows python code down).
+        """
+
+        self.report_path = report_path
+        self.cprofile_path = cprofile_path
+        self.memory = memory
+        self.stages = []
+        self._depth = 0
+        self._open = []        # stages that measure memory, innermost last
+        self._hottest = None   # (seconds, stage name, cProfile.Profile) of the slowest top-level stage
+        self._start = time.perf_counter()
+
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def stage(self, name, rows=None):
+        """Measures a stage of the run, use it as context manager.
+
+        The record of the stage is returned by the with statement, its row count can be set
+        inside the block: `with profiler.stage("clean") as record: ...; record["rows"] = len(df)`.
+
+        Args:
+            name: Name of the stage.
+            rows: Number of rows the stage works on, if already known.
+
+        Returns:
+            Context manager
+        """
+
+        return _Stage(self, name, rows)
+
+    def report(self):
+        """Returns the measurements as json-compatible dict."""
+
+        return {'pid': os.getpid(),
+                'total_seconds': time.perf_counter() - self._start,
+                'hottest_stage': self._hottest[1] if self._hottest else None,
+                'cprofile': self.cprofile_path if self._hottest and self._hottest[2] else None,
+                'stages': self.stages}
+
+    def write(self):
+        """Writes the json report and the cProfile dump of the slowest stage (if their paths are set).
+
+        Returns:
+            None
+        """
+
+        if self._hottest is not None and self._hottest[2] is not None:
+            self._hottest[2].dump_stats(self.cprofile_path)
+
+        if self.report_path is not None:
+            with open(self.report_path + '.tmp', 'w') as f:
+                json.dump(self.report(), f, indent=1)
+            os.replace(self.report_path + '.tmp', self.report_path)
+
+
+class _Stage:
+    """Context manager of Profiler.stage()."""
+
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.record = {'stage': name, 'rows': rows, 'depth': profiler._depth}
+        self.profile = None
+
+    def __enter__(self):
+        profiler = self.profiler
+        profiler._depth += 1
+        profiler.stages.append(self.record)
+
+        if profiler.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            # reset_peak() is process-wide, so the enclosing stage keeps the peak it has reached so far
+            if profiler._open:
+                profiler._open[-1]._peak = max(profiler._open[-1]._peak, peak)
+            profiler._open.append(self)
+            self._memory_before = self._peak = current
+            tracemalloc.reset_peak()
+
+        # cProfile can not be nested, so only top-level stages are profiled
+        if profiler.cprofile_path is not None and self.record['depth'] == 0:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+        self._start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        profiler = self.profiler
+
+        if self.profile is not None:
+            self.profile.disable()
+
+        self.record['seconds'] = seconds
+        if profiler.memory:
+            import resource
+            import tracemalloc
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            profiler._open.pop()
+            # the peak of this stage is also a peak of the enclosing one
+            if profiler._open:
+                profiler._open[-1]._peak = max(profiler._open[-1]._peak, peak)
+            self.record['peak_alloc_bytes'] = max(peak - self._memory_before, 0)
+            # ru_maxrss is the peak of the whole process until now (in kilobytes on Linux), not of this stage
+            self.record['process_max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        profiler._depth -= 1
+
+        if self.record['depth'] == 0 and (profiler._hottest is None or seconds > profiler._hottest[0]):
+            profiler._hottest = (seconds, self.record['stage'], self.profile)
+
+        return False
+
+
+class _NoStage:
+    """Context manager of stage() when profiling is off: does nothing."""
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+# Profiler of this process, None while profiling is off
+_profiler = None
+
+
+def enable(report_path=None, cprofile_path=None, memory=True):
+    """Switches the profiling of this process on, the report is written when the process exits.
+
+    Args:
+        report_path: Path of the json report, printed to the console if None.
+        cprofile_path: Path of the cProfile dump of the slowest stage, no cProfile if None.
+        memory: False to skip the tracemalloc measurement.
+
+    Returns:
+        The Profiler
+    """
+
+    global _profiler
+
+    if _profiler is None:
+        _profiler = Profiler(report_path, cprofile_path, memory)
+        atexit.register(_write_at_exit, _profiler)
+
+    return _profiler
+
+
+def enable_from_env():
+    """Switches the profiling on if HABITABILITY_PROFILE (and optionally HABITABILITY_CPROFILE) is set.
+
+    Returns:
+        The Profiler, None if the variable is not set
+    """
+
+    if os.environ.get(PROFILE_ENV):
+        return enable(os.environ[PROFILE_ENV], os.environ.get(CPROFILE_ENV) or None)
+    return None
+
+
+def _write_at_exit(profiler):
+    """Writes the report of a profiler (or prints it if it has no report path)."""
+
+    if profiler.report_path is None:
+        print(json.dumps(profiler.report(), indent=1))
+    profiler.write()
+
+
+def stage(name, rows=None):
+    """Measures a stage of the run if profiling is on (see Profiler.stage()).
+
+    When profiling is off this returns a shared context manager that does nothing,
+    so instrumented code pays only for one function call.
+
+    Args:
+        name: Name of the stage.
+        rows: Number of rows the stage works on, if already known.
+
+    Returns:
+        Context manager, returning the record of the stage (a throwaway dict when profiling is off)
+    """
+
+    if _profiler is None:
+        return _NO_STAGE
+    return _profiler.stage(name, rows)
+
+
+def add_arguments(parser):
+    """Adds the --profile and --cprofile options to an argparse parser.
+
+    Args:
+        parser: argparse.ArgumentParser of a command line tool.
+
+    Returns:
+        None
+    """
+
+    parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="REPORT",
+                        help="measure the stages of the run and write a json report (printed if no path is given)")
+    parser.add_argument("--cprofile", default=None, metavar="PATH",
+                        help="save a cProfile dump of the slowest stage (needs --profile)")
+
+
+def enable_from_args(args):
+    """Switches the profiling on from the options of add_arguments() or the environment variables.
+
+    Args:
+        args: Parsed arguments.
+
+    Returns:
+        The Profiler, None if profiling stays off
+    """
+
+    if args.profile is not None:
+        return enable(None if args.profile == '-' else args.profile, args.cprofile)
+    return enable_from_env()
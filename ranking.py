@@ -0,0 +1,131 @@
+from lazy_imports import lazy_import
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+
+
+# Columns where a smaller value is better, everything else is ranked from high to low
+ASCENDING_COLUMNS = {"HZ"}
+
+
+class HabitabilityRanking:
+    """Ranks a habitility dataframe by one of its columns without sorting it again and again.
+
+    Top-N queries use partial selection (np.argpartition) and only sort the N selected planets.
+    Once the full order of a column is needed, it is computed once with a stable sort and kept,
+    so every later query on that column is a slice of the stored order.
+
+    Ties are always broken by the position in the dataframe, NaN values come last. This gives the
+    same order as habits.sort_values(by=column, ascending=..., kind="stable").
+    """
+
+    def __init__(self, habits, orders=None):
+        """Creates the ranking of a habitility dataframe.
+
+        Args:
+            habits (pd.DataFrame): habitility dataframe, e.g. from make_habit_df().
+            orders: Already known full orders, {(column, ascending): positions best first}, optional.
+        """
+
+        self.habits = habits
+        self._orders = dict(orders or {})   # (column, ascending) -> positions of all planets, best first
+
+    def _sort_key(self, by, ascending):
+        """Returns the values of a column so that smaller is better, and the mask of NaN values."""
+
+        values = self.habits[by].to_numpy(dtype=float)
+        return (values if ascending else -values), np.isnan(values)
+
+    def order(self, by="Formula", ascending=None):
+        """Positions of all planets in the dataframe, best planet first.
+
+        Args:
+            by: Column to rank by.
+            ascending: True if smaller values are better, default depends on the column (see ASCENDING_COLUMNS).
+
+        Returns:
+            Integer array of positions (for habits.iloc)
+        """
+
+        if ascending is None:
+            ascending = by in ASCENDING_COLUMNS
+
+        cache_key = (by, ascending)
+        if cache_key not in self._orders:
+            key, missing = self._sort_key(by, ascending)
+            valid = np.flatnonzero(~missing)
+
+            # stable sort keeps ties in dataframe order, NaN values are appended at the end
+            order = valid[np.argsort(key[valid], kind="stable")]
+            self._orders[cache_key] = np.concatenate([order, np.flatnonzero(missing)])
+
+        return self._orders[cache_key]
+
+    def top_positions(self, n, by="Formula", ascending=None):
+        """Positions of the n best planets, best planet first.
+
+        Args:
+            n: Number of planets, none for n <= 0.
+            by: Column to rank by.
+            ascending: True if smaller values are better, default depends on the column (see ASCENDING_COLUMNS).
+
+        Returns:
+            Integer array of positions (for habits.iloc)
+        """
+
+        if ascending is None:
+            ascending = by in ASCENDING_COLUMNS
+
+        # checked before the cached order is sliced, order[:-5] would be all planets but the last 5
+        n = max(int(n), 0)
+        if n == 0:
+            return np.zeros(0, dtype=np.intp)
+
+        # the full order is already known, so this is just a slice
+        cache_key = (by, ascending)
+        if cache_key in self._orders:
+            return self._orders[cache_key][:n]
+
+        key, missing = self._sort_key(by, ascending)
+        valid = np.flatnonzero(~missing)
+        if n >= len(valid):
+            return self.order(by, ascending)[:n]
+
+        # partial selection: the n-th best value splits the planets into better ones and ties
+        valid_key = key[valid]
+        threshold = valid_key[np.argpartition(valid_key, n - 1)[:n]].max()
+
+        better = valid[valid_key < threshold]
+        better = better[np.argsort(key[better], kind="stable")]
+
+        # valid is in dataframe order, so the first ties are the ones that come first in the dataframe
+        ties = valid[valid_key == threshold][:n - len(better)]
+
+        return np.concatenate([better, ties])
+
+    def top(self, n, by="Formula", ascending=None):
+        """The n best planets.
+
+        Args:
+            n: Number of planets, none for n <= 0.
+            by: Column to rank by.
+            ascending: True if smaller values are better, default depends on the column (see ASCENDING_COLUMNS).
+
+        Returns:
+            Habitility dataframe of the n best planets, best planet first
+        """
+
+        return self.habits.iloc[self.top_positions(n, by, ascending)]
+
+    def ranked(self, by="Formula", ascending=None):
+        """The whole habitility dataframe in ranking order.
+
+        Args:
+            by: Column to rank by.
+            ascending: True if smaller values are better, default depends on the column (see ASCENDING_COLUMNS).
+
+        Returns:
+            Sorted habitility dataframe
+        """
+
+        return self.habits.iloc[self.order(by, ascending)]
@@ -0,0 +1,299 @@
+import json
+import os
+import shutil
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, file_hash, load_catalog
+from exoplanets_formula import EXO_COLUMNS, SOLAR_PLANETS_PATH, clean_exo_dataset, load_solar_planets
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Where the shared catalog is published, one folder per version plus the pointer to the current one
+SHARED_DIR = 'data/.cache/shared'
+
+# Version of the folder layout, a change forces a new publication
+LAYOUT_VERSION = 2
+
+# Number of published versions kept on disk (workers may still be attached to the previous one)
+KEEP_VERSIONS = 2
+
+# Number of tries to attach to the current version while newer versions are published
+ATTACH_ATTEMPTS = 5
+
+
+def _version_folder(version):
+    """Name of the folder of a published version."""
+
+    return 'v%06d' % version
+
+
+def _read_json(path):
+    """Reads a json file, None if there is no (readable) file."""
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_table(folder, frame):
+    """Saves every column of a dataframe as .npy file and returns the table entry of the manifest.
+
+    Numeric columns are saved as they are (nullable ones as float with NaN), text columns as fixed
+    width unicode arrays plus a mask of the missing values, so every file can be memory-mapped.
+    """
+
+    os.makedirs(folder)
+    index = frame.index.to_numpy()
+    np.save(os.path.join(folder, 'index.npy'), index if pd.api.types.is_numeric_dtype(index.dtype) else index.astype(str))
+
+    columns = {}
+    for number, column in enumerate(frame.columns):
+        series = frame[column]
+        entry = {'file': '%03d.npy' % number, 'dtype': str(series.dtype)}
+        if pd.api.types.is_extension_array_dtype(series.dtype) and pd.api.types.is_numeric_dtype(series.dtype):
+            entry['kind'] = 'number'
+            np.save(os.path.join(folder, entry['file']), series.to_numpy(dtype=float, na_value=np.nan))
+        elif pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            entry['kind'] = 'number'
+            np.save(os.path.join(folder, entry['file']), series.to_numpy())
+        else:
+            entry['kind'] = 'text'
+            missing = series.isna().to_numpy()
+            np.save(os.path.join(folder, entry['file']), series.astype(str).where(~missing, '').to_numpy(dtype=str))
+            if missing.any():
+                entry['mask'] = '%03d.mask.npy' % number
+                np.save(os.path.join(folder, entry['mask']), missing)
+        columns[column] = entry
+
+    return {'rows': len(frame), 'columns': columns, 'attrs': frame.attrs}
+
+
+def publish(catalog_path=CATALOG_PATH, solar_path=SOLAR_PLANETS_PATH, shared_dir=SHARED_DIR, force=False):
+    """Publishes the cleaned exoplanet catalog and the solar system planets as a new shared version.
+
+    The tables are written into a new version folder, then the pointer file current.json is replaced
+    in a single step, so attached workers see either the old or the new version, never a mix.
+    Nothing is written if the current version already belongs to the same source files.
+
+    Args:
+        catalog_path: Path of the exoplanet catalog.
+        solar_path: Path of solarPlanets.csv.
+        shared_dir: Folder of the shared catalog.
+        force: True to publish even if the source files did not change.
+
+    Returns:
+        Version number of the current publication
+    """
+
+    source = {'catalog': file_hash(catalog_path), 'solar': file_hash(solar_path)}
+    current = _read_json(os.path.join(shared_dir, 'current.json'))
+    if current is not None and not force and current.get('layout') == LAYOUT_VERSION and current['source'] == source:
+        return current['version']
+
+    version = (current['version'] if current is not None else 0) + 1
+    folder = os.path.join(shared_dir, _version_folder(version))
+    tmp_folder = '%s.%d.tmp' % (folder, os.getpid())
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+
+    tables = {'exoplanets': _save_table(os.path.join(tmp_folder, 'exoplanets'),
+                                        clean_exo_dataset(load_catalog(EXO_COLUMNS, path=catalog_path))),
+              'solar_planets': _save_table(os.path.join(tmp_folder, 'solar_planets'), load_solar_planets(solar_path))}
+    pointer = {'layout': LAYOUT_VERSION, 'version': version, 'folder': _version_folder(version), 'source': source}
+    with open(os.path.join(tmp_folder, 'manifest.json'), 'w') as f:
+        json.dump(dict(pointer, tables=tables), f, indent=1)
+
+    # the version folder is complete before the pointer moves to it
+    try:
+        os.rename(tmp_folder, folder)
+    except OSError:
+        # another process published the same version at the same time, its folder is used
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        return version
+    tmp_pointer = os.path.join(shared_dir, 'current.json.%d.tmp' % os.getpid())
+    with open(tmp_pointer, 'w') as f:
+        json.dump(pointer, f, indent=1)
+    os.replace(tmp_pointer, os.path.join(shared_dir, 'current.json'))
+
+    _remove_old_versions(shared_dir, version)
+
+    return version
+
+
+def _remove_old_versions(shared_dir, version):
+    """Removes all but the newest KEEP_VERSIONS version folders.
+
+    A SharedCatalog maps all files of its version when it is created, so workers attached to a
+    removed version keep reading it (the data stays until the last mapping is closed). Only new
+    attachments need the current folder.
+    """
+
+    for name in os.listdir(shared_dir):
+        if name.startswith('v') and name[1:].isdigit() and int(name[1:]) <= version - KEEP_VERSIONS:
+            shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+
+
+class SharedCatalog:
+    """Handle of one published version of the shared catalog.
+
+    Numeric columns are read-only memory-mapped views of the version files, so all workers on a
+    node share the same pages of the page cache instead of holding their own parsed copy. Every
+    file of the version is mapped when the handle is created, so the handle keeps working after
+    newer publications removed its folder. A handle always stays on its version, refresh()
+    returns a handle of the newest one.
+    """
+
+    def __init__(self, shared_dir=SHARED_DIR, manifest=None):
+        """Attaches to the current version.
+
+        Args:
+            shared_dir: Folder of the shared catalog.
+            manifest: Manifest of the version to attach to, the current one if None.
+
+        Raises:
+            FileNotFoundError: If nothing is published, or the files of the version are missing.
+        """
+
+        self.shared_dir = shared_dir
+        if manifest is not None:
+            self._map(manifest)
+            return
+
+        # newer publications can remove the folder between reading the pointer and mapping the
+        # files, then the attachment starts again with the new current version
+        for _ in range(ATTACH_ATTEMPTS):
+            current = _read_json(os.path.join(shared_dir, 'current.json'))
+            if current is None:
+                raise FileNotFoundError('No shared catalog published in %s' % shared_dir)
+            manifest = _read_json(os.path.join(shared_dir, current['folder'], 'manifest.json'))
+            if manifest is None:
+                continue
+            try:
+                self._map(manifest)
+                return
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError('The current version in %s could not be attached to' % shared_dir)
+
+    def _map(self, manifest):
+        """Maps the row labels, the columns and the masks of missing values of all tables of a version."""
+
+        folder = os.path.join(self.shared_dir, manifest['folder'])
+        arrays = {}
+        masks = {}
+        for table, entry in manifest['tables'].items():
+            arrays[(table, 'index')] = np.load(os.path.join(folder, table, 'index.npy'), mmap_mode='r')
+            for column, column_entry in entry['columns'].items():
+                arrays[(table, column)] = np.load(os.path.join(folder, table, column_entry['file']), mmap_mode='r')
+                if 'mask' in column_entry:
+                    masks[(table, column)] = np.load(os.path.join(folder, table, column_entry['mask']), mmap_mode='r')
+
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.folder = folder
+        self._arrays = arrays
+        self._masks = masks
+
+    def array(self, table, column):
+        """Read-only view of one column.
+
+        Args:
+            table: "exoplanets" or "solar_planets".
+            column: Name of the column, "index" for the row labels.
+
+        Returns:
+            numpy memmap (numeric columns) or unicode array (text columns)
+        """
+
+        return self._arrays[(table, column)]
+
+    def numeric_columns(self, table):
+        """Names of the numeric columns of a table (the ones frame() does not copy)."""
+
+        return [column for column, entry in self.manifest['tables'][table]['columns'].items() if entry['kind'] == 'number']
+
+    def frame(self, table, columns=None):
+        """Dataframe of (some columns of) a table.
+
+        Numeric columns are not copied, the dataframe uses the shared views. Text and nullable
+        columns are converted back into their dtype, which copies them, so only ask for the ones needed.
+
+        Args:
+            table: "exoplanets" (cleaned like clean_exo_dataset()) or "solar_planets" (like load_solar_planets()).
+            columns: Names of the columns, all columns if None.
+
+        Returns:
+            Dataframe with the row labels of the published table
+        """
+
+        entries = self.manifest['tables'][table]['columns']
+        if columns is None:
+            columns = list(entries)
+
+        data = {}
+        for column in columns:
+            values = self.array(table, column)
+            if entries[column]['kind'] == 'text':
+                values = values.astype(object)
+                if (table, column) in self._masks:
+                    values[self._masks[(table, column)]] = np.nan
+            elif pd.api.types.is_extension_array_dtype(pd.api.types.pandas_dtype(entries[column]['dtype'])):
+                values = pd.array(values, dtype=entries[column]['dtype'])
+            data[column] = values
+
+        frame = pd.DataFrame(data, columns=list(columns), index=pd.Index(self.array(table, 'index')), copy=False)
+        frame.attrs = self.manifest['tables'][table].get('attrs', {})
+        return frame
+
+    def is_current(self):
+        """Checks if the handle still points to the newest published version."""
+
+        current = _read_json(os.path.join(self.shared_dir, 'current.json'))
+        return current is None or current['version'] == self.version
+
+    def refresh(self):
+        """Handle of the newest published version (this handle if it is still the newest).
+
+        Returns:
+            SharedCatalog
+        """
+
+        if self.is_current():
+            return self
+        return SharedCatalog(self.shared_dir)
+
+
+def attach(shared_dir=SHARED_DIR, catalog_path=CATALOG_PATH, solar_path=SOLAR_PLANETS_PATH):
+    """Attaches to the shared catalog, publishing it first if the source files changed or nothing is published.
+
+    Args:
+        shared_dir: Folder of the shared catalog.
+        catalog_path: Path of the exoplanet catalog.
+        solar_path: Path of solarPlanets.csv.
+
+    Returns:
+        SharedCatalog of the current version
+    """
+
+    publish(catalog_path, solar_path, shared_dir)
+    return SharedCatalog(shared_dir)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publishes the cleaned catalog for worker processes.")
+    parser.add_argument("--force", action="store_true", help="publish a new version even if nothing changed")
+    parser.add_argument("--dir", default=SHARED_DIR, help="folder of the shared catalog")
+    args = parser.parse_args()
+
+    version = publish(shared_dir=args.dir, force=args.force)
+    catalog = SharedCatalog(args.dir)
+    for table, entry in catalog.manifest['tables'].items():
+        print('%s: %d rows, %d columns' % (table, entry['rows'], len(entry['columns'])))
+    print('Current version %d in %s' % (version, catalog.folder))
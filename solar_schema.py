@@ -0,0 +1,156 @@
+import json
+import os
+import pickle
+import re
+from lazy_imports import lazy_import
+from catalog_cache import CACHE_VERSION, cache_is_fresh, default_cache_dir, file_hash
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Default location of the dataset scraped by ourSolarSystem.py
+SOLAR_PLANETS_PATH = 'data/solarPlanets.csv'
+
+# Name of the first column (it has no header in the csv file)
+NAME_COLUMN = 'Planet'
+
+# Columns with ranges like "-89 to 58", they become a minimum and a maximum column (a single value is both)
+RANGE_COLUMNS = {"mean temperature at surface (C)": ("minimum temperature at surface (C)",
+                                                     "maximum temperature at surface (C)")}
+
+# Columns where a trailing "*" marks a retrograde rotation, the flag goes into its own column
+RETROGRADE_COLUMNS = {"rotation period (in Earth days)": "retrograde rotation"}
+
+# Columns with "yes" / "no"
+YES_NO_COLUMNS = ["rings?"]
+
+# Columns with whole numbers (missing if the scraper found nothing)
+COUNT_COLUMNS = ["number of moons"]
+
+# Columns that stay text
+TEXT_COLUMNS = ["atmospheric composition"]
+
+# Unit at the end of a column name, e.g. "(km/sec)" or "(in Earth days)"
+UNIT_PATTERN = re.compile(r'\((?:in )?([^()]*)\)\s*$')
+
+
+def _numbers(series):
+    """Numbers of a text column with thousands separators ("4,878"), missing where there is no number."""
+
+    text = series.astype(str).str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(text, errors='coerce').astype(float)
+
+
+def parse_solar_planets(raw):
+    """Converts the dataset as scraped into typed columns, all planets at once.
+
+    Numbers with thousands separators become floats, ranges become a minimum and a maximum
+    column, the "*" of retrograde rotations becomes a boolean column, "yes" / "no" become
+    booleans. The units of the columns (from the column names) are kept in attrs["units"].
+
+    Args:
+        raw: Dataframe as read with pd.read_csv() from solarPlanets.csv.
+
+    Returns:
+        Dataframe with the planet names in the column "Planet" and typed attribute columns
+    """
+
+    raw = raw.reset_index(drop=True)
+    planets = {NAME_COLUMN: raw.iloc[:, 0].astype(str).str.strip()}
+    units = {}
+
+    for column in raw.columns[1:]:
+        series = raw[column]
+        if column in RANGE_COLUMNS:
+            bounds = series.astype(str).str.split(' to ', n=1, expand=True).reindex(columns=[0, 1])
+            low, high = _numbers(bounds[0]), _numbers(bounds[1])
+            planets[RANGE_COLUMNS[column][0]] = low
+            planets[RANGE_COLUMNS[column][1]] = high.fillna(low)
+            new_columns = RANGE_COLUMNS[column]
+        elif column in RETROGRADE_COLUMNS:
+            text = series.astype(str).str.strip()
+            planets[column] = _numbers(text.str.rstrip('*'))
+            planets[RETROGRADE_COLUMNS[column]] = text.str.endswith('*').to_numpy()
+            new_columns = [column]
+        elif column in YES_NO_COLUMNS:
+            planets[column] = series.astype(str).str.strip().str.lower().eq('yes').to_numpy()
+            new_columns = []
+        elif column in COUNT_COLUMNS:
+            planets[column] = pd.array(_numbers(series).round(), dtype='Int16')
+            new_columns = []
+        elif column in TEXT_COLUMNS:
+            planets[column] = series.astype(str).str.strip()
+            new_columns = []
+        else:
+            planets[column] = series.astype(float) if pd.api.types.is_numeric_dtype(series.dtype) else _numbers(series)
+            new_columns = [column]
+
+        unit = UNIT_PATTERN.search(column)
+        if unit is not None:
+            units.update({new_column: unit.group(1) for new_column in new_columns})
+
+    planets = pd.DataFrame(planets)
+    planets.attrs['units'] = units
+
+    return planets
+
+
+def _write_cache(path, cache_dir, planets):
+    """Saves the typed table and a manifest (like the catalog cache) of the csv file it belongs to."""
+
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(path)
+
+    # the old manifest is removed first, so a half written cache is never used
+    try:
+        os.remove(os.path.join(cache_dir, 'manifest.json'))
+    except FileNotFoundError:
+        pass
+
+    with open(os.path.join(cache_dir, 'planets.pkl.tmp'), 'wb') as f:
+        pickle.dump(planets, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(os.path.join(cache_dir, 'planets.pkl.tmp'), os.path.join(cache_dir, 'planets.pkl'))
+
+    manifest = {'version': CACHE_VERSION,
+                'source': {'path': os.path.abspath(path), 'size': stat.st_size,
+                           'mtime_ns': stat.st_mtime_ns, 'sha256': file_hash(path)}}
+    with open(os.path.join(cache_dir, 'manifest.json.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(os.path.join(cache_dir, 'manifest.json.tmp'), os.path.join(cache_dir, 'manifest.json'))
+
+
+def load_solar_table(path=SOLAR_PLANETS_PATH, cache_dir=None):
+    """Loads the typed solar system table, parsing the csv file only when it changed.
+
+    Args:
+        path: Path of the csv file created by ourSolarSystem.py.
+        cache_dir: Cache folder, the default folder next to the csv file if None.
+
+    Returns:
+        Dataframe from parse_solar_planets()
+    """
+
+    cache_dir = cache_dir or default_cache_dir(path)
+    if cache_is_fresh(path, cache_dir):
+        try:
+            with open(os.path.join(cache_dir, 'planets.pkl'), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+    planets = parse_solar_planets(pd.read_csv(path))
+    _write_cache(path, cache_dir, planets)
+
+    return planets
+
+
+if __name__ == "__main__":
+
+    planets = load_solar_table()
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(planets)
+        print(planets.dtypes)
+    for column, unit in planets.attrs['units'].items():
+        print('%-40s %s' % (column, unit))
@@ -0,0 +1,141 @@
+import asyncio
+import concurrent.futures
+from urllib.parse import urlsplit
+from lazy_imports import lazy_import
+from ourSolarSystem import HTTP_CACHE_DIR, get_session, scrape_planets_table
+
+# heavy libraries are only imported when they are used for the first time
+pd = lazy_import('pandas')
+
+
+# The planets table of windows2universe, other tables of the site can be added on the command line
+PLANETS_TABLE_URL = "https://www.windows2universe.org/?page=/our_solar_system/planets_table.html"
+
+# Number of pages that are downloaded at the same time
+CONCURRENCY = 8
+
+# Maximum number of requests per second to the same host
+RATE_PER_HOST = 10.0
+
+
+class HostRateLimiter:
+    """Spaces out the requests to each host, so a big refresh does not flood the website."""
+
+    def __init__(self, rate=RATE_PER_HOST):
+        """Creates the rate limiter.
+
+        Args:
+            rate: Maximum number of requests per second and host.
+        """
+
+        self.interval = 1.0 / rate
+        self._next_slot = {}   # host -> earliest time of its next request
+        self._locks = {}
+
+    async def wait(self, host):
+        """Waits until the next request to a host is allowed.
+
+        Args:
+            host: Host name (and port) of the URL.
+
+        Returns:
+            None
+        """
+
+        loop = asyncio.get_running_loop()
+        lock = self._locks.setdefault(host, asyncio.Lock())
+
+        # reserve the next free slot of the host, then wait for it outside of the lock
+        async with lock:
+            now = loop.time()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+
+        await asyncio.sleep(slot - now)
+
+
+async def scrape_tables_async(urls, concurrency=CONCURRENCY, rate_per_host=RATE_PER_HOST, cache_dir=HTTP_CACHE_DIR,
+                              session=None):
+    """Scrapes the first table of many webpages at the same time.
+
+    Every page goes through scrape_planets_table() (pooled session, response cache, lxml parsing that
+    stops after the first table), in a thread pool of size `concurrency`. Each page is parsed as soon
+    as it arrives, while the other pages are still downloading.
+
+    Args:
+        urls: URLs of the webpages.
+        concurrency: Maximum number of pages that are downloaded and parsed at the same time.
+        rate_per_host: Maximum number of requests per second to the same host.
+        cache_dir: Folder of the response cache.
+        session: requests session to use, the shared one of get_session() if None.
+
+    Returns:
+        Dict URL -> dataframe of the table (like scrape_planets_table()), in the order of urls
+    """
+
+    loop = asyncio.get_running_loop()
+    session = session or get_session()
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = HostRateLimiter(rate_per_host)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        async def scrape(url):
+            async with semaphore:
+                await limiter.wait(urlsplit(url).netloc)
+                return await loop.run_in_executor(executor, scrape_planets_table, url, cache_dir, session)
+
+        # every URL only once, even if it is given several times
+        unique_urls = list(dict.fromkeys(urls))
+        frames = await asyncio.gather(*(scrape(url) for url in unique_urls))
+
+    return dict(zip(unique_urls, frames))
+
+
+def scrape_tables(urls, **kwargs):
+    """Scrapes the first table of many webpages at the same time (see scrape_tables_async()).
+
+    Args:
+        urls: URLs of the webpages.
+        **kwargs: concurrency, rate_per_host, cache_dir and session of scrape_tables_async().
+
+    Returns:
+        Dict URL -> dataframe of the table
+    """
+
+    return asyncio.run(scrape_tables_async(list(urls), **kwargs))
+
+
+def combine_tables(tables):
+    """Puts the tables of several pages together into one solarPlanets.csv-style dataframe.
+
+    Every table contributes its rows (planets, moons, dwarf planets ...), attributes that are only
+    in some of the tables are left empty for the others.
+
+    Args:
+        tables: Dict URL -> dataframe, as returned by scrape_tables().
+
+    Returns:
+        Dataframe with one row per body and one column per attribute
+    """
+
+    return pd.concat(list(tables.values()), axis=0, sort=False)
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scrapes the tables of several windows2universe pages at once.")
+    parser.add_argument("urls", nargs="*", default=[PLANETS_TABLE_URL], help="pages to scrape")
+    parser.add_argument("--out", default="data/solarPlanets.csv", help="csv file to write")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="pages downloaded at the same time")
+    parser.add_argument("--rate", type=float, default=RATE_PER_HOST, help="requests per second and host")
+    args = parser.parse_args()
+
+    # Scrape all pages and save them as one dataset
+    df_planets = combine_tables(scrape_tables(args.urls, concurrency=args.concurrency, rate_per_host=args.rate))
+    df_planets.to_csv(args.out)
+
+    # Print the DataFrame to the console
+    print(df_planets)
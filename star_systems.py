@@ -0,0 +1,202 @@
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, load_catalog
+from exoplanets_formula import (EXO_COLUMNS, LUMINOSITY_EXPONENT, clean_exo_dataset, habits_earth, load_solar_planets,
+                                optimal_distance, score_habitability)
+from ranking import HabitabilityRanking
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Columns that describe the star of a planet, planets with the same values share one star
+STAR_COLUMNS = ["star_name", "star_mass", "star_teff", "star_radius"]
+
+# Our sun, the star of the solar system planets (solar units and Kelvin)
+SUN = {"star_name": "Sun", "star_mass": 1.0, "star_teff": 5772.0, "star_radius": 1.0}
+
+# Stellar flux (Earth = 1) at the inner and outer edge of the habitable zone
+# (runaway and maximum greenhouse limits of Kasting et al.)
+HZ_INNER_FLUX = 1.1
+HZ_OUTER_FLUX = 0.53
+
+
+def system_planets(exoplanets, df_planets):
+    """Puts the cleaned exoplanets and the solar system planets together, with the columns of their stars.
+
+    Args:
+        exoplanets: Cleaned exoplanet dataframe from clean_exo_dataset().
+        df_planets: solar system planets dataset (see load_solar_planets()).
+
+    Returns:
+        Dataframe in the order of make_habit_df() with "# name", mass, eccentricity, star_distance,
+        semi_major_axis and the STAR_COLUMNS
+    """
+
+    columns = ["# name", "mass", "eccentricity", "star_distance", "semi_major_axis"] + STAR_COLUMNS
+    exoplanets = exoplanets[columns].reset_index(drop=True)
+    exoplanets["star_name"] = exoplanets["star_name"].astype(object)
+
+    # the solar system planets orbit the sun, their "star_distance" is the distance from the sun in AU
+    solar_system = habits_earth(df_planets)
+    solar_system["semi_major_axis"] = solar_system["star_distance"]
+    for column, value in SUN.items():
+        solar_system[column] = value
+
+    return pd.concat([exoplanets, solar_system[columns]], axis=0, ignore_index=True)
+
+
+class StarSystems:
+    """Groups planets by their star and keeps everything that only depends on the star once per star.
+
+    Luminosity and habitable zone are computed once per star and broadcast to the planets through
+    the group index `codes`, also for the Formula if the planets are scored here. The per-system
+    table `summary` (number of planets, planets inside the habitable zone, best planet by Formula)
+    is computed once, so system queries are lookups.
+    """
+
+    def __init__(self, planets, habits=None, luminosity_exponent=LUMINOSITY_EXPONENT):
+        """Creates the star systems of a set of planets.
+
+        Args:
+            planets: Dataframe from system_planets().
+            habits: habitility dataframe of the same planets in the same order (e.g. from make_habit_df()),
+                scored with score_habitability() and the habitable zones of the stars if None.
+            luminosity_exponent: Exponent of the mass-luminosity relation of the stars.
+        """
+
+        self.planets = planets.reset_index(drop=True)
+
+        # group index: the stars are numbered in the order of their first planet
+        self.codes = self.planets.groupby(STAR_COLUMNS, sort=False, dropna=False).ngroup().to_numpy()
+        first = np.unique(self.codes, return_index=True)[1]
+        stars = self.planets[STAR_COLUMNS].iloc[first].reset_index(drop=True)
+
+        mass = stars["star_mass"].to_numpy(dtype=float)
+        radius = stars["star_radius"].to_numpy(dtype=float)
+        teff = stars["star_teff"].to_numpy(dtype=float)
+
+        # luminosity from the mass and the optimal distance of calculate_habitable_zone()
+        stars["luminosity_mass"] = np.power(mass, luminosity_exponent)
+        stars["hz_optimal"] = optimal_distance(mass, luminosity_exponent)
+
+        # luminosity from radius and temperature (Stefan-Boltzmann, solar units) and the edges of the habitable zone
+        stars["luminosity"] = radius**2 * (teff / SUN["star_teff"])**4
+        stars["hz_inner"] = np.sqrt(stars["luminosity"].to_numpy() / HZ_INNER_FLUX)
+        stars["hz_outer"] = np.sqrt(stars["luminosity"].to_numpy() / HZ_OUTER_FLUX)
+        self.stars = stars
+
+        if habits is None:
+            habits = score_habitability(self.planets[["# name", "mass", "star_distance", "eccentricity"]],
+                                        hz_optimal=self.broadcast("hz_optimal"))
+        self.habits = habits.reset_index(drop=True)
+
+        self.summary = self._summarize()
+        self._names = pd.Index(self.summary["star_name"])
+
+    def broadcast(self, column):
+        """Values of a column of the stars table for every planet.
+
+        Args:
+            column: Column of self.stars, e.g. "luminosity" or "hz_inner".
+
+        Returns:
+            Array in the order of the planets
+        """
+
+        return self.stars[column].to_numpy()[self.codes]
+
+    def habitable_zone_distance(self):
+        """Distance of every planet to the habitable zone, the same values as calculate_habitable_zone().
+
+        Returns:
+            Array in the order of the planets
+        """
+
+        return np.abs(self.planets["star_distance"].to_numpy(dtype=float) - self.broadcast("hz_optimal"))
+
+    def in_habitable_zone(self):
+        """Checks for every planet if its orbit (semi-major axis) lies between the edges of the habitable zone.
+
+        Returns:
+            Boolean array in the order of the planets, False if the orbit is unknown
+        """
+
+        orbit = self.planets["semi_major_axis"].to_numpy(dtype=float)
+        return (orbit >= self.broadcast("hz_inner")) & (orbit <= self.broadcast("hz_outer"))
+
+    def _summarize(self):
+        """Per-system table: number of planets and of planets inside the habitable zone, best planet by Formula."""
+
+        stars = len(self.stars)
+        summary = self.stars[["star_name", "luminosity", "hz_inner", "hz_outer"]].copy()
+        summary["planets"] = np.bincount(self.codes, minlength=stars)
+        summary["hz_planets"] = np.bincount(self.codes, weights=self.in_habitable_zone(), minlength=stars).astype(np.int64)
+
+        # walking through the ranking, the first planet of every star is its best one
+        order = HabitabilityRanking(self.habits).order("Formula")
+        best = order[np.unique(self.codes[order], return_index=True)[1]]
+        summary["best_planet"] = self.habits["Name"].to_numpy(dtype=object)[best]
+        summary["best_formula"] = self.habits["Formula"].to_numpy(dtype=float)[best]
+
+        return summary
+
+    def system(self, star_name):
+        """Summary of one star system (a lookup in the precomputed table).
+
+        Args:
+            star_name: Name of the star, "Sun" for the solar system.
+
+        Returns:
+            Rows of self.summary of the star (more than one if stars with different values share a name,
+            none for an unknown star)
+        """
+
+        positions = self._names.get_indexer_for([star_name])
+        # -1 marks an unknown star, it would pick the last row
+        return self.summary.iloc[positions[positions >= 0]]
+
+    def planets_of(self, star_name):
+        """Planets of one star system with their habitability values.
+
+        Args:
+            star_name: Name of the star.
+
+        Returns:
+            habitility dataframe of the planets of the star
+        """
+
+        positions = np.flatnonzero(np.isin(self.codes, self._names.get_indexer_for([star_name])))
+        return self.habits.iloc[positions]
+
+
+def load_star_systems(catalog_path=CATALOG_PATH, df_planets=None):
+    """Loads the catalog and the solar system planets and groups them by star.
+
+    Args:
+        catalog_path: Path of the exoplanet catalog.
+        df_planets: solar system planets dataset, loaded with load_solar_planets() if None.
+
+    Returns:
+        StarSystems of all planets of make_habit_df()
+    """
+
+    if df_planets is None:
+        df_planets = load_solar_planets()
+    exoplanets = clean_exo_dataset(load_catalog(EXO_COLUMNS, path=catalog_path))
+
+    return StarSystems(system_planets(exoplanets, df_planets))
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    systems = load_star_systems()
+    if len(sys.argv) > 1:
+        for star_name in sys.argv[1:]:
+            print(systems.system(star_name).T)
+            print(systems.planets_of(star_name))
+    else:
+        # the systems with the most planets inside the habitable zone
+        print(systems.summary.sort_values(["hz_planets", "planets"], ascending=False, kind="stable").head(20))
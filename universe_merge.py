@@ -0,0 +1,296 @@
+import json
+import os
+from lazy_imports import lazy_import
+from catalog_cache import CATALOG_PATH, file_hash, load_catalog
+from habitability_output import write_results
+from planet_similarity import JUPITER_MASS_EARTHS, JUPITER_RADIUS_EARTHS
+from solar_schema import SOLAR_PLANETS_PATH, load_solar_table
+
+# heavy libraries are only imported when they are used for the first time
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+# Files written by the merge
+UNIVERSE_PATH = 'data/universe_merged.csv'
+EXO_CLEAN_PATH = 'data/exoPlanets_clean.csv'
+
+# Sources and outputs of the last merge, to skip it when nothing changed
+MERGE_STATE_PATH = 'data/.cache/universe_merge.json'
+
+# Version of the merge, a change forces a new merge
+MERGE_VERSION = 1
+
+# Unit conversions of the exoplanet catalog into the units of the solar system table
+DAYS_PER_YEAR = 365.25
+EARTH_GRAVITY_CGS = 980.665   # log_g of the catalog is log10 of the surface gravity in cm/s^2
+
+# Exoplanets that are kept: these values must be known
+CLEAN_REQUIRED = ["mass", "radius", "eccentricity", "tzero_tr", "temp_calculated"]
+
+# Columns of exoPlanets_clean.csv and the catalog columns they come from, in catalog units
+# (mass in Jupiter masses, diameter in Jupiter radii, period in days). None: computed in clean_exoplanets()
+EXO_CLEAN_COLUMNS = {"Planet": "# name", "Planet status": "planet_status", "mass": "mass", "diameter": None,
+                     "orbital_period": "orbital_period", "Semi major axis": "semi_major_axis",
+                     "eccentricity": "eccentricity", "Angular distance": "angular_distance",
+                     "Year discovered": "discovered", "Date updated": "updated", "tzero_tr": "tzero_tr",
+                     "Calculated temperature": "temp_calculated", "Measured temperature": "temp_measured",
+                     "log_g": "log_g", "detection_type": "detection_type", "molecules": "molecules",
+                     "Star": None, "star_distance": None, "Star age": None}
+
+# Columns of the star table, joined to the planets by the star key
+STAR_COLUMNS = {"Star": "star_name", "star_distance": "star_distance", "Star age": "star_age"}
+
+# Catalog columns the merge reads
+SOURCE_COLUMNS = ["planet_status", "mass", "radius", "orbital_period", "semi_major_axis", "eccentricity",
+                  "angular_distance", "discovered", "updated", "tzero_tr", "temp_calculated", "temp_measured",
+                  "log_g", "detection_type", "molecules", "star_name", "star_distance", "star_age"]
+
+# Columns of universe_merged.csv: solar system table columns first, then the exoplanet columns,
+# then the columns both have (in Earth units)
+UNIVERSE_COLUMNS = ["Planet", "diameter (km)", "mean orbital velocity (km/sec)", "rotation period (in Earth days)",
+                    "inclination of axis (degrees)", "minimum temperature at surface (C)",
+                    "maximum temperature at surface (C)", "escape velocity (km/sec)", "mean density (water=1)",
+                    "number of moons", "rings?", "Planet status", "Semi major axis", "Angular distance",
+                    "Year discovered", "Date updated", "Calculated temperature", "Measured temperature", "Star",
+                    "Star age", "Mass (Earth=1)", "Diameter (Earth=1)", "Orbital period (Earth years)",
+                    "Orbital eccentricity", "Gravity at surface (Earth=1)", "Molecules present"]
+
+# Solar system table columns under their universe name (the others keep their name)
+SOLAR_TO_UNIVERSE = {"mean distance from Sun (AU)": "Semi major axis", "mass (Earth=1)": "Mass (Earth=1)",
+                     "diameter (Earth=1)": "Diameter (Earth=1)", "orbital period (Earth years)": "Orbital period (Earth years)",
+                     "orbital eccentricity": "Orbital eccentricity", "gravity at equator (Earth=1)": "Gravity at surface (Earth=1)",
+                     "atmospheric composition": "Molecules present"}
+
+# The star of the solar system planets in the star table
+SUN = {"Star": "Sun", "star_distance": float("nan"), "Star age": float("nan")}
+
+
+def name_keys(names):
+    """Normalized keys of planet or star names: "Kepler-22 b", "kepler 22b" and "KEPLER-22B" get the same key.
+
+    Letters are folded to lower case ASCII, everything that is not a letter or a digit is dropped,
+    and the result is hashed to 64 bit, all with whole-column string operations.
+
+    Args:
+        names: Series of names.
+
+    Returns:
+        Array of uint64, missing names get the key of the empty name
+    """
+
+    # star names repeat a lot, so only the distinct names are normalized
+    codes, uniques = pd.factorize(names.astype(object).fillna('').astype(str))
+    normalized = (pd.Series(uniques, dtype=object).str.normalize('NFKD').str.lower()
+                  .str.replace(r'[^0-9a-z]+', '', regex=True))
+    return pd.util.hash_array(normalized.to_numpy(dtype=object), categorize=False)[codes]
+
+
+def hash_join(left_keys, right_keys):
+    """Positions of the matching rows of a table with unique keys, for every key of another table.
+
+    Args:
+        left_keys: Keys of the rows that look up (may repeat).
+        right_keys: Unique keys of the table that is looked up.
+
+    Returns:
+        Array of positions in right_keys, -1 where there is no match
+    """
+
+    # pd.Index builds a hash table of right_keys once, each lookup is then O(1)
+    return pd.Index(right_keys).get_indexer(left_keys)
+
+
+def star_table(catalog):
+    """Stars of the catalog and the sun, one row per star key.
+
+    Args:
+        catalog: Catalog dataframe with the STAR_COLUMNS.
+
+    Returns:
+        Dataframe with star_key and the STAR_COLUMNS
+    """
+
+    stars = pd.DataFrame({column: catalog[source].to_numpy() for column, source in STAR_COLUMNS.items()})
+    stars.insert(0, "star_key", name_keys(catalog["star_name"]))
+    sun = pd.DataFrame({"star_key": name_keys(pd.Series([SUN["Star"]])), **{k: [v] for k, v in SUN.items()}})
+    stars = pd.concat([sun, stars], axis=0, ignore_index=True)
+
+    # the catalog gives the same star values for all planets of a star, the first row stands for all of them
+    return stars.drop_duplicates("star_key", keep="first").reset_index(drop=True)
+
+
+def clean_exoplanets(catalog, stars):
+    """Keeps the exoplanets with all CLEAN_REQUIRED values and brings them into the exoPlanets_clean.csv schema.
+
+    Args:
+        catalog: Catalog dataframe with the SOURCE_COLUMNS.
+        stars: Star table from star_table().
+
+    Returns:
+        Dataframe with the EXO_CLEAN_COLUMNS (catalog units), planet_key and star_key, indexed by catalog position
+    """
+
+    keep = catalog.reset_index()[["# name"] + CLEAN_REQUIRED].notna().all(axis=1).to_numpy()
+    rows = catalog.reset_index().loc[keep]
+
+    exoplanets = {}
+    for column, source in EXO_CLEAN_COLUMNS.items():
+        if source is not None:
+            exoplanets[column] = rows[source].to_numpy()
+    exoplanets["diameter"] = 2 * rows["radius"].to_numpy(dtype=float)
+
+    # star columns through the star table
+    star_keys = name_keys(rows["star_name"])
+    positions = hash_join(star_keys, stars["star_key"].to_numpy())
+    for column in STAR_COLUMNS:
+        exoplanets[column] = stars[column].to_numpy()[positions]
+
+    exoplanets = pd.DataFrame(exoplanets, columns=list(EXO_CLEAN_COLUMNS), index=np.flatnonzero(keep))
+    exoplanets["planet_key"] = name_keys(exoplanets["Planet"])
+    exoplanets["star_key"] = star_keys
+
+    return exoplanets
+
+
+def exoplanets_in_earth_units(exoplanets):
+    """Converts the cleaned exoplanets into the universe_merged.csv schema (Earth units, years).
+
+    Args:
+        exoplanets: Dataframe from clean_exoplanets().
+
+    Returns:
+        Dataframe with the UNIVERSE_COLUMNS
+    """
+
+    universe = pd.DataFrame({
+        "Planet": exoplanets["Planet"].to_numpy(),
+        "Planet status": exoplanets["Planet status"].to_numpy(),
+        "Semi major axis": exoplanets["Semi major axis"].to_numpy(),
+        "Angular distance": exoplanets["Angular distance"].to_numpy(),
+        "Year discovered": exoplanets["Year discovered"].to_numpy(),
+        "Date updated": exoplanets["Date updated"].to_numpy(),
+        "Calculated temperature": exoplanets["Calculated temperature"].to_numpy(),
+        "Measured temperature": exoplanets["Measured temperature"].to_numpy(),
+        "Star": exoplanets["Star"].to_numpy(),
+        "Star age": exoplanets["Star age"].to_numpy(),
+        "Mass (Earth=1)": exoplanets["mass"].to_numpy(dtype=float) * JUPITER_MASS_EARTHS,
+        # diameter relative to the Earth = radius relative to the Earth
+        "Diameter (Earth=1)": exoplanets["diameter"].to_numpy(dtype=float) / 2 * JUPITER_RADIUS_EARTHS,
+        "Orbital period (Earth years)": exoplanets["orbital_period"].to_numpy(dtype=float) / DAYS_PER_YEAR,
+        "Orbital eccentricity": exoplanets["eccentricity"].to_numpy(),
+        "Gravity at surface (Earth=1)": np.power(10.0, exoplanets["log_g"].to_numpy(dtype=float)) / EARTH_GRAVITY_CGS,
+        "Molecules present": exoplanets["molecules"].to_numpy(),
+    })
+    return universe.reindex(columns=UNIVERSE_COLUMNS)
+
+
+def solar_planets_in_universe(df_planets):
+    """Brings the typed solar system table into the universe_merged.csv schema.
+
+    Args:
+        df_planets: Typed solar system planets (see solar_schema.load_solar_table()).
+
+    Returns:
+        Dataframe with the UNIVERSE_COLUMNS
+    """
+
+    universe = df_planets.rename(columns=SOLAR_TO_UNIVERSE)
+    universe["Star"] = SUN["Star"]
+    return universe.reindex(columns=UNIVERSE_COLUMNS)
+
+
+def merge_universe(catalog=None, df_planets=None):
+    """Builds both merged tables from the exoplanet catalog and the solar system table.
+
+    The planets of both sources are matched by their normalized name key, a planet that is in
+    both is kept once (the solar system table wins). Everything works on whole columns, so it
+    also handles catalogs with millions of rows.
+
+    Args:
+        catalog: Catalog dataframe with the SOURCE_COLUMNS, loaded through the column cache if None.
+        df_planets: Typed solar system planets, loaded with solar_schema.load_solar_table() if None.
+
+    Returns:
+        universe_merged and exoPlanets_clean dataframes
+    """
+
+    if catalog is None:
+        catalog = load_catalog(SOURCE_COLUMNS)
+    if df_planets is None:
+        df_planets = load_solar_table()
+
+    stars = star_table(catalog)
+    exoplanets = clean_exoplanets(catalog, stars)
+
+    solar_system = solar_planets_in_universe(df_planets)
+    solar_keys = name_keys(solar_system["Planet"])
+    known = hash_join(exoplanets["planet_key"].to_numpy(), np.unique(solar_keys)) >= 0
+    exoplanets = exoplanets.loc[~known]
+
+    universe = pd.concat([solar_system, exoplanets_in_earth_units(exoplanets)], axis=0, ignore_index=True)
+    exo_clean = exoplanets.drop(columns=["planet_key", "star_key"])
+
+    return universe, exo_clean
+
+
+def update_merged_files(catalog_path=CATALOG_PATH, solar_path=SOLAR_PLANETS_PATH, universe_path=UNIVERSE_PATH,
+                        exo_clean_path=EXO_CLEAN_PATH, state_path=MERGE_STATE_PATH, force=False):
+    """Writes universe_merged.csv and exoPlanets_clean.csv again if a source or an output changed.
+
+    The hashes of the sources and of the written files are kept in state_path. Without changes
+    nothing is done, otherwise both files are merged again and replaced atomically. The same
+    sources always give the same bytes.
+
+    Args:
+        catalog_path: Path of the exoplanet catalog.
+        solar_path: Path of solarPlanets.csv.
+        universe_path: Path of universe_merged.csv.
+        exo_clean_path: Path of exoPlanets_clean.csv.
+        state_path: Path of the state file.
+        force: True to merge even if nothing changed.
+
+    Returns:
+        True if the files were written
+    """
+
+    sources = {'version': MERGE_VERSION, 'catalog': file_hash(catalog_path), 'solar': file_hash(solar_path)}
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        unchanged = (state['sources'] == sources and file_hash(universe_path) == state['universe'] and
+                     file_hash(exo_clean_path) == state['exo_clean'])
+    except (OSError, ValueError, KeyError):
+        unchanged = False
+    if unchanged and not force:
+        return False
+
+    universe, exo_clean = merge_universe(load_catalog(SOURCE_COLUMNS, path=catalog_path), load_solar_table(solar_path))
+    write_results(universe, universe_path)
+    write_results(exo_clean, exo_clean_path)
+
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump({'sources': sources, 'universe': file_hash(universe_path), 'exo_clean': file_hash(exo_clean_path)},
+                  f, indent=1)
+    os.replace(state_path + '.tmp', state_path)
+
+    return True
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merges the exoplanet catalog and the solar system planets.")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="exoplanet catalog csv file")
+    parser.add_argument("--solar", default=SOLAR_PLANETS_PATH, help="solar system planets csv file")
+    parser.add_argument("--universe", default=UNIVERSE_PATH, help="merged file to write")
+    parser.add_argument("--exo-clean", default=EXO_CLEAN_PATH, help="cleaned exoplanets file to write")
+    parser.add_argument("--force", action="store_true", help="merge even if nothing changed")
+    args = parser.parse_args()
+
+    if update_merged_files(args.catalog, args.solar, args.universe, args.exo_clean, force=args.force):
+        print('Wrote %s and %s' % (args.universe, args.exo_clean))
+    else:
+        print('%s and %s are up to date' % (args.universe, args.exo_clean))